@@ -0,0 +1,121 @@
+# app/ai/model_registry.py
+import json
+import os
+import threading
+import time
+import traceback
+
+import joblib
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+COMPOSITION_MODEL_DIR = os.path.abspath(os.environ.get("COMPOSITION_MODEL_DIR", PROJECT_ROOT)) # Dónde deja train_composition_model.py sus artefactos
+MODEL_RELOAD_CHECK_SECONDS = int(os.environ.get("MODEL_RELOAD_CHECK_SECONDS", 30)) # Cada cuánto se mira si hay un modelo nuevo (0 = nunca)
+
+MODEL_COMPOSITION_FILENAME = 'team_composition_predictor.joblib'
+FEATURES_COMPOSITION_FILENAME = 'team_composition_features.joblib'
+TOP_FEATURES_DATA_FILENAME = 'top_champion_influencers.json'
+
+
+def build_composition_feature_index(ordered_features):
+    """Columna de cada campeón en el vector de composición (el orden de team_composition_features.joblib)."""
+    return {feature: column for column, feature in enumerate(ordered_features or [])}
+
+
+class CompositionModelBundle:
+    """Artefactos de un mismo entrenamiento: modelo, orden de características y top campeones influyentes."""
+    __slots__ = ("model", "features_ordered", "feature_index", "top_champion_influencers", "signature")
+
+    def __init__(self, model=None, features_ordered=None, top_champion_influencers=None, signature=None):
+        self.model = model
+        self.features_ordered = features_ordered or []
+        self.feature_index = build_composition_feature_index(self.features_ordered)
+        self.top_champion_influencers = top_champion_influencers or []
+        self.signature = signature
+
+
+class CompositionModelRegistry:
+    """
+    Carga perezosa del modelo de composición: nada se lee hasta el primer uso (o hasta preload(),
+    que el master de gunicorn llama antes del fork). Con preload_app los workers heredan el modelo
+    ya cargado y comparten sus páginas por copy-on-write: los arrays de los árboles no se escriben
+    nunca, así que no se duplican. No se usa mmap: los árboles de sklearn copian sus arrays al
+    deserializarse, así que mmap_mode no ahorraría memoria. Un modelo recargado en caliente tras
+    el fork lo carga cada worker por su cuenta (una copia por worker hasta el siguiente reinicio).
+
+    Cada MODEL_RELOAD_CHECK_SECONDS se comparan las fechas de los artefactos; si cambian, el nuevo
+    conjunto se carga aparte y se sustituye de una vez (una asignación), así que las peticiones en
+    curso terminan con el modelo que tenían y nunca se mezclan artefactos de dos entrenamientos.
+    """
+
+    def __init__(self, model_dir: str, check_interval: int):
+        self.model_path = os.path.join(model_dir, MODEL_COMPOSITION_FILENAME)
+        self.features_path = os.path.join(model_dir, FEATURES_COMPOSITION_FILENAME)
+        self.top_features_path = os.path.join(model_dir, TOP_FEATURES_DATA_FILENAME)
+        self.check_interval = check_interval
+        self._load_lock = threading.Lock()
+        self._bundle = None
+        self._next_check_at = 0.0
+
+    def _signature(self):
+        signature = []
+        for path in (self.model_path, self.features_path, self.top_features_path):
+            try:
+                file_stat = os.stat(path)
+                signature.append((file_stat.st_mtime_ns, file_stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load_bundle(self, signature):
+        if signature[0] is None or signature[1] is None:
+            print("⚠️ Advertencia: No se encontraron los archivos del modelo de predicción de composición y/o características.")
+            print(f"   Ruta modelo: {self.model_path}")
+            print(f"   Ruta features: {self.features_path}")
+            print("   Ejecuta 'train_composition_model.py' para generarlos.")
+            return CompositionModelBundle(signature=signature)
+
+        model = joblib.load(self.model_path)
+        features_ordered = joblib.load(self.features_path)
+        n_features = getattr(model, "n_features_in_", len(features_ordered))
+        if n_features != len(features_ordered):
+            # El entrenamiento aún está escribiendo los artefactos: se reintenta en la próxima comprobación
+            raise ValueError(f"el modelo espera {n_features} características y la lista tiene {len(features_ordered)}")
+        print(f"✅ Modelo de predicción de composición ({self.model_path}) y {len(features_ordered)} características cargados.")
+
+        top_champion_influencers = []
+        if signature[2] is not None:
+            with open(self.top_features_path, 'r') as f:
+                top_champion_influencers = json.load(f)
+        else:
+            print(f"⚠️ Advertencia: No se encontró {self.top_features_path}. No se mostrarán los top campeones influyentes.")
+        return CompositionModelBundle(model, features_ordered, top_champion_influencers, signature)
+
+    def _reload_if_changed(self):
+        with self._load_lock:
+            if self._bundle is not None and time.monotonic() < self._next_check_at:
+                return # Otro hilo acaba de comprobarlo
+            signature = self._signature()
+            if self._bundle is None or signature != self._bundle.signature:
+                try:
+                    self._bundle = self._load_bundle(signature)
+                except Exception as e:
+                    print(f"❌ Error al cargar el modelo de predicción, características o top influencers: {e}")
+                    traceback.print_exc()
+                    if self._bundle is None:
+                        self._bundle = CompositionModelBundle()
+            self._next_check_at = time.monotonic() + self.check_interval if self.check_interval > 0 else float("inf")
+
+    def get(self):
+        """Artefactos vigentes. Quien los usa debe quedarse con el mismo bundle durante toda la petición."""
+        bundle = self._bundle
+        if bundle is None or time.monotonic() >= self._next_check_at:
+            self._reload_if_changed()
+            bundle = self._bundle
+        return bundle
+
+    def preload(self):
+        """Carga el modelo ya (p. ej. en el master de gunicorn, antes del fork)."""
+        return self.get()
+
+
+composition_model_registry = CompositionModelRegistry(COMPOSITION_MODEL_DIR, MODEL_RELOAD_CHECK_SECONDS)
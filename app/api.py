@@ -0,0 +1,229 @@
+# app/api.py
+"""
+API JSON versionada (/api/v1) para paneles externos. Usa el mismo pipeline que la página del
+invocador (app/summoner_service.py) y la misma caché de análisis, así que la web y la API no
+repiten trabajo. Las respuestas al día llevan ETag y Cache-Control público para que una CDN
+las sirva; /stream envía el análisis por partes con Server-Sent Events.
+"""
+import hashlib
+import json
+import os
+import time
+import traceback
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
+
+from .ai.model_registry import composition_model_registry
+from .riot_api import get_latest_match_id
+from .riot_cache import read_cached, write_cached
+from .static_data import static_data_service
+from .summoner_jobs import (
+    summoner_jobs,
+    make_cache_key_summoner_analysis,
+    read_summoner_analysis,
+    SUMMONER_JOB_WORKERS,
+    SUMMONER_JOB_STALE_SECONDS,
+    CACHE_TTL_SUMMONER_ANALYSIS,
+    JOB_DONE,
+    JOB_ERROR
+)
+from .summoner_service import resolve_summoner_profile_with, analyze_summoner
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+API_CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", 60)) # Segundos que una CDN sirve una respuesta al día sin revalidar
+API_STREAM_POLL_SECONDS = 1 # Cada cuánto /stream mira el progreso de un análisis que hace otro trabajo
+
+# Partes del análisis que devuelve /insights (y que /stream envía como eventos con ese nombre)
+INSIGHT_KEYS = ("general_recommendations", "ml_decision_tree_insights", "playstyle_insights")
+
+
+def _error(message: str, status: int):
+    return jsonify({"error": message}), status
+
+
+def _resolve_player(riot_id: str):
+    """(perfil con puuid y newest_match_id, None) o (None, respuesta de error)."""
+    if "#" not in riot_id:
+        return None, _error("El Riot ID debe tener el formato nombre#tag.", 400)
+    name, tag = riot_id.split("#", 1)
+    # La última partida se pide a la vez que la cadena summoner-v4 → league-v4
+    player, newest_match_id = resolve_summoner_profile_with(name, tag, get_latest_match_id)
+    if player.get("error"):
+        return None, _error(player["error"], 404)
+    player["newest_match_id"] = newest_match_id
+    return player, None
+
+
+def _summoner_payload(player: dict):
+    return {
+        "riot_id": player["summoner_name_display"],
+        "puuid": player["puuid"],
+        "summoner_level": player["summoner_level"],
+        "profile_icon_id": player["profile_icon_id"],
+        "solo_rank_info": player["solo_rank_info"],
+        "newest_match_id": player["newest_match_id"],
+        "ddragon_version": static_data_service.get_ddragon_version(),
+    }
+
+
+def _cacheable_json(payload: dict):
+    """JSON con ETag del contenido: la CDN lo sirve API_CACHE_MAX_AGE segundos y después revalida (304)."""
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = API_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+
+def _analysis_for(player: dict, riot_id: str):
+    """
+    (análisis, None) si hay uno que mostrar, o (None, respuesta 202) mientras se calcula. Como en
+    la página, un análisis desactualizado se devuelve (marcado como "stale") mientras se recalcula.
+    """
+    puuid = player["puuid"]
+    analysis, is_current = read_summoner_analysis(puuid, player["newest_match_id"])
+    if is_current:
+        return analysis, None
+    if SUMMONER_JOB_WORKERS <= 0:
+        analysis = analyze_summoner(puuid)
+        write_cached(make_cache_key_summoner_analysis(puuid), analysis, *CACHE_TTL_SUMMONER_ANALYSIS)
+        return analysis, None
+
+    job = summoner_jobs.submit(puuid)
+    if analysis is not None:
+        return dict(analysis, stale=True), None
+    response = jsonify({"state": job["state"],
+                        "job_url": url_for("routes.job_status", job_id=job["id"]),
+                        "stream_url": url_for("api.summoner_stream", riot_id=riot_id)})
+    response.status_code = 202
+    response.headers["Retry-After"] = "2"
+    response.cache_control.no_store = True
+    return None, response
+
+
+def _analysis_json(payload: dict, analysis: dict):
+    payload.update(analyzed_at=analysis.get("analyzed_at"), stale=analysis.get("stale", False))
+    if payload["stale"]:
+        response = jsonify(payload)
+        response.cache_control.no_store = True
+        return response
+    return _cacheable_json(payload)
+
+
+@api.route("/summoner/<path:riot_id>")
+def summoner(riot_id):
+    """Cuenta, nivel, rango y última partida de un Riot ID (nombre%23tag)."""
+    player, error_response = _resolve_player(riot_id)
+    if error_response:
+        return error_response
+    return _cacheable_json(_summoner_payload(player))
+
+
+@api.route("/summoner/<path:riot_id>/matches")
+def summoner_matches(riot_id):
+    """Estadísticas de las últimas partidas (las mismas que muestra la página), de la más reciente a la más antigua."""
+    player, error_response = _resolve_player(riot_id)
+    if error_response:
+        return error_response
+    analysis, pending_response = _analysis_for(player, riot_id)
+    if pending_response:
+        return pending_response
+    return _analysis_json({"riot_id": player["summoner_name_display"],
+                           "newest_match_id": analysis.get("newest_match_id"),
+                           "api_warning": analysis.get("api_warning"),
+                           "matches": analysis.get("stats", [])}, analysis)
+
+
+@api.route("/summoner/<path:riot_id>/insights")
+def summoner_insights(riot_id):
+    """Recomendaciones del analista y de los modelos de IA, y los campeones más influyentes del modelo de composición."""
+    player, error_response = _resolve_player(riot_id)
+    if error_response:
+        return error_response
+    analysis, pending_response = _analysis_for(player, riot_id)
+    if pending_response:
+        return pending_response
+    payload = {"riot_id": player["summoner_name_display"], "newest_match_id": analysis.get("newest_match_id")}
+    payload.update({key: analysis.get(key, []) for key in INSIGHT_KEYS})
+    payload["top_champion_influencers"] = composition_model_registry.get().top_champion_influencers
+    return _analysis_json(payload, analysis)
+
+
+def _sse(event_name: str, data):
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _replay_analysis_events(analysis: dict):
+    """Los mismos eventos que SummonerAnalysisStream.events(), a partir de un análisis ya guardado."""
+    for match_stats in analysis.get("stats", []):
+        yield "match", match_stats
+    yield "composition_prediction_insights", [
+        match_stats.get("composition_prediction_insight") for match_stats in analysis.get("stats", [])]
+    yield "api_warning", analysis.get("api_warning")
+    for key in INSIGHT_KEYS:
+        yield key, analysis.get(key, [])
+
+
+def _follow_job_events(job: dict):
+    """
+    Eventos "progress" de un análisis que ya hace otro trabajo (cola o stream de otra visita) y,
+    cuando termina, los del análisis que ha guardado. Lanza RuntimeError si el trabajo falla.
+    """
+    last_progress = None
+    while True:
+        job_status = summoner_jobs.get(job["id"]) or job
+        if job_status["state"] == JOB_DONE:
+            found, analysis, _ = read_cached(make_cache_key_summoner_analysis(job_status["puuid"]))
+            if not found:
+                raise RuntimeError(f"el trabajo {job_status['id']} terminó sin dejar el análisis en la caché")
+            yield from _replay_analysis_events(analysis)
+            return
+        if job_status["state"] == JOB_ERROR or time.time() - job_status["updated_at"] >= SUMMONER_JOB_STALE_SECONDS:
+            raise RuntimeError(job_status.get("error") or f"el trabajo {job_status['id']} no avanza")
+        progress = {"stage": job_status["stage"], "done": job_status["done"], "total": job_status["total"]}
+        if progress != last_progress:
+            yield "progress", progress
+            last_progress = progress
+        time.sleep(API_STREAM_POLL_SECONDS)
+
+
+@api.route("/summoner/<path:riot_id>/stream")
+def summoner_stream(riot_id):
+    """
+    Server-Sent Events: "summoner" primero, un "match" por partida en cuanto se procesa, luego
+    "composition_prediction_insights", "api_warning" y un evento por cada recomendador
+    (INSIGHT_KEYS) según terminan, y "done" al final ("error" si algo falla a mitad). El stream
+    es el trabajo de análisis del jugador; si ya hay uno en marcha, envía eventos "progress"
+    hasta que termina y después sus resultados.
+    """
+    player, error_response = _resolve_player(riot_id)
+    if error_response:
+        return error_response
+    puuid = player["puuid"]
+    analysis, is_current = read_summoner_analysis(puuid, player["newest_match_id"])
+    analysis_stream = None
+    if is_current:
+        events = _replay_analysis_events(analysis)
+    else:
+        analysis_job, analysis_stream = summoner_jobs.stream(puuid)
+        events = analysis_stream.events() if analysis_stream is not None else _follow_job_events(analysis_job)
+
+    def generate():
+        yield _sse("summoner", _summoner_payload(player))
+        try:
+            for event_name, event_data in events:
+                yield _sse(event_name, event_data)
+        except Exception as e:
+            print(f"Error en el stream de la API para {puuid}: {e}; {traceback.format_exc()}")
+            yield _sse("error", {"error": "No se pudo completar el análisis de las partidas."})
+            return
+        if analysis_stream is not None and analysis_stream.error:
+            yield _sse("error", {"error": analysis_stream.error})
+            return
+        yield _sse("done", {"newest_match_id": player["newest_match_id"]})
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no" # Que nginx no acumule los eventos
+    return response
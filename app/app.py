@@ -5,8 +5,10 @@ from dotenv import load_dotenv
 load_dotenv() 
 
 from .routes import routes
+from .api import api
 from .extensions import cache, db
 from . import models
+from .cli import register_cli_commands
 
 def create_app():
     """
@@ -30,11 +32,10 @@ def create_app():
         
         cache_dir_from_config = cache.config.get("CACHE_DIR") 
         if cache_dir_from_config:
-
-            if cache_dir_from_config.startswith('instance') and not os.path.isabs(cache_dir_from_config):
-                abs_cache_dir = os.path.join(project_root, cache_dir_from_config)
-                if not os.path.exists(abs_cache_dir):
-                    os.makedirs(abs_cache_dir)
+            # Rutas relativas, respecto a la raíz del proyecto (no al directorio desde el que se arranca)
+            abs_cache_dir = os.path.join(project_root, cache_dir_from_config)
+            if not os.path.exists(abs_cache_dir):
+                os.makedirs(abs_cache_dir)
     except OSError as e:
         pass 
 
@@ -44,6 +45,10 @@ def create_app():
 
     # --- Registrar Blueprints ---
     flask_app_instance.register_blueprint(routes)
+    flask_app_instance.register_blueprint(api)
+
+    # --- Comandos CLI (flask --app app.app <comando>) ---
+    register_cli_commands(flask_app_instance)
 
     # --- Crear Tablas de la Base de Datos (si no existen) ---
     with flask_app_instance.app_context():
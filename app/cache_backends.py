@@ -0,0 +1,363 @@
+# app/cache_backends.py
+import atexit
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+from .rate_limiter import _SharedStateFile
+
+try:
+    import fcntl
+except ImportError: # Windows: cada worker barre por su cuenta
+    fcntl = None
+
+CACHE_DISK_LOW_WATERMARK = 0.9 # Al superar el presupuesto se desaloja hasta el 90%
+CACHE_STATS_FLUSH_EVERY = int(os.environ.get("CACHE_STATS_FLUSH_EVERY", 1000)) # Lecturas entre volcados de estadísticas (0: solo en el barrido y al salir)
+CACHE_MEMORY_TOUCH_INTERVAL = 60 # Segundos mínimos entre dos actualizaciones del mtime de una clave servida desde memoria
+
+
+def _key_prefix(key) -> str:
+    """Prefijo de una clave de caché ("sinfo", "sv4", "matchids"...), para las estadísticas."""
+    return str(key).split("__", 1)[0]
+
+
+class TieredFileSystemCache(FileSystemCache):
+    """
+    FileSystemCache con un primer nivel LRU en memoria (por proceso), limitado por número de
+    entradas y por bytes. Las lecturas calientes se resuelven con un acceso a diccionario; el
+    disco sigue siendo el nivel compartido entre workers. Una entrada en memoria vive como mucho
+    `memory_ttl` segundos, así que un valor reescrito por otro worker se ve en ese plazo; las claves
+    que cambian a menudo y se leen desde cualquier worker (`memory_excluded_prefixes`) van siempre a disco.
+
+    El nivel de disco tiene un presupuesto en bytes (`disk_max_bytes`) en lugar del umbral de
+    entradas de FileSystemCache: un hilo en segundo plano borra cada `sweep_interval` segundos los
+    ficheros caducados y, si se pasa del presupuesto, los menos usados (cada lectura actualiza el
+    mtime del fichero; los aciertos en memoria también, como mucho una vez por
+    CACHE_MEMORY_TOUCH_INTERVAL). Los contadores de aciertos se acumulan en `stats_path` para todos
+    los workers: cada CACHE_STATS_FLUSH_EVERY lecturas, en cada barrido y al salir el proceso.
+
+    El nivel de memoria guarda los valores serializados, como el disco: cada lectura devuelve una
+    copia propia que se puede modificar sin afectar a otras peticiones.
+    """
+
+    def __init__(self, cache_dir: str, memory_max_entries: int = 1000, memory_max_bytes: int = 64 * 1024 * 1024,
+                 memory_ttl: int = 60, disk_max_bytes: int = 0, sweep_interval: int = 0, stats_path: str = None,
+                 memory_excluded_prefixes=(), **kwargs):
+        self.memory_max_entries = memory_max_entries
+        self.memory_excluded_prefixes = frozenset(memory_excluded_prefixes)
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_ttl = memory_ttl
+        self.disk_max_bytes = disk_max_bytes
+        self.sweep_interval = sweep_interval
+        self.stats_path = stats_path
+        self._shared_stats = _SharedStateFile(stats_path) if stats_path else None
+        self._flushed_counters = {}
+        self._lookups_since_flush = 0
+        self._process_pid = None
+        self._memory_lock = threading.Lock()
+        self._memory = OrderedDict() # clave -> [expira, valor serializado, bytes, último toque del fichero]
+        self._memory_bytes = 0
+        self._tier_counters = {"memory": {"hits": 0, "misses": 0}, "disk": {"hits": 0, "misses": 0}}
+        self._prefix_counters = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        # FileSystemCache.__init__ ya escribe el contador de ficheros con set(): va después
+        super().__init__(cache_dir, **kwargs)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            memory_max_entries=config.get("CACHE_MEMORY_MAX_ENTRIES", 1000),
+            memory_max_bytes=config.get("CACHE_MEMORY_MAX_BYTES", 64 * 1024 * 1024),
+            memory_ttl=config.get("CACHE_MEMORY_TTL", 60),
+            disk_max_bytes=config.get("CACHE_DISK_MAX_BYTES", 0),
+            sweep_interval=config.get("CACHE_SWEEP_INTERVAL", 0),
+            stats_path=config.get("CACHE_STATS_FILE"),
+            memory_excluded_prefixes=config.get("CACHE_MEMORY_EXCLUDED_PREFIXES", ()),
+        )
+        return super().factory(app, config, args, kwargs)
+
+    # --- Nivel en memoria ---
+    def _memory_get(self, key):
+        """(encontrada, valor serializado, hay que tocar el fichero en disco para el LRU)."""
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return False, None, False
+            expires_at, payload, _, touched_at = entry
+            now = time.time()
+            if expires_at <= now:
+                self._memory_pop(key)
+                return False, None, False
+            self._memory.move_to_end(key)
+            touch = now - touched_at >= CACHE_MEMORY_TOUCH_INTERVAL
+            if touch:
+                entry[3] = now
+            return True, payload, touch
+
+    def _memory_pop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def _memory_put(self, key, payload: bytes, disk_expires_at: int, nbytes: int):
+        if (self.memory_max_entries <= 0 or nbytes > self.memory_max_bytes
+                or _key_prefix(key) in self.memory_excluded_prefixes):
+            return
+        expires_at = time.time() + self.memory_ttl
+        if disk_expires_at:
+            expires_at = min(expires_at, disk_expires_at)
+        with self._memory_lock:
+            self._memory_pop(key)
+            self._memory[key] = [expires_at, payload, nbytes, time.time()]
+            self._memory_bytes += nbytes
+            while self._memory and (len(self._memory) > self.memory_max_entries
+                                    or self._memory_bytes > self.memory_max_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted[2]
+
+    def _count(self, key, outcome: str):
+        with self._memory_lock:
+            prefix_counters = self._prefix_counters[_key_prefix(key)]
+            if outcome == "memory":
+                self._tier_counters["memory"]["hits"] += 1
+                prefix_counters["memory_hits"] += 1
+            else:
+                self._tier_counters["memory"]["misses"] += 1
+                if outcome == "disk":
+                    self._tier_counters["disk"]["hits"] += 1
+                    prefix_counters["disk_hits"] += 1
+                else:
+                    self._tier_counters["disk"]["misses"] += 1
+                    prefix_counters["misses"] += 1
+            self._lookups_since_flush += 1
+            flush_due = 0 < CACHE_STATS_FLUSH_EVERY <= self._lookups_since_flush
+        if flush_due:
+            self._flush_stats_safely()
+
+    def _touch(self, filename: str):
+        try:
+            os.utime(filename) # El mtime marca el último uso para el desalojo LRU
+        except OSError:
+            pass
+
+    # --- API de caché ---
+    def get(self, key):
+        if key == self._fs_count_file: # Contador interno de FileSystemCache: siempre desde disco
+            return super().get(key)
+        self._ensure_process()
+        found, payload, touch = self._memory_get(key)
+        if found:
+            if touch: # Que el barrido no desaloje del disco justo las claves más leídas
+                self._touch(self._get_filename(key))
+            self._count(key, "memory")
+            return self.serializer.loads(payload)
+
+        # Misma lectura que FileSystemCache.get, pero conservando la expiración y el tamaño del fichero
+        filename = self._get_filename(key)
+        value = None
+        try:
+            with self._safe_stream_open(filename, "rb") as f:
+                disk_expires_at = struct.unpack("I", f.read(4))[0]
+                if disk_expires_at == 0 or disk_expires_at >= time.time():
+                    payload = f.read()
+                    value = self.serializer.loads(payload)
+                    self._memory_put(key, payload, disk_expires_at, os.fstat(f.fileno()).st_size)
+            if value is not None:
+                self._touch(filename)
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, struct.error) as e:
+            print(f"Advertencia: no se pudo leer el fichero de caché de {key}: {e}")
+        self._count(key, "disk" if value is not None else "miss")
+        return value
+
+    def set(self, key, value, timeout=None, mgmt_element=False):
+        if not mgmt_element:
+            self._ensure_process()
+        with self._memory_lock:
+            self._memory_pop(key)
+        stored = super().set(key, value, timeout, mgmt_element)
+        if stored and not mgmt_element:
+            try:
+                nbytes = os.path.getsize(self._get_filename(key))
+            except OSError:
+                return stored
+            self._memory_put(key, self.serializer.dumps(value), self._normalize_timeout(timeout), nbytes)
+        return stored
+
+    def add(self, key, value, timeout=None):
+        """
+        Escribe `key` solo si no existe o ha caducado (FileSystemCache.add no mira la caducidad y no
+        es atómico). Un flock junto al directorio hace la comprobación y la escritura atómicas entre
+        los workers del nodo: sirve para reclamar una clave (p. ej. el trabajo activo de un jugador).
+        """
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(os.path.join(os.path.dirname(os.path.abspath(self._path)),
+                                          os.path.basename(self._path) + ".add.lock"), "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if FileSystemCache.has(self, key): # Siempre el disco: en memoria puede quedar un valor ya borrado
+                return False
+            return self.set(key, value, timeout)
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def delete(self, key, mgmt_element=False):
+        with self._memory_lock:
+            self._memory_pop(key)
+        return super().delete(key, mgmt_element)
+
+    def has(self, key):
+        found, _, _ = self._memory_get(key)
+        return found or super().has(key)
+
+    def clear(self):
+        with self._memory_lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        return super().clear()
+
+    def stats(self):
+        """Aciertos/fallos por nivel y por prefijo de clave, y ocupación del nivel en memoria (de este worker)."""
+        with self._memory_lock:
+            return {
+                "pid": os.getpid(),
+                "memory": {"entries": len(self._memory), "bytes": self._memory_bytes,
+                           "max_entries": self.memory_max_entries, "max_bytes": self.memory_max_bytes,
+                           "ttl_seconds": self.memory_ttl},
+                "tiers": {tier: dict(counters) for tier, counters in self._tier_counters.items()},
+                "prefixes": {prefix: dict(counters) for prefix, counters in sorted(self._prefix_counters.items())},
+            }
+
+    # --- Barrido del nivel de disco y volcado de estadísticas ---
+    def _ensure_process(self):
+        """Una vez por proceso (también tras el fork de gunicorn): volcado al salir e hilo de barrido."""
+        if self._process_pid == os.getpid():
+            return
+        with self._memory_lock:
+            if self._process_pid == os.getpid():
+                return
+            self._process_pid = os.getpid()
+            # Lo contado antes del fork ya lo vuelca el master: el worker solo suma lo suyo
+            self._flushed_counters = {"tiers": {tier: dict(counters) for tier, counters in self._tier_counters.items()},
+                                      "prefixes": {prefix: dict(counters) for prefix, counters in self._prefix_counters.items()}}
+            self._lookups_since_flush = 0
+        if self._shared_stats is not None:
+            atexit.register(self._flush_stats_safely)
+        if self.sweep_interval > 0:
+            threading.Thread(target=self._sweeper_loop, name="cache-sweeper", daemon=True).start()
+
+    def _sweeper_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self._flush_stats_safely()
+            try:
+                self.sweep(blocking=False)
+            except Exception as e:
+                print(f"Error en el barrido de la caché de disco: {e}")
+
+    def _flush_stats_safely(self):
+        try:
+            self.flush_stats()
+        except Exception as e:
+            print(f"Error al volcar las estadísticas de la caché: {e}")
+
+    def _disk_entries(self):
+        """(mtime, bytes, ruta, expira) de cada fichero de caché, sin los de gestión ni los temporales."""
+        with os.scandir(self._path) as directory:
+            for entry in directory:
+                if (not entry.is_file() or self._is_mgmt(entry.name)
+                        or entry.name.endswith(self._fs_transaction_suffix)):
+                    continue
+                try:
+                    stat = entry.stat()
+                    with open(entry.path, "rb") as f:
+                        expires_at = struct.unpack("I", f.read(4))[0]
+                except (OSError, struct.error):
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path, expires_at
+
+    def sweep(self, blocking: bool = True):
+        """
+        Borra los ficheros caducados y, si el directorio supera `disk_max_bytes`, los de uso más
+        antiguo. Solo barre un worker a la vez; con `blocking=False` se salta si otro ya lo hace.
+        """
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(os.path.join(os.path.dirname(os.path.abspath(self._path)),
+                                          os.path.basename(self._path) + ".sweep.lock"), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                lock_file.close()
+                return None
+        try:
+            now = time.time()
+            live_entries, total_bytes, expired_removed = [], 0, 0
+            for mtime, size, path, expires_at in self._disk_entries():
+                if expires_at != 0 and expires_at < now:
+                    try:
+                        os.remove(path)
+                        expired_removed += 1
+                    except OSError:
+                        pass
+                    continue
+                live_entries.append((mtime, size, path))
+                total_bytes += size
+
+            evicted = 0
+            if self.disk_max_bytes and total_bytes > self.disk_max_bytes:
+                target_bytes = self.disk_max_bytes * CACHE_DISK_LOW_WATERMARK
+                for mtime, size, path in sorted(live_entries):
+                    if total_bytes <= target_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total_bytes -= size
+                    evicted += 1
+
+            result = {"files": len(live_entries) - evicted, "bytes": total_bytes, "max_bytes": self.disk_max_bytes,
+                      "expired_removed": expired_removed, "evicted": evicted,
+                      "finished_at": int(now), "duration_seconds": round(time.time() - now, 3)}
+            if self._shared_stats is not None:
+                with self._shared_stats.locked() as state:
+                    state["last_sweep"] = result
+            return result
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def flush_stats(self):
+        """Suma al fichero compartido los aciertos/fallos de este worker desde el último volcado."""
+        if self._shared_stats is None:
+            return
+        with self._memory_lock:
+            current = {"tiers": {tier: dict(counters) for tier, counters in self._tier_counters.items()},
+                       "prefixes": {prefix: dict(counters) for prefix, counters in self._prefix_counters.items()}}
+            flushed, self._flushed_counters = self._flushed_counters, current
+            self._lookups_since_flush = 0
+        with self._shared_stats.locked() as state:
+            for section in ("tiers", "prefixes"):
+                shared_section = state.setdefault(section, {})
+                for name, counters in current[section].items():
+                    shared_counters = shared_section.setdefault(name, {})
+                    previous = flushed.get(section, {}).get(name, {})
+                    for counter, value in counters.items():
+                        shared_counters[counter] = shared_counters.get(counter, 0) + value - previous.get(counter, 0)
+
+    def shared_stats(self):
+        """Contadores acumulados de todos los workers y resultado del último barrido."""
+        if self._shared_stats is None:
+            return {}
+        with self._shared_stats.locked() as state:
+            return json.loads(json.dumps(state))
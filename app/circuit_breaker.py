@@ -0,0 +1,101 @@
+# app/circuit_breaker.py
+import os
+import threading
+import time
+
+import requests
+
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)) # Fallos seguidos para abrir
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("CIRCUIT_BREAKER_COOLDOWN_SECONDS", 30))
+
+
+class RiotCircuitOpenError(requests.exceptions.RequestException):
+    """Se lanza sin llamar a Riot mientras el circuito del endpoint está abierto."""
+
+
+class CircuitBreaker:
+    """
+    Circuito por endpoint: tras `failure_threshold` errores 5xx/timeouts seguidos se abre y
+    las llamadas fallan al instante durante `cooldown_seconds`. Después deja pasar una
+    llamada de prueba (semiabierto): si va bien se cierra, si falla se vuelve a abrir.
+    before_call() va antes de los limitadores: un circuito abierto no gasta cupo de Riot.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """Lanza RiotCircuitOpenError si el circuito está abierto. Devuelve True si esta llamada es la de prueba."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.cooldown_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_progress:
+                raise RiotCircuitOpenError(
+                    f"Circuito abierto para {self.name}: Riot está fallando, se reintentará en {max(remaining, 0):.0f}s.")
+            self._trial_in_progress = True
+            return True
+
+    def release_trial(self):
+        """
+        La llamada de prueba se abandonó sin respuesta de Riot (límite de tasa, tarea cancelada...):
+        otra podrá probar. Solo debe llamarla la llamada a la que before_call() devolvió True.
+        """
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_progress or self._consecutive_failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_progress:
+                    print(f"Aviso: circuito abierto para {self.name} tras {self._consecutive_failures} fallos seguidos.")
+                self._opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+class CircuitBreakerRegistry:
+    """Un CircuitBreaker por endpoint, creado bajo demanda."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.failure_threshold, self.cooldown_seconds)
+            return breaker
+
+    def states(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state for breaker in breakers}
+
+
+riot_circuit_breakers = CircuitBreakerRegistry(CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN_SECONDS)
@@ -0,0 +1,76 @@
+# app/cli.py
+import json
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from .extensions import cache
+from .match_archive import match_archive
+
+
+@click.command("match-archive-stats")
+def match_archive_stats_command():
+    """Muestra el tamaño en disco del archivo comprimido de partidas."""
+    click.echo(json.dumps(match_archive.footprint(), indent=4))
+
+
+@click.command("match-archive-prune")
+@click.option("--days", type=int, default=None, help="Retención en días (por defecto MATCH_ARCHIVE_RETENTION_DAYS).")
+@click.option("--vacuum", is_flag=True, help="Compacta después el fichero SQLite para devolver el espacio al disco.")
+def match_archive_prune_command(days, vacuum):
+    """Borra del archivo comprimido las partidas más antiguas que la retención."""
+    deleted = match_archive.prune(days)
+    if vacuum:
+        match_archive.vacuum()
+    click.echo(json.dumps({"deleted": deleted, **match_archive.footprint()}, indent=4))
+
+
+def _hit_ratio(hits: int, lookups: int):
+    return round(hits / lookups, 3) if lookups else None
+
+
+@click.command("cache-stats")
+@click.option("--sweep", is_flag=True, help="Barre antes el directorio (caducados y desalojo por tamaño).")
+@with_appcontext
+def cache_stats_command(sweep):
+    """Muestra el tamaño de la caché de disco y su tasa de aciertos (todos los workers)."""
+    backend = cache.cache
+    if not hasattr(backend, "shared_stats"):
+        raise click.ClickException(f"El backend {type(backend).__name__} no tiene estadísticas.")
+    if sweep:
+        backend.sweep()
+
+    now = time.time()
+    files = total_bytes = expired = 0
+    for _, size, _, expires_at in backend._disk_entries():
+        files += 1
+        total_bytes += size
+        expired += 1 if expires_at and expires_at < now else 0
+    shared_stats = backend.shared_stats()
+    tiers = shared_stats.get("tiers", {})
+    memory_counters = tiers.get("memory", {})
+    disk_counters = tiers.get("disk", {})
+    lookups = memory_counters.get("hits", 0) + memory_counters.get("misses", 0)
+
+    report = {
+        "disk": {"path": backend._path, "files": files, "bytes": total_bytes,
+                 "max_bytes": backend.disk_max_bytes, "expired_files": expired},
+        "lookups": lookups,
+        "hit_ratio": _hit_ratio(memory_counters.get("hits", 0) + disk_counters.get("hits", 0), lookups),
+        "memory_hit_ratio": _hit_ratio(memory_counters.get("hits", 0), lookups),
+        "prefixes": {
+            prefix: {**counters, "hit_ratio": _hit_ratio(
+                counters.get("memory_hits", 0) + counters.get("disk_hits", 0),
+                counters.get("memory_hits", 0) + counters.get("disk_hits", 0) + counters.get("misses", 0))}
+            for prefix, counters in sorted(shared_stats.get("prefixes", {}).items())
+        },
+        "last_sweep": shared_stats.get("last_sweep"),
+    }
+    click.echo(json.dumps(report, indent=4))
+
+
+def register_cli_commands(flask_app_instance):
+    flask_app_instance.cli.add_command(match_archive_stats_command)
+    flask_app_instance.cli.add_command(match_archive_prune_command)
+    flask_app_instance.cli.add_command(cache_stats_command)
@@ -1,11 +1,45 @@
+import os
+
 from flask_caching import Cache
-cache_config = {
-    "CACHE_TYPE": "FileSystemCache",
-    "CACHE_DIR": "instance/flask_cache",
-    "CACHE_DEFAULT_TIMEOUT": 300,
-    "CACHE_OPTIONS": {"mode": 0o700}
-}
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "filesystem") # "filesystem" (por nodo) o "redis" (compartida entre nodos)
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_IS_SHARED = CACHE_BACKEND == "redis"
+
+if CACHE_IS_SHARED:
+    # Caché y estado de coordinación (límites de Riot, single-flight) compartidos por todos los nodos
+    cache_config = {
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_REDIS_URL": CACHE_REDIS_URL,
+        "CACHE_KEY_PREFIX": "lolst:",
+        "CACHE_DEFAULT_TIMEOUT": 300
+    }
+else:
+    cache_config = {
+        # FileSystemCache con un LRU en memoria delante (app/cache_backends.py)
+        "CACHE_TYPE": "app.cache_backends.TieredFileSystemCache",
+        "CACHE_DIR": os.path.join(PROJECT_ROOT, "instance", "flask_cache"),
+        "CACHE_DEFAULT_TIMEOUT": 300,
+        "CACHE_OPTIONS": {"mode": 0o700},
+        "CACHE_THRESHOLD": 0, # Sin límite de entradas: el disco se limita por bytes (CACHE_DISK_MAX_BYTES)
+        "CACHE_DISK_MAX_BYTES": int(os.environ.get("CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024)),
+        "CACHE_SWEEP_INTERVAL": int(os.environ.get("CACHE_SWEEP_INTERVAL", 300)), # Segundos entre barridos (0 los desactiva)
+        "CACHE_STATS_FILE": os.path.join(PROJECT_ROOT, "instance", "flask_cache_stats.json"),
+        "CACHE_MEMORY_MAX_ENTRIES": int(os.environ.get("CACHE_MEMORY_MAX_ENTRIES", 1000)), # 0 desactiva el nivel en memoria
+        "CACHE_MEMORY_MAX_BYTES": int(os.environ.get("CACHE_MEMORY_MAX_BYTES", 64 * 1024 * 1024)),
+        "CACHE_MEMORY_TTL": int(os.environ.get("CACHE_MEMORY_TTL", 60)), # Segundos máximos en memoria sin mirar el disco
+        "CACHE_MEMORY_EXCLUDED_PREFIXES": ("job",) # Estado de los trabajos en segundo plano: siempre desde disco
+    }
 cache = Cache(config=cache_config)
 
+# Cliente Redis para el estado de coordinación (None con la caché de disco).
+# La conexión se abre en el primer uso y redis-py la recrea tras el fork de gunicorn.
+redis_client = None
+if CACHE_IS_SHARED:
+    import redis
+    redis_client = redis.Redis.from_url(CACHE_REDIS_URL)
+
 from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
\ No newline at end of file
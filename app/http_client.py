@@ -0,0 +1,110 @@
+# app/http_client.py
+import os
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RIOT_HTTP_POOL_CONNECTIONS = int(os.environ.get("RIOT_HTTP_POOL_CONNECTIONS", 4)) # Hosts con pool propio
+RIOT_HTTP_POOL_MAXSIZE = int(os.environ.get("RIOT_HTTP_POOL_MAXSIZE", 16)) # Conexiones keep-alive por host
+RIOT_HTTP_MAX_RETRIES = int(os.environ.get("RIOT_HTTP_MAX_RETRIES", 2)) # Reintentos al no poder conectar
+
+
+class PooledHttpClient:
+    """
+    Sesión `requests` con pools keep-alive por host que solo reintenta los fallos de conexión
+    (la petición no llegó a Riot). Cada proceso tiene su propia sesión (se recrea tras un fork de
+    gunicorn) y la comparten todos sus hilos. Los 429 y los 5xx no se reintentan aquí sino en
+    riot_api._riot_get, para que cada reintento pase por los limitadores y cuente en el circuito.
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, max_retries: int, default_headers: dict = None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.default_headers = dict(default_headers or {})
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._in_flight = defaultdict(int)
+        self._peak_in_flight = defaultdict(int)
+        self._request_count = defaultdict(int)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Los sockets heredados del proceso padre no deben reutilizarse en el hijo
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._in_flight.clear()
+        self._peak_in_flight.clear()
+        self._request_count.clear()
+
+    def _build_session(self):
+        retry_policy = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0, # Riot ya recibió la petición: reintentarla sin pasar por los limitadores no es seguro
+            status=0,
+            other=0,
+            allowed_methods=frozenset(["GET"]),
+            backoff_factor=0.3,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              max_retries=retry_policy, pool_block=False)
+        session = requests.Session()
+        session.headers.update(self.default_headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._build_session()
+                    self._session_pid = pid
+        return self._session
+
+    def get(self, url: str, **kwargs):
+        host = urlsplit(url).hostname
+        with self._lock:
+            self._in_flight[host] += 1
+            self._request_count[host] += 1
+            self._peak_in_flight[host] = max(self._peak_in_flight[host], self._in_flight[host])
+        try:
+            return self.session.get(url, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight[host] -= 1
+
+    def pool_stats(self):
+        """Uso de los pools de este proceso por host, para dimensionar RIOT_HTTP_POOL_MAXSIZE."""
+        stats = {"pid": os.getpid(), "pool_connections": self.pool_connections,
+                 "pool_maxsize": self.pool_maxsize, "hosts": {}}
+        with self._lock:
+            for host in self._request_count:
+                stats["hosts"][host] = {"requests": self._request_count[host],
+                                        "in_flight": self._in_flight[host],
+                                        "peak_in_flight": self._peak_in_flight[host]}
+        if self._session is None:
+            return stats
+        adapter = self._session.get_adapter("https://")
+        for pool_key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            host_stats = stats["hosts"].setdefault(pool.host, {})
+            host_stats.update({
+                "connections_opened": pool.num_connections,
+                "pool_requests": pool.num_requests,
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+            })
+        return stats
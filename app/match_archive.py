@@ -0,0 +1,182 @@
+# app/match_archive.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError: # zstd es opcional: sin él se comprime con zlib
+    zstandard = None
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+MATCH_ARCHIVE_PATH = os.environ.get("MATCH_ARCHIVE_PATH", os.path.join(PROJECT_ROOT, "instance", "match_archive.sqlite3"))
+MATCH_ARCHIVE_CODEC = os.environ.get("MATCH_ARCHIVE_CODEC", "zstd" if zstandard else "zlib")
+MATCH_ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get("MATCH_ARCHIVE_COMPRESSION_LEVEL", 6))
+MATCH_ARCHIVE_RETENTION_DAYS = int(os.environ.get("MATCH_ARCHIVE_RETENTION_DAYS", 365)) # Partidas más antiguas se borran (0 = nunca)
+MATCH_ARCHIVE_PRUNE_INTERVAL_SECONDS = 6 * 3600 # Cada cuánto un proceso que escribe en el archivo lo poda
+
+SQLITE_MAX_VARIABLES = 500 # IDs por consulta IN en las lecturas masivas
+
+
+class MatchArchive:
+    """
+    Archivo de partidas de match-v5: JSON compacto y comprimido (zstd o zlib) en SQLite,
+    indexado por match ID. Sustituye a un fichero pickle por partida en la caché de disco.
+    Cada hilo usa su propia conexión (recreada tras un fork de gunicorn).
+    """
+
+    def __init__(self, path: str, codec: str = "zlib", compression_level: int = 6, retention_days: int = 0):
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        self.path = path
+        self.codec = codec
+        self.compression_level = compression_level
+        self.retention_days = retention_days
+        self._next_prune_at = 0.0
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready_pid = None
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and getattr(self._local, "pid", None) == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self._schema_lock:
+            if self._schema_ready_pid != os.getpid():
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS match_archive (
+                        match_id TEXT PRIMARY KEY,
+                        game_creation INTEGER,
+                        stored_at INTEGER NOT NULL,
+                        codec TEXT NOT NULL,
+                        raw_size INTEGER NOT NULL,
+                        data BLOB NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                connection.commit()
+                self._schema_ready_pid = os.getpid()
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(raw)
+        return zlib.compress(raw, self.compression_level)
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise ValueError("Partida archivada con zstd pero el paquete 'zstandard' no está instalado.")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def get(self, match_id: str):
+        return self.get_many([match_id]).get(match_id)
+
+    def get_many(self, match_ids):
+        """Devuelve {match_id: detalles} para los IDs archivados (en bloques de consultas IN)."""
+        found = {}
+        match_ids = list(dict.fromkeys(match_id for match_id in match_ids if match_id))
+        if not match_ids:
+            return found
+        try:
+            connection = self._connection()
+            for i in range(0, len(match_ids), SQLITE_MAX_VARIABLES):
+                chunk = match_ids[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT match_id, codec, data FROM match_archive WHERE match_id IN ({placeholders})", chunk)
+                for match_id, codec, data in rows:
+                    try:
+                        found[match_id] = json.loads(self._decompress(codec, data))
+                    except (ValueError, zlib.error) as e:
+                        print(f"Advertencia: partida archivada {match_id} ilegible: {e}")
+        except sqlite3.Error as e:
+            print(f"Error al leer del archivo de partidas: {e}")
+        return found
+
+    def put(self, match_id: str, match_details: dict):
+        self.put_many({match_id: match_details})
+
+    def put_many(self, match_details_by_id: dict):
+        """Archiva varias partidas en una sola transacción."""
+        rows = []
+        now = int(time.time())
+        for match_id, match_details in match_details_by_id.items():
+            if not match_id or not isinstance(match_details, dict):
+                continue
+            raw = json.dumps(match_details, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            game_creation = (match_details.get("info") or {}).get("gameCreation")
+            rows.append((match_id, game_creation, now, self.codec, len(raw), self._compress(raw)))
+        if not rows:
+            return
+        try:
+            connection = self._connection()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO match_archive (match_id, game_creation, stored_at, codec, raw_size, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            print(f"Error al escribir en el archivo de partidas: {e}")
+        self._prune_if_due()
+
+    def delete_older_than(self, game_creation_ms: int) -> int:
+        """Borra las partidas jugadas antes de `game_creation_ms`. Devuelve cuántas se borraron."""
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute("DELETE FROM match_archive WHERE game_creation < ?", (game_creation_ms,))
+        return cursor.rowcount
+
+    def prune(self, retention_days: int = None) -> int:
+        """Borra las partidas jugadas hace más de `retention_days` días (por defecto, la retención configurada)."""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        if retention_days <= 0:
+            return 0
+        return self.delete_older_than(int((time.time() - retention_days * 86400) * 1000))
+
+    def _prune_if_due(self):
+        """Poda periódica desde las escrituras: como mucho una vez cada MATCH_ARCHIVE_PRUNE_INTERVAL_SECONDS por proceso."""
+        if self.retention_days <= 0 or time.monotonic() < self._next_prune_at:
+            return
+        self._next_prune_at = time.monotonic() + MATCH_ARCHIVE_PRUNE_INTERVAL_SECONDS
+        try:
+            deleted = self.prune()
+        except sqlite3.Error as e:
+            print(f"Error al podar el archivo de partidas: {e}")
+            return
+        if deleted:
+            print(f"Archivo de partidas: {deleted} partidas de hace más de {self.retention_days} días borradas.")
+
+    def vacuum(self):
+        """Reescribe el fichero SQLite sin las páginas libres que dejan los borrados."""
+        self._connection().execute("VACUUM")
+
+    def footprint(self):
+        """Tamaño del archivo: partidas, bytes comprimidos frente a JSON sin comprimir y ficheros en disco."""
+        connection = self._connection()
+        matches, compressed_bytes, raw_bytes = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(raw_size), 0) FROM match_archive").fetchone()
+        file_bytes = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal", "-shm")
+                         if os.path.exists(self.path + suffix))
+        return {
+            "path": self.path,
+            "codec": self.codec,
+            "matches": matches,
+            "compressed_bytes": compressed_bytes,
+            "raw_bytes": raw_bytes,
+            "compression_ratio": round(raw_bytes / compressed_bytes, 2) if compressed_bytes else None,
+            "file_bytes": file_bytes,
+        }
+
+
+match_archive = MatchArchive(MATCH_ARCHIVE_PATH, MATCH_ARCHIVE_CODEC, MATCH_ARCHIVE_COMPRESSION_LEVEL,
+                             MATCH_ARCHIVE_RETENTION_DAYS)
@@ -0,0 +1,270 @@
+# app/match_repository.py
+import json
+import traceback
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from .extensions import db
+from .models import Partida, ParticipantePartida, SincronizacionJugador
+from .ai.analyzer import QUEUE_ID_TO_GAME_MODE_NAME, extract_all_participant_stats_for_db
+# Mapas inversos para reconstruir los IDs que la API devuelve a partir de lo guardado en la BD
+# (se actualizan en el sitio cuando cambian los datos estáticos)
+from .static_data import SPELL_KEY_TO_ID, RUNE_ICON_FILE_TO_STYLE_ID
+
+
+def _participante_to_api_format(participante):
+    item_ids = [int(item_id) for item_id in (participante.item_ids_str or "").split(",") if item_id.strip().isdigit()]
+    item_ids += [0] * (7 - len(item_ids))
+    participant_data = {
+        "puuid": participante.participant_puuid,
+        "riotIdGameName": participante.summoner_name,
+        "championName": participante.champion_name,
+        "teamId": participante.team_id,
+        "win": bool(participante.win),
+        "kills": participante.kills or 0,
+        "deaths": participante.deaths or 0,
+        "assists": participante.assists or 0,
+        # La BD solo guarda el CS total
+        "totalMinionsKilled": participante.cs or 0,
+        "neutralMinionsKilled": 0,
+        "goldEarned": participante.gold_earned or 0,
+        "totalDamageDealtToChampions": participante.total_damage_to_champions or 0,
+        "visionScore": participante.vision_score or 0,
+        "teamPosition": participante.role,
+        "summoner1Id": SPELL_KEY_TO_ID.get(participante.spell1_key),
+        "summoner2Id": SPELL_KEY_TO_ID.get(participante.spell2_key),
+        "perks": {"styles": [
+            {"style": RUNE_ICON_FILE_TO_STYLE_ID.get(participante.primary_rune_style_icon_file)},
+            {"style": RUNE_ICON_FILE_TO_STYLE_ID.get(participante.secondary_rune_style_icon_file)},
+        ]},
+    }
+    for i, item_id in enumerate(item_ids[:7]):
+        participant_data[f"item{i}"] = item_id
+    return participant_data
+
+
+def partida_to_match_json(partida):
+    """Reconstruye una partida guardada con la forma de la respuesta de match-v5 que usa el analizador."""
+    participantes = sorted(partida.participantes, key=lambda p: p.id)
+    participants_data = [_participante_to_api_format(p) for p in participantes]
+
+    teams_data = []
+    for team_id in sorted({p["teamId"] for p in participants_data if p["teamId"] is not None}):
+        team_members = [p for p in participants_data if p["teamId"] == team_id]
+        teams_data.append({
+            "teamId": team_id,
+            "win": any(p["win"] for p in team_members),
+            "objectives": {"champion": {"kills": sum(p["kills"] for p in team_members)}},
+        })
+
+    if partida.queue_id in QUEUE_ID_TO_GAME_MODE_NAME:
+        game_mode = QUEUE_ID_TO_GAME_MODE_NAME[partida.queue_id]
+    elif partida.game_mode_name and partida.game_mode_name.startswith("Clásico"):
+        game_mode = "CLASSIC"
+    else:
+        game_mode = partida.game_mode_name or "Desconocido"
+
+    return {
+        "metadata": {
+            "matchId": partida.match_id,
+            "participants": [p["puuid"] for p in participants_data],
+            "dataSource": "database",
+        },
+        "info": {
+            "gameCreation": partida.game_creation,
+            "gameDuration": partida.game_duration,
+            "gameVersion": partida.game_version,
+            "queueId": partida.queue_id,
+            "gameMode": game_mode,
+            "participants": participants_data,
+            "teams": teams_data,
+        },
+    }
+
+
+def get_stored_match_details(match_ids):
+    """
+    Devuelve {match_id: detalles} para las partidas de `match_ids` que ya están en la BD,
+    con una única consulta. Las partidas terminadas no cambian, así que no hace falta pedirlas a la API.
+    """
+    if not match_ids:
+        return {}
+    try:
+        partidas = (db.session.query(Partida)
+                    .options(selectinload(Partida.participantes))
+                    .filter(Partida.match_id.in_(list(match_ids)))
+                    .all())
+        return {partida.match_id: partida_to_match_json(partida) for partida in partidas if partida.participantes}
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al leer partidas guardadas de la BD: {e}; {traceback.format_exc()}")
+        return {}
+
+
+def is_complete_match(single_match_json_data):
+    return (isinstance(single_match_json_data, dict) and
+            "metadata" in single_match_json_data and
+            isinstance(single_match_json_data["metadata"], dict) and
+            "info" in single_match_json_data and
+            isinstance(single_match_json_data["info"], dict) and
+            isinstance(single_match_json_data["info"].get("participants"), list) and
+            isinstance(single_match_json_data["info"].get("teams"), list))
+
+
+def _game_mode_name(info):
+    queue_id_val = info.get("queueId")
+    game_mode_name_val = QUEUE_ID_TO_GAME_MODE_NAME.get(queue_id_val, info.get("gameMode", "Desconocido"))
+    if game_mode_name_val == "CLASSIC" and queue_id_val is not None: game_mode_name_val = f"Clásico ({queue_id_val})"
+    elif game_mode_name_val == "CLASSIC": game_mode_name_val = "Clásico (Otro)"
+    elif game_mode_name_val == "Desconocido" and queue_id_val is not None: game_mode_name_val = f"Modo ID: {queue_id_val}"
+    return game_mode_name_val
+
+
+def match_to_rows(match_id, single_match_json_data):
+    """Filas (partida, [participantes]) de una partida de match-v5, como dicts de columnas."""
+    info = single_match_json_data["info"]
+    partida_row = {"match_id": match_id, "game_creation": info.get("gameCreation"),
+                   "game_duration": info.get("gameDuration"), "game_version": info.get("gameVersion"),
+                   "queue_id": info.get("queueId"), "game_mode_name": _game_mode_name(info),
+                   "fecha_guardado": datetime.utcnow()}
+    participante_rows = [dict(p_stat, match_id=match_id)
+                         for p_stat in extract_all_participant_stats_for_db(single_match_json_data)
+                         if p_stat.get("participant_puuid")]
+    return partida_row, participante_rows
+
+
+def get_existing_match_ids(match_ids):
+    """Subconjunto de `match_ids` que ya está en la BD, con una única consulta IN."""
+    if not match_ids:
+        return set()
+    rows = db.session.query(Partida.match_id).filter(Partida.match_id.in_(list(match_ids))).all()
+    return {row.match_id for row in rows}
+
+
+def get_match_participant_puuids(match_ids):
+    """PUUIDs de los participantes guardados de `match_ids` (una consulta)."""
+    if not match_ids:
+        return set()
+    rows = (db.session.query(ParticipantePartida.participant_puuid)
+            .filter(ParticipantePartida.match_id.in_(list(match_ids)))
+            .distinct().all())
+    return {row.participant_puuid for row in rows}
+
+
+def _insert_partidas_ignoring_conflicts():
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING match_id en SQLite y PostgreSQL; None en otras BD."""
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return (dialect_insert(Partida)
+            .on_conflict_do_nothing(index_elements=[Partida.match_id])
+            .returning(Partida.match_id))
+
+
+def save_new_matches(match_details_list):
+    """
+    Guarda en la BD las partidas de `match_details_list` que aún no estén, en una sola
+    transacción: una consulta IN para saber cuáles existen y dos inserciones executemany
+    (partidas y participantes). Si dos workers guardan la misma partida a la vez, el segundo
+    la omite (ON CONFLICT DO NOTHING). Devuelve el número de partidas añadidas.
+    """
+    match_details_by_id = {}
+    for single_match_json_data in match_details_list:
+        if is_complete_match(single_match_json_data) and single_match_json_data["metadata"].get("matchId"):
+            match_details_by_id[single_match_json_data["metadata"]["matchId"]] = single_match_json_data
+    if not match_details_by_id:
+        return 0
+    try:
+        existing_match_ids = get_existing_match_ids(match_details_by_id)
+        partida_rows, participante_rows = [], []
+        for match_id, single_match_json_data in match_details_by_id.items():
+            if match_id in existing_match_ids:
+                continue
+            partida_row, rows = match_to_rows(match_id, single_match_json_data)
+            partida_rows.append(partida_row)
+            participante_rows.extend(rows)
+        if not partida_rows:
+            return 0
+        partida_insert = _insert_partidas_ignoring_conflicts()
+        if partida_insert is not None:
+            # Si otro worker guardó alguna entre la consulta IN y aquí, se salta esa partida y sus participantes
+            inserted_match_ids = set(db.session.scalars(partida_insert, partida_rows))
+            participante_rows = [row for row in participante_rows if row["match_id"] in inserted_match_ids]
+        else:
+            db.session.execute(insert(Partida), partida_rows)
+            inserted_match_ids = {row["match_id"] for row in partida_rows}
+        if participante_rows:
+            db.session.execute(insert(ParticipantePartida), participante_rows)
+        db.session.commit()
+        return len(inserted_match_ids)
+    except IntegrityError:
+        # Otra base de datos sin ON CONFLICT: el worker con el que se compitió ya las guardó
+        db.session.rollback()
+        print(f"Aviso: otro proceso guardó a la vez alguna de estas {len(match_details_by_id)} partidas; se omiten.")
+        return 0
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al guardar {len(match_details_by_id)} partidas en la BD: {e}; {traceback.format_exc()}")
+        return 0
+
+
+# --- Estado de sincronización incremental por jugador ---
+def get_sync_state(puuid):
+    """Devuelve (match_ids conocidos, synced_count, last_game_creation) o None si el jugador nunca se sincronizó."""
+    try:
+        state = db.session.get(SincronizacionJugador, puuid)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al leer el estado de sincronización de {puuid}: {e}")
+        return None
+    if state is None:
+        return None
+    try:
+        match_ids = json.loads(state.match_ids_json or "[]")
+    except ValueError:
+        match_ids = []
+    return match_ids, state.synced_count or 0, state.last_game_creation
+
+
+def save_sync_state(puuid, match_ids, synced_count=None):
+    """Guarda la lista de IDs conocidos del jugador (y el tamaño de la última sincronización completa)."""
+    try:
+        state = db.session.get(SincronizacionJugador, puuid)
+        if state is None:
+            state = SincronizacionJugador(puuid=puuid, synced_count=0)
+            db.session.add(state)
+        state.match_ids_json = json.dumps(match_ids)
+        if synced_count is not None:
+            state.synced_count = synced_count
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al guardar el estado de sincronización de {puuid}: {e}")
+
+
+def advance_sync_cursor(puuid, match_details_list):
+    """Mueve el cursor a la partida más reciente de `match_details_list` si es posterior al actual."""
+    newest_match = None
+    for match_details in match_details_list:
+        game_creation = (match_details.get("info") or {}).get("gameCreation")
+        if game_creation and (newest_match is None or game_creation > newest_match[1]):
+            newest_match = (match_details["metadata"].get("matchId"), game_creation)
+    if newest_match is None:
+        return
+    try:
+        state = db.session.get(SincronizacionJugador, puuid)
+        if state is None:
+            return
+        if state.last_game_creation is None or newest_match[1] > state.last_game_creation:
+            state.last_match_id, state.last_game_creation = newest_match
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al actualizar el cursor de sincronización de {puuid}: {e}")
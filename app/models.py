@@ -66,4 +66,23 @@ class ParticipantePartida(db.Model):
     secondary_rune_style_icon_file = db.Column(db.String(100))
 
     def __repr__(self):
-        return f'<Participante {self.summoner_name} ({self.champion_name}) en Partida {self.match_id}>'
\ No newline at end of file
+        return f'<Participante {self.summoner_name} ({self.champion_name}) en Partida {self.match_id}>'
+
+class SincronizacionJugador(db.Model):
+    __tablename__ = 'sincronizacion_jugador'
+
+    puuid = db.Column(db.String(100), primary_key=True)
+
+    # IDs de partidas conocidos del jugador (JSON, de la más reciente a la más antigua)
+    match_ids_json = db.Column(db.Text, default="[]")
+    # Cuántas partidas recientes se pidieron en la última sincronización completa
+    synced_count = db.Column(db.Integer, default=0)
+
+    # Cursor: partida más reciente de la que ya tenemos detalles
+    last_match_id = db.Column(db.String(100))
+    last_game_creation = db.Column(db.BigInteger) # Milisegundos, como gameCreation de match-v5
+
+    fecha_sincronizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SincronizacionJugador {self.puuid} ({self.last_match_id})>'
@@ -0,0 +1,359 @@
+# app/rate_limiter.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+from .extensions import redis_client
+
+try:
+    import redis
+except ImportError: # Solo hace falta con CACHE_BACKEND=redis
+    redis = None
+
+try:
+    import fcntl
+except ImportError: # Windows: el estado de los límites solo se comparte dentro del proceso
+    fcntl = None
+
+# Límites por defecto de una development key de Riot: 20 peticiones por segundo.
+RIOT_API_RATE_PER_SECOND = float(os.environ.get("RIOT_API_RATE_PER_SECOND", 20))
+RIOT_API_BURST = int(os.environ.get("RIOT_API_BURST", 20))
+
+
+class TokenBucket:
+    """Limitador token-bucket thread-safe: rellena `rate` tokens por segundo hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("El rate y la capacidad del TokenBucket deben ser positivos.")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Intenta consumir `tokens`. Devuelve 0 si lo consigue o los segundos a esperar si no."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """Bloquea hasta poder consumir `tokens` del bucket."""
+        while True:
+            wait_seconds = self.try_acquire(tokens)
+            if wait_seconds <= 0:
+                return
+            time.sleep(wait_seconds)
+
+
+# Limitador compartido por todas las llamadas a la API de Riot de este proceso
+riot_rate_limiter = TokenBucket(RIOT_API_RATE_PER_SECOND, RIOT_API_BURST)
+
+
+# --- Governor de límites de Riot basado en cabeceras ---
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+RIOT_RATE_LIMIT_STATE_FILE = os.environ.get(
+    "RIOT_RATE_LIMIT_STATE_FILE", os.path.join(PROJECT_ROOT, "instance", "riot_rate_limits.json"))
+RIOT_APP_RATE_LIMIT_DEFAULT = os.environ.get("RIOT_APP_RATE_LIMIT", "20:1,100:120") # Límites de una development key
+RIOT_API_MAX_WAIT_SECONDS = float(os.environ.get("RIOT_API_MAX_WAIT_SECONDS", 30))
+RIOT_API_DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+
+class RiotRateLimitError(requests.exceptions.RequestException):
+    """Se lanza cuando respetar los límites de Riot exigiría esperar más de lo permitido."""
+
+
+def parse_rate_limit_header(header_value):
+    """Convierte '20:1,100:120' en {1: 20, 120: 100} (ventana en segundos -> valor)."""
+    parsed = {}
+    if not header_value:
+        return parsed
+    for pair in header_value.split(","):
+        try:
+            value, window_seconds = pair.strip().split(":")
+            parsed[int(window_seconds)] = int(value)
+        except ValueError:
+            continue
+    return parsed
+
+
+class _SharedStateFile:
+    """Estado JSON compartido entre workers de gunicorn, protegido con flock sobre un fichero .lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._memory_state = {}
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                # Sin flock (p. ej. Windows) el estado solo se comparte dentro del proceso
+                yield self._memory_state
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    state = self._read()
+                    yield state
+                    self._write(state)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, state):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+class RiotRateLimitGovernor:
+    """
+    Aplica los límites de aplicación (por host regional) y de método (por endpoint) que Riot
+    anuncia en X-App-Rate-Limit / X-Method-Rate-Limit y sus cabeceras -Count.
+    Las ventanas se guardan en un fichero compartido para que todos los workers las respeten.
+    """
+
+    def __init__(self, state_file: str, default_app_limits: dict, max_wait_seconds: float):
+        self._store = _SharedStateFile(state_file)
+        self.default_app_limits = default_app_limits
+        self.max_wait_seconds = max_wait_seconds
+
+    @staticmethod
+    def _app_scope(url):
+        return f"app:{urlsplit(url).netloc}"
+
+    @staticmethod
+    def _method_scope(endpoint):
+        return f"method:{endpoint}"
+
+    def _get_scope(self, state, scope_name):
+        scope = state.setdefault(scope_name, {"limits": {}, "windows": {}, "blocked_until": 0})
+        if not scope["limits"] and scope_name.startswith("app:"):
+            scope["limits"] = {str(window): limit for window, limit in self.default_app_limits.items()}
+        return scope
+
+    def _required_wait(self, scope, now):
+        wait_seconds = scope.get("blocked_until", 0) - now
+        for window, limit in scope["limits"].items():
+            count, reset_at = scope["windows"].get(window, [0, None])
+            if reset_at is not None and now >= reset_at:
+                scope["windows"].pop(window, None)
+                continue
+            if count >= limit and reset_at is not None:
+                wait_seconds = max(wait_seconds, reset_at - now)
+        return wait_seconds
+
+    def _reserve(self, scope, now):
+        for window in scope["limits"]:
+            count, reset_at = scope["windows"].get(window, [0, None])
+            scope["windows"][window] = [count + 1, reset_at if reset_at is not None else now + int(window)]
+
+    def try_acquire(self, endpoint: str, url: str) -> float:
+        """Reserva la petición si cabe. Devuelve 0 si se ha reservado o los segundos a esperar si no."""
+        scope_names = [self._app_scope(url), self._method_scope(endpoint)]
+        with self._store.locked() as state:
+            now = time.time()
+            scopes = [self._get_scope(state, name) for name in scope_names]
+            wait_seconds = max(self._required_wait(scope, now) for scope in scopes)
+            if wait_seconds <= 0:
+                for scope in scopes:
+                    self._reserve(scope, now)
+                return 0.0
+            return wait_seconds
+
+    def acquire(self, endpoint: str, url: str):
+        """Bloquea hasta que la petición cabe en todas las ventanas del host y del endpoint."""
+        waited = 0.0
+        while True:
+            wait_seconds = self.try_acquire(endpoint, url)
+            if wait_seconds <= 0:
+                return
+            if waited + wait_seconds > self.max_wait_seconds:
+                raise RiotRateLimitError(
+                    f"Límite de Riot alcanzado para {endpoint}: habría que esperar {wait_seconds:.1f}s.")
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+    def update_from_response(self, endpoint: str, url: str, response):
+        """Sincroniza las ventanas con las cabeceras de la respuesta y registra los 429."""
+        response_headers = response.headers or {}
+        with self._store.locked() as state:
+            now = time.time()
+            app_scope = self._get_scope(state, self._app_scope(url))
+            method_scope = self._get_scope(state, self._method_scope(endpoint))
+            for scope, prefix in ((app_scope, "X-App-Rate-Limit"), (method_scope, "X-Method-Rate-Limit")):
+                limits = parse_rate_limit_header(response_headers.get(prefix))
+                if limits:
+                    scope["limits"] = {str(window): limit for window, limit in limits.items()}
+                for window, count in parse_rate_limit_header(response_headers.get(f"{prefix}-Count")).items():
+                    local_count, reset_at = scope["windows"].get(str(window), [0, None])
+                    scope["windows"][str(window)] = [max(local_count, count), reset_at if reset_at is not None else now + window]
+
+            if response.status_code == 429:
+                retry_after = self.retry_after_seconds(response)
+                limit_type = response_headers.get("X-Rate-Limit-Type", "service")
+                blocked_scope = app_scope if limit_type == "application" else method_scope
+                blocked_scope["blocked_until"] = max(blocked_scope.get("blocked_until", 0), now + retry_after)
+
+    @staticmethod
+    def retry_after_seconds(response):
+        try:
+            return max(0.0, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return RIOT_API_DEFAULT_RETRY_AFTER_SECONDS
+
+
+# Reserva atómica en Redis: contadores INCR + PEXPIRE por ventana, sin lock bloqueante.
+# ARGV: prefijo, límites por defecto de la app ([ventana, límite, ...] en JSON), ámbitos...
+_REDIS_TRY_ACQUIRE_SCRIPT = """
+local prefix = ARGV[1]
+local wait_ms = 0
+local counters = {}
+for i = 3, #ARGV do
+    local scope = prefix .. ARGV[i]
+    local blocked_ms = redis.call('PTTL', scope .. ':blocked')
+    if blocked_ms > wait_ms then wait_ms = blocked_ms end
+    local limits = redis.call('HGETALL', scope .. ':limits')
+    if #limits == 0 and string.sub(ARGV[i], 1, 4) == 'app:' then limits = cjson.decode(ARGV[2]) end
+    for j = 1, #limits, 2 do
+        local counter = scope .. ':w:' .. limits[j]
+        if tonumber(redis.call('GET', counter) or '0') >= tonumber(limits[j + 1]) then
+            local ttl_ms = redis.call('PTTL', counter)
+            if ttl_ms > wait_ms then wait_ms = ttl_ms end
+        end
+        table.insert(counters, {counter, tonumber(limits[j]) * 1000})
+    end
+end
+if wait_ms > 0 then return wait_ms end
+for _, counter in ipairs(counters) do
+    if redis.call('INCR', counter[1]) == 1 or redis.call('PTTL', counter[1]) < 0 then
+        redis.call('PEXPIRE', counter[1], counter[2])
+    end
+end
+return 0
+"""
+
+# Sincroniza con las cabeceras de una respuesta. ARGV: prefijo, ámbito de app, ámbito de método,
+# y por cada uno límites y cuentas ([ventana, valor, ...] en JSON); después ámbito bloqueado ('' si no) y ms.
+_REDIS_UPDATE_SCRIPT = """
+local prefix = ARGV[1]
+local function apply(scope, limits_json, counts_json)
+    local limits = cjson.decode(limits_json)
+    if #limits > 0 then
+        redis.call('DEL', scope .. ':limits')
+        redis.call('HSET', scope .. ':limits', unpack(limits))
+    end
+    local counts = cjson.decode(counts_json)
+    for j = 1, #counts, 2 do
+        local counter = scope .. ':w:' .. counts[j]
+        local ttl_ms = redis.call('PTTL', counter)
+        if ttl_ms <= 0 then ttl_ms = tonumber(counts[j]) * 1000 end
+        local count = math.max(tonumber(redis.call('GET', counter) or '0'), tonumber(counts[j + 1]))
+        redis.call('SET', counter, count, 'PX', ttl_ms)
+    end
+end
+apply(prefix .. ARGV[2], ARGV[4], ARGV[5])
+apply(prefix .. ARGV[3], ARGV[6], ARGV[7])
+if ARGV[8] ~= '' then
+    local blocked = prefix .. ARGV[8] .. ':blocked'
+    if tonumber(ARGV[9]) > redis.call('PTTL', blocked) then
+        redis.call('SET', blocked, 1, 'PX', ARGV[9])
+    end
+end
+return 0
+"""
+REDIS_FALLBACK_WARNING_INTERVAL_SECONDS = 60
+
+
+def _flatten_limits(limits: dict):
+    return json.dumps([str(value) for window, limit in limits.items() for value in (window, limit)])
+
+
+class RedisRiotRateLimitGovernor(RiotRateLimitGovernor):
+    """
+    El mismo governor con el estado en Redis (compartido entre nodos). Cada reserva y cada
+    actualización es un script Lua atómico sobre contadores con caducidad, así que ningún worker
+    espera a un lock. Si Redis falla, se usa el estado local (fichero compartido del nodo) hasta
+    que vuelva: los límites se siguen respetando por nodo y las peticiones no fallan por Redis.
+    """
+
+    def __init__(self, client, key_prefix: str, state_file: str, default_app_limits: dict, max_wait_seconds: float):
+        super().__init__(state_file, default_app_limits, max_wait_seconds)
+        self.client = client
+        self.key_prefix = key_prefix
+        self._try_acquire_script = client.register_script(_REDIS_TRY_ACQUIRE_SCRIPT)
+        self._update_script = client.register_script(_REDIS_UPDATE_SCRIPT)
+        self._last_warning_at = 0.0
+
+    def _warn_fallback(self, error):
+        now = time.monotonic()
+        if now - self._last_warning_at >= REDIS_FALLBACK_WARNING_INTERVAL_SECONDS:
+            self._last_warning_at = now
+            print(f"Aviso: Redis no disponible para los límites de Riot ({error}); se usa el estado local.")
+
+    def try_acquire(self, endpoint: str, url: str) -> float:
+        try:
+            wait_ms = self._try_acquire_script(args=[self.key_prefix, _flatten_limits(self.default_app_limits),
+                                                     self._app_scope(url), self._method_scope(endpoint)])
+        except redis.exceptions.RedisError as e:
+            self._warn_fallback(e)
+            return super().try_acquire(endpoint, url)
+        return int(wait_ms) / 1000.0
+
+    def update_from_response(self, endpoint: str, url: str, response):
+        response_headers = response.headers or {}
+        app_scope, method_scope = self._app_scope(url), self._method_scope(endpoint)
+        blocked_scope, blocked_ms = "", 0
+        if response.status_code == 429:
+            limit_type = response_headers.get("X-Rate-Limit-Type", "service")
+            blocked_scope = app_scope if limit_type == "application" else method_scope
+            blocked_ms = int(self.retry_after_seconds(response) * 1000)
+            if blocked_ms <= 0:
+                blocked_scope = ""
+        try:
+            self._update_script(args=[
+                self.key_prefix, app_scope, method_scope,
+                _flatten_limits(parse_rate_limit_header(response_headers.get("X-App-Rate-Limit"))),
+                _flatten_limits(parse_rate_limit_header(response_headers.get("X-App-Rate-Limit-Count"))),
+                _flatten_limits(parse_rate_limit_header(response_headers.get("X-Method-Rate-Limit"))),
+                _flatten_limits(parse_rate_limit_header(response_headers.get("X-Method-Rate-Limit-Count"))),
+                blocked_scope, blocked_ms])
+        except redis.exceptions.RedisError as e:
+            self._warn_fallback(e)
+            super().update_from_response(endpoint, url, response)
+
+
+# Governor compartido por todos los workers (a través del fichero de estado, o de Redis entre nodos)
+if redis_client is not None:
+    riot_rate_governor = RedisRiotRateLimitGovernor(
+        redis_client, "lolst:riot_rate_limits:", RIOT_RATE_LIMIT_STATE_FILE,
+        parse_rate_limit_header(RIOT_APP_RATE_LIMIT_DEFAULT), RIOT_API_MAX_WAIT_SECONDS)
+else:
+    riot_rate_governor = RiotRateLimitGovernor(
+        RIOT_RATE_LIMIT_STATE_FILE, parse_rate_limit_header(RIOT_APP_RATE_LIMIT_DEFAULT), RIOT_API_MAX_WAIT_SECONDS)
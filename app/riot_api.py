@@ -1,10 +1,20 @@
 # app/riot_api.py
 import requests
 import os
+import threading
 import time
-from .extensions import cache
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from flask import current_app, has_app_context
+from .match_archive import match_archive
+from .match_repository import get_stored_match_details, get_sync_state, save_sync_state, advance_sync_cursor
+from .circuit_breaker import riot_circuit_breakers
+from .http_client import PooledHttpClient, RIOT_HTTP_POOL_CONNECTIONS, RIOT_HTTP_POOL_MAXSIZE, RIOT_HTTP_MAX_RETRIES
+from .rate_limiter import riot_rate_limiter, riot_rate_governor
+from .riot_cache import RiotNotFound, swr_cached, ttls_from_env, read_shared_many, write_shared_many
+from .single_flight import single_flight
 
-RIOT_API_KEY = ("") 
+RIOT_API_KEY = os.environ.get("RIOT_API_KEY", "")
 if not RIOT_API_KEY:
     raise ValueError("La variable de entorno RIOT_API_KEY no está configurada. Por favor, configúrala.")
 
@@ -17,14 +27,107 @@ headers = {
 ACCOUNT_REGION = os.environ.get("RIOT_ACCOUNT_REGION", "europe") 
 PLATFORM_REGION = os.environ.get("RIOT_PLATFORM_REGION", "euw1") 
 
+# Hosts de Riot; se pueden apuntar a otro servidor (p. ej. mock_riot_server.py) para pruebas de carga
+RIOT_ACCOUNT_BASE_URL = os.environ.get("RIOT_ACCOUNT_BASE_URL", f"https://{ACCOUNT_REGION}.api.riotgames.com").rstrip("/")
+RIOT_PLATFORM_BASE_URL = os.environ.get("RIOT_PLATFORM_BASE_URL", f"https://{PLATFORM_REGION}.api.riotgames.com").rstrip("/")
+
 API_BASE_URLS = {
-    "account": f"https://{ACCOUNT_REGION}.api.riotgames.com/riot/account/v1/accounts",
-    "summoner_v4": f"https://{PLATFORM_REGION}.api.riotgames.com/lol/summoner/v4/summoners",
-    "league_v4": f"https://{PLATFORM_REGION}.api.riotgames.com/lol/league/v4/entries",
-    "match_v5": f"https://{ACCOUNT_REGION}.api.riotgames.com/lol/match/v5/matches"
+    "account": f"{RIOT_ACCOUNT_BASE_URL}/riot/account/v1/accounts",
+    "summoner_v4": f"{RIOT_PLATFORM_BASE_URL}/lol/summoner/v4/summoners",
+    "league_v4": f"{RIOT_PLATFORM_BASE_URL}/lol/league/v4/entries",
+    "match_v5": f"{RIOT_ACCOUNT_BASE_URL}/lol/match/v5/matches"
 }
 
 REQUEST_TIMEOUT_SECONDS = 10 # Timeout para las peticiones requests
+RIOT_API_MAX_RETRIES = int(os.environ.get("RIOT_API_MAX_RETRIES", 3)) # Reintentos tras un 429
+RIOT_API_SERVER_ERROR_RETRIES = int(os.environ.get("RIOT_API_SERVER_ERROR_RETRIES", 2)) # Reintentos tras un 5xx
+RIOT_API_SERVER_ERROR_BACKOFF_SECONDS = 0.3 # Espera antes del primer reintento tras un 5xx (se duplica en cada uno)
+MATCH_IDS_MAX_COUNT = 100 # Máximo de IDs por llamada que permite match-v5
+MATCH_IDS_FILTERS = ("queue", "match_type", "start_time", "end_time") # Filtros opcionales de la lista de IDs
+MATCH_DETAIL_FETCH_WORKERS = int(os.environ.get("MATCH_DETAIL_FETCH_WORKERS", 8)) # Descargas de detalles en paralelo
+
+# Tiempos de caché (soft TTL, hard TTL) en segundos, compartidos con el cliente asíncrono.
+# Pasado el soft TTL se sirve el valor obsoleto y se revalida en segundo plano hasta el hard TTL.
+CACHE_TTL_SUMMONER_INFO = ttls_from_env("SUMMONER_INFO", 900, 86400) # 15 minutos / 1 día
+CACHE_TTL_SUMMONER_V4 = ttls_from_env("SUMMONER_V4", 3600, 86400) # 1 hora / 1 día
+CACHE_TTL_LEAGUE_ENTRIES = ttls_from_env("LEAGUE_ENTRIES", 300, 3600) # 5 minutos / 1 hora
+CACHE_TTL_MATCH_IDS = ttls_from_env("MATCH_IDS", 300, 3600) # 5 minutos / 1 hora
+CACHE_TTL_MATCH_IDS_SINCE = ttls_from_env("MATCH_IDS_SINCE", 60, 300) # 1 minuto / 5 minutos (sincronización incremental)
+CACHE_TTL_MATCH_DETAIL_SHARED = int(os.environ.get("CACHE_TTL_MATCH_DETAIL_SHARED", 604800)) # 7 días, solo con CACHE_BACKEND=redis
+
+# Cliente HTTP con conexiones keep-alive compartido por todas las llamadas a Riot
+riot_http_client = PooledHttpClient(RIOT_HTTP_POOL_CONNECTIONS, RIOT_HTTP_POOL_MAXSIZE,
+                                    RIOT_HTTP_MAX_RETRIES, default_headers=headers)
+
+def get_http_pool_stats():
+    """Estadísticas de uso del pool de conexiones de este worker."""
+    return riot_http_client.pool_stats()
+
+def get_circuit_breaker_states():
+    """Estado del circuito de cada endpoint de Riot en este worker."""
+    return riot_circuit_breakers.states()
+
+def _riot_get(endpoint: str, url: str):
+    """
+    GET a la API de Riot respetando los límites anunciados por Riot y reintentando tras un 429 o
+    un 5xx; cada reintento vuelve a pasar por los limitadores. Si el endpoint acumula errores
+    5xx/timeouts, su circuito se abre y se falla sin llamar a Riot.
+    """
+    breaker = riot_circuit_breakers.get(endpoint)
+    rate_limit_retries = server_error_retries = 0
+    while True:
+        # El circuito primero: si está abierto se falla sin esperar al bucket ni ocupar ventana
+        is_trial = breaker.before_call()
+        try:
+            riot_rate_limiter.acquire()
+            riot_rate_governor.acquire(endpoint, url)
+        except BaseException:
+            if is_trial: # RiotRateLimitError: la prueba ni siquiera llegó a Riot
+                breaker.release_trial()
+            raise
+        try:
+            response = riot_http_client.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException:
+            # Timeouts, conexión, respuesta cortada (ChunkedEncodingError), redirecciones...
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Nunca dejar el circuito semiabierto esperando a una prueba que no terminará
+            if is_trial:
+                breaker.release_trial()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        riot_rate_governor.update_from_response(endpoint, url, response)
+        retry_delay = _retry_delay(endpoint, response, rate_limit_retries, server_error_retries, breaker)
+        if retry_delay is None:
+            return response
+        if response.status_code == 429:
+            rate_limit_retries += 1
+        else:
+            server_error_retries += 1
+            time.sleep(retry_delay)
+
+def _retry_delay(endpoint: str, response, rate_limit_retries: int, server_error_retries: int, breaker):
+    """
+    Segundos de espera antes de reintentar la respuesta (el governor ya espera tras un 429), o
+    None si no se reintenta. Un 5xx no se reintenta si el circuito ya se ha abierto.
+    """
+    status_code = response.status_code
+    if status_code == 429 and rate_limit_retries < RIOT_API_MAX_RETRIES:
+        print(f"Aviso: 429 de Riot en {endpoint} (Retry-After {response.headers.get('Retry-After', 'N/A')}), reintento {rate_limit_retries + 1}/{RIOT_API_MAX_RETRIES}.")
+        return 0.0
+    if status_code >= 500 and server_error_retries < RIOT_API_SERVER_ERROR_RETRIES and breaker.state == "closed":
+        print(f"Aviso: {status_code} de Riot en {endpoint}, reintento {server_error_retries + 1}/{RIOT_API_SERVER_ERROR_RETRIES}.")
+        return RIOT_API_SERVER_ERROR_BACKOFF_SECONDS * 2 ** server_error_retries
+    return None
+
+def _match_ids_filters(queue=None, match_type=None, start_time=None, end_time=None):
+    """Parámetros de match-v5 (queue, type, startTime, endTime) que tienen valor."""
+    match_filters = {"queue": queue, "type": match_type, "startTime": start_time, "endTime": end_time}
+    return {name: value for name, value in match_filters.items() if value is not None}
 
 # --- Funciones para generar claves de caché explícitas ---
 def _make_cache_key_summoner_info(*args, **kwargs):
@@ -46,26 +149,51 @@ def _make_cache_key_match_ids(*args, **kwargs):
     puuid = kwargs.get('puuid', args[0] if args and len(args) > 0 else None)
     count = kwargs.get('count', args[1] if args and len(args) > 1 else None)
     start = kwargs.get('start', args[2] if args and len(args) > 2 else 0) 
-    return f"matchids__{puuid}__{count}__{start}"
+    cache_key = f"matchids__{puuid}__{count}__{start}"
+    match_filters = _match_ids_filters(*args[3:], **{name: value for name, value in kwargs.items() if name in MATCH_IDS_FILTERS})
+    if match_filters:
+        cache_key += "__" + "__".join(f"{name}={value}" for name, value in match_filters.items())
+    return cache_key
+
+def _make_cache_key_match_ids_since(*args, **kwargs):
+    puuid = kwargs.get('puuid', args[0] if args and len(args) > 0 else None)
+    start_time = kwargs.get('start_time', args[1] if args and len(args) > 1 else None)
+    return f"matchidssince__{puuid}__{start_time}"
 
 def _make_cache_key_match_detail(*args, **kwargs):
     match_id = kwargs.get('match_id', args[0] if args and len(args) > 0 else None)
     return f"matchdetail__{match_id}"
 
-# --- Funciones de API cacheadas usando make_cache_key ---
-@cache.cached(timeout=900, make_cache_key=_make_cache_key_summoner_info) # Cache por 15 minutos
+# --- Detalles de partidas en la caché compartida entre nodos (solo con CACHE_BACKEND=redis) ---
+def _get_shared_match_details(match_ids):
+    """{match_id: detalles} de las partidas que otro nodo ya dejó en la caché compartida (un solo MGET)."""
+    cache_keys = [_make_cache_key_match_detail(match_id) for match_id in match_ids]
+    shared_values = read_shared_many(cache_keys)
+    return {match_id: shared_values[cache_key] for match_id, cache_key in zip(match_ids, cache_keys)
+            if isinstance(shared_values.get(cache_key), dict)}
+
+def _share_match_details(match_details_by_id: dict):
+    write_shared_many({_make_cache_key_match_detail(match_id): match_details
+                       for match_id, match_details in match_details_by_id.items()},
+                      CACHE_TTL_MATCH_DETAIL_SHARED)
+
+def _lookup_stored_match_detail(match_id: str):
+    return match_archive.get(match_id) or _get_shared_match_details([match_id]).get(match_id)
+
+# --- Funciones de API cacheadas (stale-while-revalidate + single-flight) ---
+@swr_cached(_make_cache_key_summoner_info, *CACHE_TTL_SUMMONER_INFO)
 def get_summoner_info(name: str, tag: str):
     """Obtiene la información de la cuenta (incluyendo PUUID) por Riot ID."""
-    print(f"[[API CALL w/ make_cache_key]] get_summoner_info para {name}#{tag}") 
+    print(f"[[API CALL]] get_summoner_info para {name}#{tag}") 
     url = f"{API_BASE_URLS['account']}/by-riot-id/{name}/{tag}"
     try:
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        response = _riot_get("account", url)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as http_err:
         error_text = response.text if 'response' in locals() and hasattr(response, 'text') else 'No response text'
         print(f"Error HTTP (Account API) para {name}#{tag}: {http_err} - Status: {response.status_code if 'response' in locals() else 'N/A'} - Text: {error_text}")
-        return None
+        return RiotNotFound(None) if response.status_code == 404 else None
     except requests.exceptions.RequestException as req_err:
         print(f"Error de red/conexión (Account API) para {name}#{tag}: {req_err}")
         return None
@@ -73,20 +201,20 @@ def get_summoner_info(name: str, tag: str):
         print(f"Error al decodificar JSON (Account API) para {name}#{tag}: {json_err}")
         return None
 
-@cache.cached(timeout=3600, make_cache_key=_make_cache_key_summoner_v4) # Cache por 1 hora
+@swr_cached(_make_cache_key_summoner_v4, *CACHE_TTL_SUMMONER_V4)
 def get_summoner_v4_details_by_puuid(puuid: str):
     """Obtiene detalles del invocador (nivel, icono, ID encriptado) desde SUMMONER-V4."""
-    print(f"[[API CALL w/ make_cache_key]] get_summoner_v4_details_by_puuid para PUUID {puuid}")
+    print(f"[[API CALL]] get_summoner_v4_details_by_puuid para PUUID {puuid}")
     if not puuid: return None
     url = f"{API_BASE_URLS['summoner_v4']}/by-puuid/{puuid}"
     try:
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        response = _riot_get("summoner_v4", url)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as http_err:
         error_text = response.text if 'response' in locals() and hasattr(response, 'text') else 'No response text'
         print(f"Error HTTP (Summoner-V4 API) para PUUID {puuid}: {http_err} - Status: {response.status_code} - Text: {error_text}")
-        return None
+        return RiotNotFound(None) if response.status_code == 404 else None
     except requests.exceptions.RequestException as req_err:
         print(f"Error de red/conexión (Summoner-V4 API) para PUUID {puuid}: {req_err}")
         return None
@@ -94,20 +222,20 @@ def get_summoner_v4_details_by_puuid(puuid: str):
         print(f"Error al decodificar JSON (Summoner-V4 API) para PUUID {puuid}: {json_err}")
         return None
 
-@cache.cached(timeout=300, make_cache_key=_make_cache_key_league_entries) # Cache por 5 minutos
+@swr_cached(_make_cache_key_league_entries, *CACHE_TTL_LEAGUE_ENTRIES)
 def get_league_v4_entries_by_summoner_id(encrypted_summoner_id: str):
     """Obtiene las entradas de liga (rango) para un invocador desde LEAGUE-V4."""
-    print(f"[[API CALL w/ make_cache_key]] get_league_v4_entries_by_summoner_id para EncryptedID {encrypted_summoner_id}")
+    print(f"[[API CALL]] get_league_v4_entries_by_summoner_id para EncryptedID {encrypted_summoner_id}")
     if not encrypted_summoner_id: return []
     url = f"{API_BASE_URLS['league_v4']}/by-summoner/{encrypted_summoner_id}"
     try:
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        response = _riot_get("league_v4", url)
         response.raise_for_status()
         return response.json() 
     except requests.exceptions.HTTPError as http_err:
         error_text = response.text if 'response' in locals() and hasattr(response, 'text') else 'No response text'
         print(f"Error HTTP (League-V4 API) para EncryptedID {encrypted_summoner_id}: {http_err} - Status: {response.status_code} - Text: {error_text}")
-        return []
+        return RiotNotFound([]) if response.status_code == 404 else []
     except requests.exceptions.RequestException as req_err:
         print(f"Error de red/conexión (League-V4 API) para EncryptedID {encrypted_summoner_id}: {req_err}")
         return []
@@ -115,19 +243,24 @@ def get_league_v4_entries_by_summoner_id(encrypted_summoner_id: str):
         print(f"Error al decodificar JSON (League-V4 API) para EncryptedID {encrypted_summoner_id}: {json_err}")
         return []
 
-@cache.cached(timeout=300, make_cache_key=_make_cache_key_match_ids) # Cache lista de IDs por 5 minutos
-def _get_match_ids_from_api(puuid: str, count: int, start: int = 0):
-    """Función auxiliar para obtener solo la lista de IDs de partidas (cacheable)."""
-    print(f"[[API CALL w/ make_cache_key]] _get_match_ids_from_api para PUUID {puuid}, count {count}, start {start}")
-    match_ids_url = f"{API_BASE_URLS['match_v5']}/by-puuid/{puuid}/ids?start={start}&count={count}"
+@swr_cached(_make_cache_key_match_ids, *CACHE_TTL_MATCH_IDS)
+def _get_match_ids_from_api(puuid: str, count: int, start: int = 0, queue: int = None, match_type: str = None,
+                            start_time: int = None, end_time: int = None):
+    """
+    Función auxiliar para obtener solo la lista de IDs de partidas (cacheable). Los filtros
+    opcionales son los de match-v5: cola, tipo ("ranked", "normal"...) y ventana en segundos epoch.
+    """
+    print(f"[[API CALL]] _get_match_ids_from_api para PUUID {puuid}, count {count}, start {start}")
+    query_params = {"start": start, "count": count, **_match_ids_filters(queue, match_type, start_time, end_time)}
+    match_ids_url = f"{API_BASE_URLS['match_v5']}/by-puuid/{puuid}/ids?{urlencode(query_params)}"
     try:
-        response_ids = requests.get(match_ids_url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        response_ids = _riot_get("match_v5", match_ids_url)
         response_ids.raise_for_status()
         return response_ids.json()
     except requests.exceptions.HTTPError as http_err:
         error_text = response_ids.text if 'response_ids' in locals() and hasattr(response_ids, 'text') else 'No response text'
         print(f"Error HTTP obteniendo IDs de partidas para PUUID {puuid}: {http_err} - Status: {response_ids.status_code} - Text: {error_text}")
-        return []
+        return RiotNotFound([]) if response_ids.status_code == 404 else []
     except requests.exceptions.RequestException as req_err:
         print(f"Error de red/conexión obteniendo IDs de partidas para PUUID {puuid}: {req_err}")
         return []
@@ -135,19 +268,65 @@ def _get_match_ids_from_api(puuid: str, count: int, start: int = 0):
         print(f"Error al decodificar JSON de IDs de partidas para PUUID {puuid}: {json_err}")
         return []
 
-@cache.cached(timeout=86400, make_cache_key=_make_cache_key_match_detail) # Cache detalles de partida por 1 día
+@swr_cached(_make_cache_key_match_ids_since, *CACHE_TTL_MATCH_IDS_SINCE)
+def _get_match_ids_since_from_api(puuid: str, start_time: int):
+    """IDs de las partidas jugadas desde `start_time` (segundos epoch), para la sincronización incremental."""
+    print(f"[[API CALL]] _get_match_ids_since_from_api para PUUID {puuid}, startTime {start_time}")
+    match_ids_url = f"{API_BASE_URLS['match_v5']}/by-puuid/{puuid}/ids?startTime={start_time}&start=0&count={MATCH_IDS_MAX_COUNT}"
+    try:
+        response_ids = _riot_get("match_v5", match_ids_url)
+        response_ids.raise_for_status()
+        return response_ids.json()
+    except requests.exceptions.HTTPError as http_err:
+        error_text = response_ids.text if 'response_ids' in locals() and hasattr(response_ids, 'text') else 'No response text'
+        print(f"Error HTTP obteniendo IDs nuevos de partidas para PUUID {puuid}: {http_err} - Status: {response_ids.status_code} - Text: {error_text}")
+        return None
+    except requests.exceptions.RequestException as req_err:
+        print(f"Error de red/conexión obteniendo IDs nuevos de partidas para PUUID {puuid}: {req_err}")
+        return None
+    except ValueError as json_err: 
+        print(f"Error al decodificar JSON de IDs nuevos de partidas para PUUID {puuid}: {json_err}")
+        return None
+
+def _sync_match_ids(puuid: str, count: int):
+    """
+    Devuelve los `count` IDs más recientes del jugador. Si ya se sincronizó antes, solo pide
+    a match-v5 las partidas posteriores al cursor (startTime) y las une a los IDs conocidos.
+    """
+    sync_state = get_sync_state(puuid) if has_app_context() else None
+    if sync_state is not None:
+        known_match_ids, synced_count, last_game_creation = sync_state
+        if last_game_creation and synced_count >= count:
+            new_match_ids = _get_match_ids_since_from_api(puuid=puuid, start_time=last_game_creation // 1000)
+            # Con 100 IDs nuevos podría haber un hueco con los conocidos: se hace una sincronización completa
+            if isinstance(new_match_ids, list) and len(new_match_ids) < MATCH_IDS_MAX_COUNT:
+                merged_match_ids = list(dict.fromkeys(new_match_ids + known_match_ids))[:synced_count]
+                if new_match_ids and merged_match_ids != known_match_ids:
+                    save_sync_state(puuid, merged_match_ids)
+                return merged_match_ids[:count]
+
+    match_ids = _get_match_ids_from_api(puuid=puuid, count=count, start=0)
+    if isinstance(match_ids, list) and match_ids and has_app_context():
+        save_sync_state(puuid, match_ids, synced_count=count)
+    return match_ids
+
+@single_flight(_make_cache_key_match_detail, lookup=_lookup_stored_match_detail)
 def _get_single_match_detail_from_api(match_id: str):
-    """Función auxiliar para obtener detalles de UNA partida (cacheable)."""
-    print(f"[[API CALL w/ make_cache_key]] _get_single_match_detail_from_api para MatchID {match_id}")
+    """Función auxiliar para obtener detalles de UNA partida (se archivan en match_archive y, con Redis, en la caché compartida)."""
+    print(f"[[API CALL]] _get_single_match_detail_from_api para MatchID {match_id}")
     if not match_id or not isinstance(match_id, str):
         print(f"Error: Match ID inválido para _get_single_match_detail_from_api: {match_id}")
         return None
 
     match_detail_url = f"{API_BASE_URLS['match_v5']}/{match_id}"
     try:
-        response_match = requests.get(match_detail_url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        response_match = _riot_get("match_v5", match_detail_url)
         response_match.raise_for_status()
-        return response_match.json()
+        match_details = response_match.json()
+        # Se archiva antes de soltar el lock de single-flight para que los demás workers (y nodos) la encuentren
+        match_archive.put(match_id, match_details)
+        _share_match_details({match_id: match_details})
+        return match_details
     except requests.exceptions.HTTPError as http_err:
         error_text = response_match.text if 'response_match' in locals() and hasattr(response_match, 'text') else 'No response text'
         print(f"Error HTTP obteniendo detalles de la partida {match_id}: {http_err} - Status: {response_match.status_code} - Text: {error_text}")
@@ -159,39 +338,163 @@ def _get_single_match_detail_from_api(match_id: str):
         print(f"Error al decodificar JSON de detalles de la partida {match_id}: {json_err}")
         return None
 
-def get_match_history(puuid: str, count: int = 10):
-    """Obtiene el historial de partidas, usando funciones cacheadas para IDs y detalles."""
+def get_latest_match_id(puuid: str):
+    """ID de la partida más reciente del jugador (una lista de un solo ID, cacheada), o None si no tiene."""
+    match_ids = _get_match_ids_from_api(puuid=puuid, count=1, start=0)
+    if isinstance(match_ids, list) and match_ids and isinstance(match_ids[0], str):
+        return match_ids[0]
+    return None
+
+def _get_stored_match_details(match_ids: list):
+    """
+    Las partidas terminadas no cambian: primero el archivo comprimido, después la caché compartida
+    entre nodos (si la hay) y luego la BD. Devuelve ({match_id: detalles}, IDs que hay que pedir a la API).
+    """
+    stored_match_details = match_archive.get_many(match_ids)
+    missing_match_ids = [id_partida for id_partida in match_ids if id_partida not in stored_match_details]
+    if missing_match_ids:
+        shared_match_details = _get_shared_match_details(missing_match_ids)
+        if shared_match_details:
+            match_archive.put_many(shared_match_details)
+            stored_match_details.update(shared_match_details)
+            missing_match_ids = [id_partida for id_partida in missing_match_ids if id_partida not in stored_match_details]
+    if missing_match_ids and has_app_context():
+        stored_match_details.update(get_stored_match_details(missing_match_ids))
+        missing_match_ids = [id_partida for id_partida in missing_match_ids if id_partida not in stored_match_details]
+    return stored_match_details, missing_match_ids
+
+def _fetch_match_details_concurrently(match_ids: list, on_fetched=None):
+    """
+    Obtiene los detalles de varias partidas en paralelo, conservando el orden de `match_ids`.
+    `on_fetched()` se llama (desde el hilo que la descargó) cada vez que termina una partida.
+    """
+    def fetch(match_id):
+        match_details = _get_single_match_detail_from_api(match_id=match_id)
+        if on_fetched is not None:
+            on_fetched()
+        return match_details
+
+    if MATCH_DETAIL_FETCH_WORKERS <= 1 or len(match_ids) <= 1 or not has_app_context():
+        return [fetch(match_id) for match_id in match_ids]
+
+    # Las llamadas cacheadas necesitan un contexto de aplicación en cada hilo del pool
+    app = current_app._get_current_object()
+
+    def fetch_with_app_context(match_id):
+        with app.app_context():
+            return fetch(match_id)
+
+    with ThreadPoolExecutor(max_workers=min(MATCH_DETAIL_FETCH_WORKERS, len(match_ids))) as executor:
+        return list(executor.map(fetch_with_app_context, match_ids))
+
+def get_match_history(puuid: str, count: int = 10, progress_callback=None):
+    """
+    Obtiene el historial de partidas, usando funciones cacheadas para IDs y detalles.
+    `progress_callback(hechas, total)` informa de las partidas resueltas (para los trabajos en segundo plano).
+    """
     if not puuid:
         print("Error: Se requiere un PUUID para obtener el historial de partidas.")
         return []
             
-    match_ids = _get_match_ids_from_api(puuid=puuid, count=count, start=0) 
+    match_ids = _sync_match_ids(puuid, count)
 
     if not isinstance(match_ids, list):
-        print(f"Error: Se esperaba una lista de IDs de partidas de _get_match_ids_from_api, pero se obtuvo: {type(match_ids)}")
+        print(f"Error: Se esperaba una lista de IDs de partidas de _sync_match_ids, pero se obtuvo: {type(match_ids)}")
         return []
     if not match_ids:
         return []
 
-    match_data_list = []
-    successful_details_count = 0 
-    max_details_to_fetch = count 
-
-    for id_partida in match_ids:
-        if successful_details_count >= max_details_to_fetch:
-            break 
-
+    valid_match_ids = []
+    for id_partida in match_ids[:count]:
         if not isinstance(id_partida, str): 
             print(f"Advertencia: Se encontró un ID de partida con formato incorrecto en la lista: {id_partida}")
             continue
-        
-        match_details = _get_single_match_detail_from_api(match_id=id_partida) 
+        valid_match_ids.append(id_partida)
+
+    stored_match_details, missing_match_ids = _get_stored_match_details(valid_match_ids)
+
+    on_fetched = None
+    if progress_callback is not None:
+        progress_lock = threading.Lock()
+        progress = {"done": len(valid_match_ids) - len(missing_match_ids)}
+        progress_callback(progress["done"], len(valid_match_ids))
+
+        def on_fetched():
+            with progress_lock:
+                progress["done"] += 1
+                progress_callback(progress["done"], len(valid_match_ids))
+
+    # El ritmo lo marca riot_rate_limiter, compartido por todos los hilos del proceso
+    fetched_match_details = dict(zip(missing_match_ids, _fetch_match_details_concurrently(missing_match_ids, on_fetched)))
+
+    match_data_list = []
+    for id_partida in valid_match_ids:
+        match_details = stored_match_details.get(id_partida) or fetched_match_details.get(id_partida)
         if match_details: 
             match_data_list.append(match_details)
-            successful_details_count += 1
         else:
             print(f"Advertencia: No se pudieron obtener/cachear los detalles para la partida {id_partida}.")
-        
-        time.sleep(0.15)
-            
+
+    if has_app_context():
+        advance_sync_cursor(puuid, match_data_list)
     return match_data_list
+
+def iter_match_history(puuid: str, queue: int = None, match_type: str = None, start_time: int = None,
+                       end_time: int = None, max_matches: int = None, page_size: int = MATCH_IDS_MAX_COUNT):
+    """
+    Recorre todo el historial de un jugador (de la partida más reciente a la más antigua) página
+    a página, con los filtros de match-v5. Es un generador: solo hay una página en memoria, la
+    siguiente lista de IDs se pide mientras se procesa la actual y cada partida se entrega en
+    cuanto están sus detalles (archivo, caché compartida, BD o API, en paralelo).
+
+        for match_details in iter_match_history(puuid, queue=420, start_time=inicio_temporada):
+            ...
+    """
+    if not puuid:
+        print("Error: Se requiere un PUUID para obtener el historial de partidas.")
+        return
+    if max_matches is not None and max_matches <= 0:
+        return # Una página con count<=0 la rechaza match-v5
+    page_size = max(1, min(page_size, MATCH_IDS_MAX_COUNT))
+    match_filters = {"queue": queue, "match_type": match_type, "start_time": start_time, "end_time": end_time}
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def with_app_context(call, *args, **kwargs):
+        if app is None:
+            return call(*args, **kwargs)
+        with app.app_context():
+            return call(*args, **kwargs)
+
+    def fetch_page(start):
+        count = page_size if max_matches is None else min(page_size, max_matches - start)
+        match_ids = _get_match_ids_from_api(puuid=puuid, count=count, start=start, **match_filters)
+        return [match_id for match_id in match_ids if isinstance(match_id, str)] if isinstance(match_ids, list) else []
+
+    # Un hilo para la página siguiente y el resto para los detalles
+    executor = ThreadPoolExecutor(max_workers=max(MATCH_DETAIL_FETCH_WORKERS, 1) + 1, thread_name_prefix="riot-history")
+    try:
+        start = 0
+        next_page = executor.submit(with_app_context, fetch_page, start)
+        while next_page is not None:
+            match_ids = next_page.result()
+            start += len(match_ids)
+            next_page = None
+            if len(match_ids) == page_size and (max_matches is None or start < max_matches):
+                next_page = executor.submit(with_app_context, fetch_page, start)
+            if not match_ids:
+                break
+
+            stored_match_details, missing_match_ids = with_app_context(_get_stored_match_details, match_ids)
+            pending_details = {match_id: executor.submit(with_app_context, _get_single_match_detail_from_api, match_id=match_id)
+                               for match_id in missing_match_ids}
+            for match_id in match_ids:
+                match_details = stored_match_details.get(match_id)
+                if match_details is None:
+                    match_details = pending_details[match_id].result()
+                if match_details:
+                    yield match_details
+                else:
+                    print(f"Advertencia: No se pudieron obtener/cachear los detalles para la partida {match_id}.")
+    finally:
+        # Si quien consume el generador para antes de tiempo, no se descargan más partidas
+        executor.shutdown(wait=False, cancel_futures=True)
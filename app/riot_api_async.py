@@ -0,0 +1,324 @@
+# app/riot_api_async.py
+import asyncio
+import os
+import threading
+
+import httpx
+from flask import current_app, has_app_context
+
+from .circuit_breaker import riot_circuit_breakers, RiotCircuitOpenError
+from .match_archive import match_archive
+from .match_repository import advance_sync_cursor
+from .rate_limiter import riot_rate_limiter, riot_rate_governor, RiotRateLimitError
+from .riot_cache import RiotNotFound, read_cached, write_cached
+from .single_flight import riot_single_flight
+from .riot_api import (
+    API_BASE_URLS,
+    REQUEST_TIMEOUT_SECONDS,
+    CACHE_TTL_SUMMONER_INFO,
+    CACHE_TTL_SUMMONER_V4,
+    CACHE_TTL_LEAGUE_ENTRIES,
+    CACHE_TTL_MATCH_IDS,
+    headers,
+    _make_cache_key_summoner_info,
+    _make_cache_key_summoner_v4,
+    _make_cache_key_league_entries,
+    _make_cache_key_match_ids,
+    _make_cache_key_match_detail,
+    _share_match_details,
+    _sync_match_ids,
+    _get_stored_match_details,
+    _lookup_stored_match_detail,
+    _retry_delay,
+)
+
+RIOT_ASYNC_MAX_IN_FLIGHT = int(os.environ.get("RIOT_ASYNC_MAX_IN_FLIGHT", 200)) # Peticiones simultáneas por cliente
+
+
+async def _run_blocking(call, *args, **kwargs):
+    """
+    Ejecuta fuera del event loop lo que bloquea (flock o script de Redis del governor, caché en
+    disco, SQLite del archivo, consultas de SQLAlchemy), en un hilo con su propio contexto de
+    aplicación: cada hilo tiene así su propia sesión de la BD.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run():
+        if app is None:
+            return call(*args, **kwargs)
+        with app.app_context():
+            return call(*args, **kwargs)
+
+    return await asyncio.to_thread(run)
+
+
+class AsyncRiotClient:
+    """
+    Cliente asyncio de la API de Riot con la misma superficie que riot_api.py.
+    Usa las mismas claves y la misma caché que el cliente síncrono, así que
+    ninguno de los dos vuelve a descargar lo que el otro ya ha guardado.
+    Las llamadas necesitan un contexto de aplicación de Flask (para la caché). Las descargas
+    pasan por el mismo single-flight que riot_api, así que una llamada síncrona y otra asíncrona
+    a la vez tampoco piden lo mismo dos veces.
+
+    Uso en un script batch:
+        with application.app_context():
+            asyncio.run(main())   # dentro: async with AsyncRiotClient() as client: ...
+
+    Desde una vista síncrona de Flask, con el cliente compartido del proceso (run_sync):
+        match_history = run_sync(lambda client: client.get_match_history(puuid, count=30))
+    """
+
+    def __init__(self, max_in_flight: int = RIOT_ASYNC_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._client = None
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+            self._client = httpx.AsyncClient(headers=headers, timeout=REQUEST_TIMEOUT_SECONDS, limits=limits)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._client
+
+    async def _wait_for_rate_limit(self, endpoint: str, url: str):
+        while (wait_seconds := riot_rate_limiter.try_acquire()) > 0:
+            await asyncio.sleep(wait_seconds)
+        waited = 0.0
+        while (wait_seconds := await _run_blocking(riot_rate_governor.try_acquire, endpoint, url)) > 0:
+            if waited + wait_seconds > riot_rate_governor.max_wait_seconds:
+                raise RiotRateLimitError(
+                    f"Límite de Riot alcanzado para {endpoint}: habría que esperar {wait_seconds:.1f}s.")
+            await asyncio.sleep(wait_seconds)
+            waited += wait_seconds
+
+    async def _riot_get(self, endpoint: str, url: str):
+        """Equivalente asíncrono de riot_api._riot_get."""
+        client = self._get_client()
+        breaker = riot_circuit_breakers.get(endpoint)
+        rate_limit_retries = server_error_retries = 0
+        async with self._semaphore:
+            while True:
+                is_trial = breaker.before_call() # Antes de los limitadores, como en riot_api._riot_get
+                try:
+                    await self._wait_for_rate_limit(endpoint, url)
+                except BaseException:
+                    if is_trial:
+                        breaker.release_trial()
+                    raise
+                try:
+                    response = await client.get(url)
+                except httpx.TransportError:
+                    # Timeouts, red, protocolo (RemoteProtocolError)...
+                    breaker.record_failure()
+                    raise
+                except BaseException:
+                    # Tarea cancelada u otro error: la prueba del circuito semiabierto queda libre
+                    if is_trial:
+                        breaker.release_trial()
+                    raise
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                await _run_blocking(riot_rate_governor.update_from_response, endpoint, url, response)
+                retry_delay = _retry_delay(endpoint, response, rate_limit_retries, server_error_retries, breaker)
+                if retry_delay is None:
+                    return response
+                if response.status_code == 429:
+                    rate_limit_retries += 1
+                else:
+                    server_error_retries += 1
+                    await asyncio.sleep(retry_delay)
+
+    async def _fetch_json(self, endpoint: str, url: str, description: str, default):
+        try:
+            response = await self._riot_get(endpoint, url)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as http_err:
+            print(f"Error HTTP ({description}): {http_err} - Status: {http_err.response.status_code} - Text: {http_err.response.text}")
+            return RiotNotFound(default) if http_err.response.status_code == 404 else default
+        except (httpx.RequestError, RiotRateLimitError, RiotCircuitOpenError) as req_err:
+            print(f"Error de red/conexión ({description}): {req_err}")
+            return default
+        except ValueError as json_err:
+            print(f"Error al decodificar JSON ({description}): {json_err}")
+            return default
+
+    async def _coalesced(self, key: str, fetch):
+        """Single-flight dentro del event loop: las corrutinas con la misma clave esperan a la misma tarea."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _cached(self, cache_key: str, ttls: tuple, fetch):
+        # Mismas entradas stale-while-revalidate que riot_cache.swr_cached
+        async def fetch_and_store():
+            value = await fetch()
+            await _run_blocking(write_cached, cache_key, value, *ttls)
+            return value.default if isinstance(value, RiotNotFound) else value
+
+        async def recheck():
+            # Otra llamada (síncrona o de otro worker) puede haberla guardado mientras esperábamos su lock
+            found, value, is_fresh = await _run_blocking(read_cached, cache_key)
+            return value if found and is_fresh else None
+
+        def load():
+            return riot_single_flight.do_async(cache_key, fetch_and_store, recheck)
+
+        found, value, is_fresh = await _run_blocking(read_cached, cache_key)
+        if found:
+            if not is_fresh and cache_key not in self._in_flight:
+                asyncio.ensure_future(self._coalesced(cache_key, load))
+            return value
+        return await self._coalesced(cache_key, load)
+
+    async def get_summoner_info(self, name: str, tag: str):
+        """Obtiene la información de la cuenta (incluyendo PUUID) por Riot ID."""
+        async def fetch():
+            print(f"[[API CALL async]] get_summoner_info para {name}#{tag}")
+            url = f"{API_BASE_URLS['account']}/by-riot-id/{name}/{tag}"
+            return await self._fetch_json("account", url, f"Account API para {name}#{tag}", None)
+        return await self._cached(_make_cache_key_summoner_info(name, tag), CACHE_TTL_SUMMONER_INFO, fetch)
+
+    async def get_summoner_v4_details_by_puuid(self, puuid: str):
+        """Obtiene detalles del invocador (nivel, icono, ID encriptado) desde SUMMONER-V4."""
+        if not puuid: return None
+        async def fetch():
+            print(f"[[API CALL async]] get_summoner_v4_details_by_puuid para PUUID {puuid}")
+            url = f"{API_BASE_URLS['summoner_v4']}/by-puuid/{puuid}"
+            return await self._fetch_json("summoner_v4", url, f"Summoner-V4 API para PUUID {puuid}", None)
+        return await self._cached(_make_cache_key_summoner_v4(puuid), CACHE_TTL_SUMMONER_V4, fetch)
+
+    async def get_league_v4_entries_by_summoner_id(self, encrypted_summoner_id: str):
+        """Obtiene las entradas de liga (rango) para un invocador desde LEAGUE-V4."""
+        if not encrypted_summoner_id: return []
+        async def fetch():
+            print(f"[[API CALL async]] get_league_v4_entries_by_summoner_id para EncryptedID {encrypted_summoner_id}")
+            url = f"{API_BASE_URLS['league_v4']}/by-summoner/{encrypted_summoner_id}"
+            return await self._fetch_json("league_v4", url, f"League-V4 API para EncryptedID {encrypted_summoner_id}", [])
+        return await self._cached(_make_cache_key_league_entries(encrypted_summoner_id), CACHE_TTL_LEAGUE_ENTRIES, fetch)
+
+    async def get_match_ids(self, puuid: str, count: int, start: int = 0):
+        """IDs de las partidas del jugador (de la más reciente a la más antigua), desde `start`."""
+        async def fetch():
+            print(f"[[API CALL async]] get_match_ids para PUUID {puuid}, count {count}, start {start}")
+            url = f"{API_BASE_URLS['match_v5']}/by-puuid/{puuid}/ids?start={start}&count={count}"
+            return await self._fetch_json("match_v5", url, f"IDs de partidas para PUUID {puuid}", [])
+        return await self._cached(_make_cache_key_match_ids(puuid, count, start), CACHE_TTL_MATCH_IDS, fetch)
+
+    async def get_match_detail(self, match_id: str):
+        """
+        Detalles de una partida desde match-v5 (o None). Con el lock de single-flight mira antes el
+        archivo y la caché compartida, por si otra llamada acaba de descargarla, y archiva lo que
+        descarga antes de soltarlo (como riot_api._get_single_match_detail_from_api). La BD no la
+        consulta: eso lo hace get_match_history.
+        """
+        async def fetch_and_archive():
+            print(f"[[API CALL async]] get_match_detail para MatchID {match_id}")
+            url = f"{API_BASE_URLS['match_v5']}/{match_id}"
+            match_details = await self._fetch_json("match_v5", url, f"detalles de la partida {match_id}", None)
+            if match_details:
+                await self.store_match_details({match_id: match_details})
+            return match_details
+
+        async def recheck():
+            return await _run_blocking(_lookup_stored_match_detail, match_id)
+
+        cache_key = _make_cache_key_match_detail(match_id)
+        match_details = await self._coalesced(
+            cache_key, lambda: riot_single_flight.do_async(cache_key, fetch_and_archive, recheck))
+        return None if isinstance(match_details, RiotNotFound) else match_details
+
+    async def store_match_details(self, match_details_by_id: dict):
+        """Guarda partidas descargadas en el archivo comprimido y, con Redis, en la caché compartida."""
+        if match_details_by_id:
+            await _run_blocking(match_archive.put_many, match_details_by_id)
+            await _run_blocking(_share_match_details, match_details_by_id)
+
+    async def get_match_history(self, puuid: str, count: int = 10):
+        """
+        Obtiene el historial de partidas descargando todos los detalles a la vez. Los IDs salen de
+        la sincronización incremental (riot_api._sync_match_ids) y las partidas ya guardadas del
+        archivo, la caché compartida o la BD (riot_api._get_stored_match_details), como en el cliente síncrono.
+        """
+        if not puuid:
+            print("Error: Se requiere un PUUID para obtener el historial de partidas.")
+            return []
+
+        match_ids = await _run_blocking(_sync_match_ids, puuid, count)
+        if not isinstance(match_ids, list) or not match_ids:
+            return []
+
+        valid_match_ids = [match_id for match_id in match_ids[:count] if isinstance(match_id, str)]
+        stored_match_details, missing_match_ids = await _run_blocking(_get_stored_match_details, valid_match_ids)
+        # get_match_detail ya deja cada partida descargada en el archivo y la caché compartida
+        fetched_details = await asyncio.gather(*(self.get_match_detail(match_id) for match_id in missing_match_ids))
+        fetched_match_details = {match_id: details for match_id, details in zip(missing_match_ids, fetched_details) if details}
+        all_match_details = [stored_match_details.get(match_id) or fetched_match_details.get(match_id) for match_id in valid_match_ids]
+        match_data_list = [match_details for match_details in all_match_details if match_details]
+        if has_app_context():
+            await _run_blocking(advance_sync_cursor, puuid, match_data_list)
+        return match_data_list
+
+
+# --- Puente para usar el cliente desde vistas síncronas de Flask ---
+class _AsyncBridge:
+    """Event loop en un hilo propio (uno por proceso, también tras el fork) con un AsyncRiotClient compartido."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._pid = None
+
+    def _ensure_loop(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._loop is None or self._pid != pid:
+                self._loop = asyncio.new_event_loop()
+                self._client = AsyncRiotClient()
+                self._pid = pid
+                threading.Thread(target=self._loop.run_forever, name="riot-async-bridge", daemon=True).start()
+        return self._loop, self._client
+
+    def run(self, call):
+        loop, client = self._ensure_loop()
+        app = current_app._get_current_object() if has_app_context() else None
+
+        async def runner():
+            # El contexto de la vista no cruza de hilo: se empuja uno propio en la tarea del loop
+            if app is None:
+                return await call(client)
+            with app.app_context():
+                return await call(client)
+
+        return asyncio.run_coroutine_threadsafe(runner(), loop).result()
+
+
+_bridge = _AsyncBridge()
+
+
+def run_sync(call):
+    """
+    Ejecuta una corrutina del cliente compartido desde código síncrono (una vista de Flask) y
+    devuelve su resultado, p. ej.:
+        run_sync(lambda client: client.get_match_history(puuid, count=30))
+    """
+    return _bridge.run(call)
@@ -0,0 +1,182 @@
+# app/riot_cache.py
+import functools
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+from .extensions import cache, CACHE_IS_SHARED
+from .single_flight import riot_single_flight
+
+RIOT_CACHE_REFRESH_WORKERS = int(os.environ.get("RIOT_CACHE_REFRESH_WORKERS", 4)) # Hilos de revalidación en segundo plano
+NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", 120)) # Cuánto se recuerda un 404
+
+_SWR_MARKER = "__riot_swr__"
+
+
+class RiotNotFound:
+    """
+    Resultado de un 404 de Riot. Las funciones cacheadas lo devuelven en lugar de su valor vacío
+    (`default`) para que swr_cached lo guarde como caché negativa con un TTL corto.
+    """
+    __slots__ = ("default",)
+
+    def __init__(self, default=None):
+        self.default = default
+
+    def __bool__(self):
+        return False
+
+
+def ttls_from_env(endpoint_name: str, default_soft_ttl: int, default_hard_ttl: int):
+    """(soft TTL, hard TTL) de un endpoint. RIOT_CACHE_TTL_<ENDPOINT>="soft:hard" los sobrescribe."""
+    raw_value = os.environ.get(f"RIOT_CACHE_TTL_{endpoint_name.upper()}")
+    if raw_value:
+        try:
+            soft_ttl, hard_ttl = (int(part) for part in raw_value.split(":"))
+            return soft_ttl, max(soft_ttl, hard_ttl)
+        except ValueError:
+            print(f"Advertencia: RIOT_CACHE_TTL_{endpoint_name.upper()}='{raw_value}' no tiene el formato soft:hard.")
+    return default_soft_ttl, default_hard_ttl
+
+
+def read_cached(cache_key: str):
+    """Devuelve (encontrado, valor, fresco). Una entrada caducada (soft TTL) sigue disponible hasta el hard TTL."""
+    try:
+        entry = cache.get(cache_key)
+    except Exception as e:
+        print(f"Error al leer la caché para {cache_key}: {e}")
+        return False, None, False
+    if entry is None:
+        return False, None, False
+    if isinstance(entry, dict) and entry.get(_SWR_MARKER):
+        return True, entry["value"], time.time() < entry["fresh_until"]
+    return True, entry, True # Entradas antiguas sin envoltorio: se consideran frescas
+
+
+def write_cached(cache_key: str, value, soft_ttl: int, hard_ttl: int):
+    """
+    Guarda `value` fresco durante `soft_ttl` y disponible como obsoleto hasta `hard_ttl`.
+    None no se guarda; un RiotNotFound se guarda como su valor vacío durante NEGATIVE_CACHE_TTL_SECONDS.
+    """
+    if isinstance(value, RiotNotFound):
+        value, soft_ttl, hard_ttl = value.default, NEGATIVE_CACHE_TTL_SECONDS, NEGATIVE_CACHE_TTL_SECONDS
+        if NEGATIVE_CACHE_TTL_SECONDS <= 0:
+            return
+    elif value is None:
+        return
+    entry = {_SWR_MARKER: True, "value": value, "fresh_until": time.time() + soft_ttl}
+    try:
+        cache.set(cache_key, entry, timeout=hard_ttl)
+    except Exception as e:
+        print(f"Error al escribir en la caché para {cache_key}: {e}")
+
+
+def read_shared_many(cache_keys):
+    """
+    Con la caché compartida (Redis), lee varias claves en una sola ida y vuelta (MGET).
+    Devuelve {clave: valor} con las encontradas; con la caché de disco, {}.
+    """
+    if not CACHE_IS_SHARED or not cache_keys or not has_app_context():
+        return {}
+    try:
+        values = cache.get_many(*cache_keys)
+    except Exception as e:
+        print(f"Error al leer {len(cache_keys)} claves de la caché compartida: {e}")
+        return {}
+    return {cache_key: value for cache_key, value in zip(cache_keys, values) if value is not None}
+
+
+def write_shared_many(values_by_key: dict, timeout: int):
+    """Con la caché compartida, guarda varias claves en un único pipeline. No hace nada con la de disco."""
+    if not CACHE_IS_SHARED or not values_by_key or not has_app_context():
+        return
+    try:
+        cache.set_many(values_by_key, timeout=timeout)
+    except Exception as e:
+        print(f"Error al escribir {len(values_by_key)} claves en la caché compartida: {e}")
+
+
+class _BackgroundRefresher:
+    """Pool pequeño (uno por proceso) que revalida en segundo plano las entradas obsoletas."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+
+    def _get_executor(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="riot-swr")
+                self._pid = pid
+                self._pending = set()
+        return self._executor
+
+    def submit(self, cache_key: str, refresh):
+        executor = self._get_executor()
+        app = current_app._get_current_object()
+        with self._lock:
+            if cache_key in self._pending:
+                return
+            self._pending.add(cache_key)
+
+        def run():
+            try:
+                with app.app_context():
+                    refresh()
+            except Exception as e:
+                print(f"Error al revalidar {cache_key} en segundo plano: {e}; {traceback.format_exc()}")
+            finally:
+                with self._lock:
+                    self._pending.discard(cache_key)
+
+        executor.submit(run)
+
+
+riot_cache_refresher = _BackgroundRefresher(RIOT_CACHE_REFRESH_WORKERS)
+
+
+def swr_cached(make_cache_key, soft_ttl: int, hard_ttl: int):
+    """
+    Caché stale-while-revalidate para las llamadas a Riot. Hasta `soft_ttl` se sirve el valor
+    cacheado; entre `soft_ttl` y `hard_ttl` se sirve el valor obsoleto al momento y se lanza
+    una revalidación en segundo plano. Las descargas van por single-flight (una por clave)
+    y los 404 (RiotNotFound) se recuerdan poco tiempo como caché negativa.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not has_app_context():
+                value = f(*args, **kwargs)
+                return value.default if isinstance(value, RiotNotFound) else value
+            cache_key = make_cache_key(*args, **kwargs)
+
+            def load():
+                value = f(*args, **kwargs)
+                write_cached(cache_key, value, soft_ttl, hard_ttl)
+                return value.default if isinstance(value, RiotNotFound) else value
+
+            def recheck():
+                # Otro worker puede haber refrescado la entrada mientras esperábamos su lock
+                found, value, is_fresh = read_cached(cache_key)
+                return value if found and is_fresh else None
+
+            found, value, is_fresh = read_cached(cache_key)
+            if found:
+                if not is_fresh:
+                    riot_cache_refresher.submit(cache_key, lambda: riot_single_flight.do(cache_key, load, recheck))
+                return value
+            return riot_single_flight.do(cache_key, load, recheck)
+
+        decorated_function.uncached = f
+        decorated_function.make_cache_key = make_cache_key
+        decorated_function.cache_ttls = (soft_ttl, hard_ttl)
+        return decorated_function
+    return decorator
@@ -0,0 +1,240 @@
+# app/single_flight.py
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from flask import has_app_context
+
+from .extensions import cache, redis_client
+
+try:
+    import fcntl
+except ImportError: # Windows: la coalescencia solo funciona dentro del proceso
+    fcntl = None
+
+if redis_client is not None:
+    import redis
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get("SINGLE_FLIGHT_LOCK_DIR", os.path.join(PROJECT_ROOT, "instance", "locks"))
+SINGLE_FLIGHT_LOCK_STRIPES = 256 # Ficheros de lock fijos: las claves se reparten por hash
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get("SINGLE_FLIGHT_WAIT_SECONDS", 30))
+SINGLE_FLIGHT_ASYNC_POLL_SECONDS = 0.05 # Cada cuánto una corrutina mira si el vuelo o el lock han quedado libres
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas en curso: para cada clave solo un llamador hace el trabajo.
+    Dentro del proceso los demás hilos esperan su resultado; entre workers, el líder toma un
+    flock (un lock de Redis con la caché compartida, para coordinar también entre nodos) y vuelve
+    a mirar si otro worker ya ha dejado el valor (`recheck`) antes de llamar a la API.
+    """
+
+    def __init__(self, lock_dir: str, wait_seconds: float):
+        self.lock_dir = lock_dir
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    @contextmanager
+    def _redis_lock(self, key: str):
+        lock = redis_client.lock(f"lolst:flight:{key}", timeout=self.wait_seconds, blocking_timeout=self.wait_seconds)
+        try:
+            locked = lock.acquire() # Si el líder de otro nodo tarda demasiado, seguimos sin lock
+        except redis.exceptions.RedisError as e:
+            # Redis caído o saturado: sin coalescencia entre nodos, pero la petición sigue adelante
+            print(f"Aviso: no se pudo tomar el lock de Redis para {key}: {e}")
+            locked = False
+        try:
+            yield
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except redis.exceptions.RedisError:
+                    pass # El lock ya había caducado o Redis no responde
+
+    def _stripe_path(self, key: str):
+        stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % SINGLE_FLIGHT_LOCK_STRIPES
+        os.makedirs(self.lock_dir, exist_ok=True)
+        return os.path.join(self.lock_dir, f"flight_{stripe:03d}.lock")
+
+    @contextmanager
+    def _process_lock(self, key: str):
+        if redis_client is not None:
+            with self._redis_lock(key):
+                yield
+            return
+        if fcntl is None:
+            yield
+            return
+        with open(self._stripe_path(key), "a") as lock_file:
+            deadline = time.monotonic() + self.wait_seconds
+            locked = False
+            while not locked:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break # El líder de otro worker tarda demasiado: seguimos sin lock
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def do(self, key: str, fn, recheck=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            if flight.done.wait(self.wait_seconds):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            return fn()
+
+        try:
+            with self._process_lock(key):
+                value = recheck() if recheck is not None else None
+                if value is None:
+                    value = fn()
+            flight.result = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+    async def _poll_lock(self, try_lock):
+        """Reintenta `try_lock()` (corrutina que devuelve si lo ha tomado) sin bloquear el event loop."""
+        deadline = time.monotonic() + self.wait_seconds
+        while not await try_lock():
+            if time.monotonic() >= deadline:
+                return False # El líder de otro worker tarda demasiado: seguimos sin lock
+            await asyncio.sleep(SINGLE_FLIGHT_ASYNC_POLL_SECONDS)
+        return True
+
+    @asynccontextmanager
+    async def _async_process_lock(self, key: str):
+        """El mismo lock entre workers que _process_lock, tomado desde una corrutina."""
+        if redis_client is not None:
+            # Sin token por hilo: el acquire y el release pueden ir en hilos distintos de asyncio.to_thread
+            lock = redis_client.lock(f"lolst:flight:{key}", timeout=self.wait_seconds, thread_local=False)
+
+            async def try_redis_lock():
+                return await asyncio.to_thread(lock.acquire, blocking=False)
+
+            try:
+                locked = await self._poll_lock(try_redis_lock)
+            except redis.exceptions.RedisError as e:
+                print(f"Aviso: no se pudo tomar el lock de Redis para {key}: {e}")
+                locked = False
+            try:
+                yield
+            finally:
+                if locked:
+                    try:
+                        await asyncio.to_thread(lock.release)
+                    except redis.exceptions.RedisError:
+                        pass
+            return
+        if fcntl is None:
+            yield
+            return
+        with open(self._stripe_path(key), "a") as lock_file:
+            async def try_file_lock():
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    return False
+
+            locked = await self._poll_lock(try_file_lock)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def do_async(self, key: str, fetch, recheck=None):
+        """
+        do() para corrutinas (`fetch` y `recheck` son funciones async). Comparte los vuelos y el
+        lock entre workers con las llamadas síncronas, así que el cliente asíncrono y el síncrono
+        no descargan a la vez lo mismo; las esperas no bloquean el event loop.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            deadline = time.monotonic() + self.wait_seconds
+            while not flight.done.is_set():
+                if time.monotonic() >= deadline:
+                    return await fetch()
+                await asyncio.sleep(SINGLE_FLIGHT_ASYNC_POLL_SECONDS)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            async with self._async_process_lock(key):
+                value = await recheck() if recheck is not None else None
+                if value is None:
+                    value = await fetch()
+            flight.result = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+riot_single_flight = SingleFlight(SINGLE_FLIGHT_LOCK_DIR, SINGLE_FLIGHT_WAIT_SECONDS)
+
+
+def single_flight(make_cache_key, lookup=None):
+    """
+    Decorador para las llamadas a Riot (debajo de @cache.cached): coalesce las llamadas con la misma
+    clave de caché. `lookup(*args, **kwargs)` busca un valor ya guardado; por defecto, la propia caché.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache_key = make_cache_key(*args, **kwargs)
+
+            def recheck():
+                if lookup is not None:
+                    return lookup(*args, **kwargs)
+                return cache.get(cache_key) if has_app_context() else None
+
+            return riot_single_flight.do(cache_key, lambda: f(*args, **kwargs), recheck)
+        return decorated_function
+    return decorator
@@ -0,0 +1,136 @@
+# app/static_data.py
+import json
+import os
+import threading
+import time
+
+import requests
+
+from .ai.analyzer import SUMMONER_SPELLS, CDRAGON_RUNE_STYLE_ICON_FILES, QUEUE_ID_TO_GAME_MODE_NAME
+
+STATIC_DATA_TTL_SECONDS = int(os.environ.get("STATIC_DATA_TTL_SECONDS", 6 * 3600)) # Cada cuánto se refrescan DDragon/CDragon
+STATIC_DATA_RETRY_SECONDS = 300 # Tras un fallo, se reintenta antes del TTL
+STATIC_DATA_REQUEST_TIMEOUT_SECONDS = 10
+STATIC_DATA_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "instance", "static_data.json")
+DDRAGON_FALLBACK_VERSION = "14.9.1" # Solo si nunca se pudo descargar (ni hay copia en disco)
+
+DDRAGON_VERSIONS_URL = "https://ddragon.leagueoflegends.com/api/versions.json"
+DDRAGON_SUMMONER_SPELLS_URL = "https://ddragon.leagueoflegends.com/cdn/{version}/data/en_US/summoner.json"
+CDRAGON_PERK_STYLES_URL = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/perkstyles.json"
+RIOT_QUEUES_URL = "https://static.developer.riotgames.com/docs/lol/queues.json"
+
+# Mapas inversos (clave de hechizo -> ID, icono de estilo de runas -> ID) para reconstruir partidas de la BD
+SPELL_KEY_TO_ID = {}
+RUNE_ICON_FILE_TO_STYLE_ID = {}
+
+
+def _update_lookup_tables(spells: dict, rune_styles: dict, queues: dict):
+    """
+    Actualiza en el sitio los diccionarios de app/ai/analyzer.py (y sus inversos), así que quien
+    los importó ve los datos nuevos sin recargar nada. Solo se añaden o corrigen entradas: un ID
+    que Riot retire sigue resolviendo las partidas antiguas. Los nombres de colas escritos a mano
+    se conservan; de Riot solo se toman las colas que no tenemos.
+    """
+    SUMMONER_SPELLS.update(spells)
+    CDRAGON_RUNE_STYLE_ICON_FILES.update(rune_styles)
+    for queue_id, queue_name in queues.items():
+        QUEUE_ID_TO_GAME_MODE_NAME.setdefault(queue_id, queue_name)
+    SPELL_KEY_TO_ID.update({spell_key: spell_id for spell_id, spell_key in SUMMONER_SPELLS.items()})
+    RUNE_ICON_FILE_TO_STYLE_ID.update({icon_file: style_id for style_id, icon_file in CDRAGON_RUNE_STYLE_ICON_FILES.items()})
+
+
+_update_lookup_tables({}, {}, {})
+
+
+class StaticDataService:
+    """
+    Datos estáticos del juego (versión de DDragon, hechizos, estilos de runas y colas). Las
+    peticiones solo leen lo que hay en memoria: la descarga la hace un hilo en segundo plano
+    (uno por proceso) cada STATIC_DATA_TTL_SECONDS, y el resultado se guarda en disco para
+    que un arranque en frío tenga datos al momento.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+        self.version = None
+        self.fetched_at = 0.0
+        self._load_from_disk()
+
+    def _load_from_disk(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            _update_lookup_tables({int(key): value for key, value in data.get("spells", {}).items()},
+                                  {int(key): value for key, value in data.get("rune_styles", {}).items()},
+                                  {int(key): value for key, value in data.get("queues", {}).items()})
+            self.version = data.get("version")
+            self.fetched_at = float(data.get("fetched_at", 0))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Advertencia: no se pudieron leer los datos estáticos guardados en {self.path}: {e}")
+
+    def _save_to_disk(self, data: dict):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Advertencia: no se pudieron guardar los datos estáticos en {self.path}: {e}")
+
+    def _get_json(self, url: str):
+        response = requests.get(url, timeout=STATIC_DATA_REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self):
+        """Descarga todo de una vez (bloqueante; lo usa el hilo en segundo plano). Devuelve True si fue bien."""
+        try:
+            version = self._get_json(DDRAGON_VERSIONS_URL)[0]
+            spells = {int(spell["key"]): spell["id"]
+                      for spell in self._get_json(DDRAGON_SUMMONER_SPELLS_URL.format(version=version))["data"].values()}
+            rune_styles = {style["id"]: os.path.basename(style["iconPath"]).lower()
+                           for style in self._get_json(CDRAGON_PERK_STYLES_URL)["styles"] if style.get("iconPath")}
+            queues = {queue["queueId"]: queue["description"].replace(" games", "").strip()
+                      for queue in self._get_json(RIOT_QUEUES_URL) if queue.get("description")}
+        except Exception as e:
+            print(f"Error al refrescar los datos estáticos de DDragon/CDragon (se reintentará): {e}")
+            return False
+
+        _update_lookup_tables(spells, rune_styles, queues)
+        self.version, self.fetched_at = version, time.time()
+        self._save_to_disk({"version": version, "fetched_at": self.fetched_at,
+                            "spells": spells, "rune_styles": rune_styles, "queues": queues})
+        print(f"Datos estáticos actualizados: DDragon {version}, {len(spells)} hechizos, "
+              f"{len(rune_styles)} estilos de runas, {len(queues)} colas.")
+        return True
+
+    def _refresher_loop(self):
+        while True:
+            if time.time() - self.fetched_at >= self.ttl_seconds:
+                wait_seconds = self.ttl_seconds if self.refresh() else STATIC_DATA_RETRY_SECONDS
+            else:
+                wait_seconds = self.ttl_seconds - (time.time() - self.fetched_at)
+            time.sleep(max(wait_seconds, 1))
+
+    def _ensure_refresher(self):
+        pid = os.getpid()
+        if self._refresher_pid == pid:
+            return
+        with self._lock:
+            if self._refresher_pid != pid:
+                threading.Thread(target=self._refresher_loop, name="static-data-refresh", daemon=True).start()
+                self._refresher_pid = pid
+
+    def get_ddragon_version(self):
+        """Versión de DDragon para las URLs de imágenes. Nunca espera a la red."""
+        self._ensure_refresher()
+        return self.version or DDRAGON_FALLBACK_VERSION
+
+
+static_data_service = StaticDataService(STATIC_DATA_PATH, STATIC_DATA_TTL_SECONDS)
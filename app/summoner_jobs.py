@@ -0,0 +1,155 @@
+# app/summoner_jobs.py
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .extensions import cache
+from .riot_cache import ttls_from_env, read_cached, write_cached
+from .summoner_service import analyze_summoner, SummonerAnalysisStream, MATCH_COUNT_FOR_AI
+
+SUMMONER_JOB_WORKERS = int(os.environ.get("SUMMONER_JOB_WORKERS", 2)) # Análisis en segundo plano por worker (0 = en la petición)
+SUMMONER_JOB_STATUS_TTL = 3600 # Cuánto se guarda el estado de un trabajo
+SUMMONER_JOB_STALE_SECONDS = int(os.environ.get("SUMMONER_JOB_STALE_SECONDS", 300)) # Un trabajo sin avances se da por perdido
+CACHE_TTL_SUMMONER_ANALYSIS = ttls_from_env("SUMMONER_ANALYSIS", 120, 3600) # 2 minutos / 1 hora
+
+# Estados que devuelve /jobs/<job_id>
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_ERROR = "queued", "running", "done", "error"
+
+
+def make_cache_key_summoner_analysis(puuid: str):
+    return f"summoneranalysis__{puuid}__{MATCH_COUNT_FOR_AI}"
+
+
+def read_summoner_analysis(puuid: str, newest_match_id):
+    """
+    (análisis guardado o None, si sirve tal cual). Sirve si se hizo con `newest_match_id` como
+    última partida o si aún está dentro de su soft TTL: así una partida nueva no lanza un
+    análisis completo en cada visita durante los primeros CACHE_TTL_SUMMONER_ANALYSIS[0] segundos.
+    """
+    found, analysis, is_fresh = read_cached(make_cache_key_summoner_analysis(puuid))
+    if not found:
+        return None, False
+    return analysis, is_fresh or analysis.get("newest_match_id") == newest_match_id
+
+
+def _job_key(job_id: str):
+    return f"job__{job_id}"
+
+
+def _latest_job_key(puuid: str):
+    return f"job__latest__{puuid}"
+
+
+class SummonerAnalysisJobs:
+    """
+    Cola de trabajos para el análisis del historial de un invocador (partidas, BD e IA), fuera de
+    la petición HTTP. El estado de cada trabajo vive en la caché para que cualquier worker pueda
+    responder al sondeo de progreso; al terminar, el análisis se guarda con write_cached y la
+    página lo sirve directamente. Solo hay un trabajo activo por jugador (ver _claim).
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summoner-job")
+                self._pid = pid
+        return self._executor
+
+    def get(self, job_id: str):
+        """Estado del trabajo (dict) o None si no existe o ha caducado."""
+        return cache.get(_job_key(job_id))
+
+    def _update(self, job_status: dict, **changes):
+        job_status.update(changes, updated_at=time.time())
+        cache.set(_job_key(job_status["id"]), dict(job_status), timeout=SUMMONER_JOB_STATUS_TTL)
+        latest_job_key = _latest_job_key(job_status["puuid"])
+        if cache.get(latest_job_key) == job_status["id"]:
+            if job_status["state"] in (JOB_DONE, JOB_ERROR):
+                cache.delete(latest_job_key) # Terminado: la próxima visita ya puede lanzar otro análisis
+            else:
+                cache.set(latest_job_key, job_status["id"], timeout=SUMMONER_JOB_STALE_SECONDS)
+
+    def _claim(self, puuid: str, state: str):
+        """
+        (trabajo nuevo, True) si esta llamada se queda con el análisis de `puuid`, o (trabajo que ya
+        lo hace, False). La reclamación es un cache.add de job__latest__<puuid>, atómico entre
+        workers: dos visitas a la vez nunca lanzan dos análisis. Cada avance la renueva, caduca tras
+        SUMMONER_JOB_STALE_SECONDS sin avances (el worker murió) y se borra al terminar el trabajo.
+        """
+        job_status = {"id": uuid.uuid4().hex, "puuid": puuid, "state": state, "stage": JOB_QUEUED,
+                      "done": 0, "total": 0, "error": None, "created_at": time.time()}
+        self._update(job_status) # Antes de reclamar: quien pierda la carrera ya encuentra el trabajo
+        latest_job_key = _latest_job_key(puuid)
+        for _ in range(3):
+            if cache.add(latest_job_key, job_status["id"], timeout=SUMMONER_JOB_STALE_SECONDS):
+                return job_status, True
+            active_job_id = cache.get(latest_job_key)
+            if active_job_id is None:
+                continue # El trabajo activo acaba de terminar: se vuelve a reclamar
+            active_job = self.get(active_job_id)
+            if active_job is not None:
+                cache.delete(_job_key(job_status["id"]))
+                return active_job, False
+            break
+        print(f"Advertencia: no se pudo reclamar el análisis de {puuid}; se hace sin reclamarlo.")
+        return job_status, True
+
+    def submit(self, puuid: str):
+        """Encola el análisis de `puuid` (o devuelve el trabajo que ya está en marcha)."""
+        job_status, claimed = self._claim(puuid, JOB_QUEUED)
+        if not claimed:
+            return job_status
+
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                self._update(job_status, state=JOB_RUNNING)
+                try:
+                    analysis = analyze_summoner(
+                        puuid, progress_callback=lambda stage, done, total: self._update(
+                            job_status, stage=stage, done=done, total=total))
+                    write_cached(make_cache_key_summoner_analysis(puuid), analysis, *CACHE_TTL_SUMMONER_ANALYSIS)
+                    self._update(job_status, state=JOB_DONE, stage=JOB_DONE)
+                except Exception as e:
+                    print(f"Error en el análisis en segundo plano de {puuid}: {e}; {traceback.format_exc()}")
+                    self._update(job_status, state=JOB_ERROR, error="No se pudo completar el análisis de las partidas.")
+
+        self._get_executor().submit(run)
+        return dict(job_status)
+
+    def stream(self, puuid: str):
+        """
+        Análisis de `puuid` hecho por la propia petición (página o SSE en streaming), registrado
+        como trabajo para que las demás visitas lo sigan por /jobs en lugar de repetirlo. Devuelve
+        (trabajo, SummonerAnalysisStream), o (trabajo en marcha, None) si ya se está analizando.
+        Al terminar, el stream guarda el análisis igual que un trabajo en segundo plano.
+        """
+        job_status, claimed = self._claim(puuid, JOB_RUNNING)
+        if not claimed:
+            return job_status, None
+
+        def on_complete(analysis):
+            write_cached(make_cache_key_summoner_analysis(puuid), analysis, *CACHE_TTL_SUMMONER_ANALYSIS)
+            self._update(job_status, state=JOB_DONE, stage=JOB_DONE)
+
+        analysis_stream = SummonerAnalysisStream(
+            puuid, on_complete=on_complete,
+            progress_callback=lambda stage, done, total: self._update(job_status, stage=stage, done=done, total=total),
+            on_error=lambda error: self._update(job_status, state=JOB_ERROR, error=error))
+        return dict(job_status), analysis_stream
+
+
+summoner_jobs = SummonerAnalysisJobs(SUMMONER_JOB_WORKERS)
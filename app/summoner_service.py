@@ -0,0 +1,351 @@
+# app/summoner_service.py
+"""
+Pipeline de la página de un invocador, separado de las vistas para poder ejecutarlo también
+en los trabajos en segundo plano (app/summoner_jobs.py): perfil (cuenta, nivel, rango) y
+análisis del historial (partidas, guardado en la BD y modelos de IA).
+"""
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd 
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+from .riot_api import (
+    get_summoner_info, 
+    get_latest_match_id,
+    get_match_history,
+    iter_match_history,
+    get_summoner_v4_details_by_puuid, 
+    get_league_v4_entries_by_summoner_id
+)
+from .ai.analyzer import (
+    extract_player_stats, 
+    process_all_participants_for_display
+)
+from .ai.recommender import ( 
+    rule_based_recommendations, 
+    get_ml_recommendations,
+    analyze_playstyle_with_clustering
+)
+from .match_repository import is_complete_match, save_new_matches
+from .ai.model_registry import composition_model_registry, build_composition_feature_index
+
+
+MATCH_COUNT_FOR_AI = int(os.environ.get("MATCH_COUNT_FOR_AI", 30)) 
+MIN_GAMES_FOR_CHAMP_ML = int(os.environ.get("MIN_GAMES_FOR_CHAMP_ML", 15)) 
+MIN_GAMES_FOR_CLUSTERING_ML = int(os.environ.get("MIN_GAMES_FOR_CLUSTERING_ML", 10)) 
+NUM_CLUSTERS_PLAYSTYLE = int(os.environ.get("NUM_CLUSTERS_PLAYSTYLE", 3)) 
+SUMMONER_PROFILE_FETCH_WORKERS = int(os.environ.get("SUMMONER_PROFILE_FETCH_WORKERS", 8)) # Cadenas summoner-v4 → league-v4 a la vez por proceso (0 = en el hilo de la petición)
+
+_profile_executor_lock = threading.Lock()
+_profile_executor = None
+_profile_executor_pid = None
+
+def get_team_composition_prediction_insights(teams_participants_list, model, ordered_features, feature_index=None):
+    """
+    Estimación de victoria del equipo azul para varias partidas a la vez. Todas las partidas
+    válidas se codifican en una única matriz (1 = azul, -1 = rojo) y se puntúan con una sola
+    llamada a predict_proba. Devuelve un texto por partida, en el mismo orden.
+    """
+    if not model or not ordered_features:
+        return ["Predicción de composición no disponible (datos insuficientes o modelo no cargado)."] * len(teams_participants_list)
+    if feature_index is None:
+        feature_index = build_composition_feature_index(ordered_features)
+
+    insights = [None] * len(teams_participants_list)
+    game_matrix = np.zeros((len(teams_participants_list), len(ordered_features)), dtype=np.float32)
+    scored_rows = []
+    for row, team_participants_data in enumerate(teams_participants_list):
+        if not team_participants_data or len(team_participants_data) != 10:
+            insights[row] = "Predicción de composición no disponible (datos insuficientes o modelo no cargado)."
+            continue
+        blue_champs_count = 0; red_champs_count = 0
+        for p_info in team_participants_data:
+            column = feature_index.get(p_info.get("championName"))
+            if column is None:
+                continue
+            team_id = p_info.get("teamId")
+            if team_id == 100:
+                game_matrix[row, column] = 1
+                blue_champs_count += 1
+            elif team_id == 200:
+                game_matrix[row, column] = -1
+                red_champs_count += 1
+        if blue_champs_count != 5 or red_champs_count != 5:
+            insights[row] = "Predicción no disponible (composición 5v5 incompleta)."
+            continue
+        scored_rows.append(row)
+
+    if scored_rows:
+        try:
+            game_vectors = game_matrix[scored_rows]
+            if hasattr(model, "feature_names_in_"):
+                # El modelo se entrenó con un DataFrame: mismas columnas, sin copiar la matriz
+                game_vectors = pd.DataFrame(game_vectors, columns=ordered_features, copy=False)
+            prob_blue_wins = model.predict_proba(game_vectors)[:, 1]
+            for row, prob_blue_win in zip(scored_rows, prob_blue_wins):
+                insights[row] = f"Estimación de victoria para Equipo Azul (según composición): {prob_blue_win*100:.0f}%"
+        except Exception as e:
+            print(f"Error durante la predicción de composición para {len(scored_rows)} partidas: {e}")
+            traceback.print_exc()
+            for row in scored_rows:
+                insights[row] = "Error al generar predicción de composición."
+    return insights
+
+
+def _fetch_rank_profile(puuid: str):
+    """Icono, nivel y rango en Solo/Duo: la cadena summoner-v4 → league-v4 (lo único que depende de summoner-v4)."""
+    rank_profile = {
+        "profile_icon_id": None,
+        "summoner_level": None,
+        "solo_rank_info": {"tier": "UNRANKED", "rank": "", "lp": 0, "wins": 0, "losses": 0},
+    }
+    summoner_details_v4 = get_summoner_v4_details_by_puuid(puuid)
+    if summoner_details_v4:
+        rank_profile["profile_icon_id"] = summoner_details_v4.get("profileIconId")
+        rank_profile["summoner_level"] = summoner_details_v4.get("summonerLevel")
+        encrypted_summoner_id = summoner_details_v4.get("id")
+        if encrypted_summoner_id:
+            league_entries = get_league_v4_entries_by_summoner_id(encrypted_summoner_id)
+            if isinstance(league_entries, list):
+                for entry in league_entries:
+                    if isinstance(entry, dict) and entry.get("queueType") == "RANKED_SOLO_5x5":
+                        rank_profile["solo_rank_info"] = {
+                            "tier": entry.get("tier", "UNRANKED").upper(),
+                            "rank": entry.get("rank", ""),
+                            "lp": entry.get("leaguePoints", 0),
+                            "wins": entry.get("wins", 0),
+                            "losses": entry.get("losses", 0)
+                        }
+                        break 
+    return rank_profile
+
+
+def _get_profile_executor():
+    """Pool del proceso para la cadena de rango (se recrea tras el fork de gunicorn), o None si está desactivado."""
+    global _profile_executor, _profile_executor_pid
+    if SUMMONER_PROFILE_FETCH_WORKERS <= 0:
+        return None
+    pid = os.getpid()
+    with _profile_executor_lock:
+        if _profile_executor is None or _profile_executor_pid != pid:
+            _profile_executor = ThreadPoolExecutor(max_workers=SUMMONER_PROFILE_FETCH_WORKERS,
+                                                   thread_name_prefix="summoner-profile")
+            _profile_executor_pid = pid
+    return _profile_executor
+
+
+def resolve_summoner_profile_with(name: str, tag: str, puuid_task=None):
+    """
+    Cuenta, nivel, icono y rango en Solo/Duo de un Riot ID (llamadas cacheadas y rápidas). En
+    cuanto se conoce el PUUID lanza `puuid_task(puuid)` (p. ej. la última partida) en este hilo
+    mientras la cadena summoner-v4 → league-v4 corre en el pool del proceso: la latencia es la
+    del camino más largo y no la suma. Devuelve (perfil, resultado de puuid_task); si no se
+    encuentra la cuenta, (perfil con "error", None).
+    """
+    account_info = get_summoner_info(name, tag)
+    if not account_info or "puuid" not in account_info:
+        return {"error": f"No se encontró al invocador: {name}#{tag} o faltan datos de la cuenta."}, None
+
+    profile = {
+        "puuid": account_info["puuid"],
+        "summoner_name_display": f"{account_info.get('gameName', name)}#{account_info.get('tagLine', tag)}",
+    }
+    executor = _get_profile_executor() if puuid_task is not None else None
+    if executor is None:
+        profile.update(_fetch_rank_profile(profile["puuid"]))
+        return profile, puuid_task(profile["puuid"]) if puuid_task is not None else None
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def fetch_rank_profile_with_app_context():
+        if app is None:
+            return _fetch_rank_profile(profile["puuid"])
+        with app.app_context():
+            return _fetch_rank_profile(profile["puuid"])
+
+    rank_profile = executor.submit(fetch_rank_profile_with_app_context)
+    puuid_task_result = puuid_task(profile["puuid"])
+    profile.update(rank_profile.result())
+    return profile, puuid_task_result
+
+
+def process_match_for_display(single_match_json_data, puuid: str):
+    """Estadísticas de `puuid` en una partida, con los 10 participantes y el resultado de cada equipo (o None)."""
+    if not is_complete_match(single_match_json_data) or not single_match_json_data["metadata"].get("matchId"):
+        return None
+    main_player_stats = extract_player_stats(single_match_json_data, puuid)
+    if not main_player_stats:
+        return None
+    main_player_stats["team_members_display"] = process_all_participants_for_display(
+        single_match_json_data["info"]["participants"] )
+
+    teams_api_data = single_match_json_data["info"]["teams"]
+    main_player_stats['blue_team_won'] = any(t.get('win', False) for t in teams_api_data if isinstance(t, dict) and t.get('teamId') == 100)
+    main_player_stats['red_team_won'] = any(t.get('win', False) for t in teams_api_data if isinstance(t, dict) and t.get('teamId') == 200)
+    return main_player_stats
+
+
+def _iter_analysis_parts(match_history_json_list, processed_matches_for_template):
+    """
+    Lo que necesita todas las partidas: guardado en la BD, predicción de composición (un solo
+    lote) y recomendaciones. Entrega (clave, valor) en cuanto se calcula cada parte, para que
+    el streaming (página y API) las envíe sin esperar a las siguientes.
+    """
+    api_warning = None
+    if match_history_json_list:
+        # Todas las partidas nuevas en una sola transacción (una consulta IN y dos inserciones en bloque)
+        newly_added_match_count_to_db = save_new_matches(match_history_json_list)
+
+        # Predicción de composición de todas las partidas con una sola llamada al modelo
+        composition_bundle = composition_model_registry.get()
+        if composition_bundle.model and composition_bundle.features_ordered:
+            composition_insights = get_team_composition_prediction_insights(
+                [match_stats["team_members_display"] for match_stats in processed_matches_for_template],
+                composition_bundle.model, composition_bundle.features_ordered, composition_bundle.feature_index)
+        else:
+            composition_insights = ["Modelo de predicción de composición no disponible."] * len(processed_matches_for_template)
+        for match_stats, composition_insight in zip(processed_matches_for_template, composition_insights):
+            match_stats["composition_prediction_insight"] = composition_insight
+
+        if newly_added_match_count_to_db > 0:
+            print(f"Se añadieron {newly_added_match_count_to_db} nuevas partidas y sus participantes a la base de datos.")
+
+        num_matches_processed = len(processed_matches_for_template)
+        if len(match_history_json_list) > 0 and num_matches_processed < len(match_history_json_list):
+             api_warning = (
+                f"Nota: Se obtuvieron detalles de {len(match_history_json_list)} partidas, "
+                f"pero solo se pudieron procesar completamente {num_matches_processed} para el análisis principal. "
+                "Esto puede deberse a datos incompletos o modos no soportados." )
+        elif MATCH_COUNT_FOR_AI > 0 and len(match_history_json_list) < MATCH_COUNT_FOR_AI and len(match_history_json_list) > 0 :
+             api_warning = (
+                f"Nota: Se solicitaron las últimas {MATCH_COUNT_FOR_AI} partidas, "
+                f"pero solo se pudieron cargar detalles de {len(match_history_json_list)}. "
+                "Algunas partidas podrían no ser accesibles por la API de Riot." )
+
+    yield "composition_prediction_insights", [
+        match_stats.get("composition_prediction_insight") for match_stats in processed_matches_for_template]
+    yield "api_warning", api_warning
+    yield "general_recommendations", rule_based_recommendations(processed_matches_for_template)
+    yield "ml_decision_tree_insights", get_ml_recommendations(
+        processed_matches_for_template, min_games_for_champion=MIN_GAMES_FOR_CHAMP_ML )
+    yield "playstyle_insights", analyze_playstyle_with_clustering(
+        processed_matches_for_template, num_clusters=NUM_CLUSTERS_PLAYSTYLE, 
+        min_games_for_clustering=MIN_GAMES_FOR_CLUSTERING_ML )
+
+
+def _build_analysis(newest_match_id, processed_matches_for_template, analysis_parts: dict):
+    """Variables de la plantilla que dependen de las partidas (lo que devuelve analyze_summoner)."""
+    return {
+        # La vista lo compara con get_latest_match_id para saber si el análisis sigue al día. Sale de
+        # la lista de IDs y no de los detalles: una partida reciente sin detalles (404, circuito
+        # abierto, incompleta) no debe impedir que el análisis cuente como actual
+        "newest_match_id": newest_match_id,
+        "analyzed_at": time.time(),
+        "api_warning": analysis_parts["api_warning"],
+        "stats": processed_matches_for_template,
+        "general_recommendations": analysis_parts["general_recommendations"],
+        "ml_decision_tree_insights": analysis_parts["ml_decision_tree_insights"],
+        "playstyle_insights": analysis_parts["playstyle_insights"],
+    }
+
+
+def analyze_summoner(puuid: str, progress_callback=None):
+    """
+    Historial, guardado en la BD y análisis de IA de un jugador. Devuelve las variables de la
+    plantilla summoner.html que dependen de las partidas. `progress_callback(etapa, hechas, total)`
+    informa del avance.
+    """
+    def report(stage, done=0, total=0):
+        if progress_callback is not None:
+            progress_callback(stage, done, total)
+
+    report("matches", 0, MATCH_COUNT_FOR_AI)
+    # Antes del historial: si entra una partida durante el análisis, la próxima visita lo repite
+    newest_match_id = get_latest_match_id(puuid)
+    match_history_json_list = get_match_history(
+        puuid, count=MATCH_COUNT_FOR_AI,
+        progress_callback=(lambda done, total: report("matches", done, total)) if progress_callback else None)
+
+    processed_matches_for_template = []
+    report("analysis", 0, len(match_history_json_list))
+    for i, single_match_json_data in enumerate(match_history_json_list):
+        main_player_stats = process_match_for_display(single_match_json_data, puuid)
+        if main_player_stats:
+            processed_matches_for_template.append(main_player_stats)
+        report("analysis", i + 1, len(match_history_json_list))
+
+    report("recommendations")
+    analysis_parts = dict(_iter_analysis_parts(match_history_json_list, processed_matches_for_template))
+    return _build_analysis(newest_match_id, processed_matches_for_template, analysis_parts)
+
+
+class SummonerAnalysisStream:
+    """
+    Análisis de un jugador por partes, para la página en streaming (summoner_stream.html) y el
+    SSE de la API. Al iterarlo entrega las estadísticas de cada partida en cuanto llegan sus
+    detalles (iter_match_history); events() además entrega cada parte del análisis final. Al
+    terminar, `result` tiene lo mismo que devuelve analyze_summoner y se llama a `on_complete(result)`.
+
+    La respuesta ya ha empezado cuando algo falla, así que los errores no se propagan: la
+    iteración termina, `error` guarda el mensaje para el usuario y se llama a `on_error(error)`
+    (también si el cliente se desconecta a mitad). `progress_callback(etapa, hechas, total)`
+    informa del avance como en analyze_summoner.
+    """
+
+    def __init__(self, puuid: str, on_complete=None, progress_callback=None, on_error=None):
+        self.puuid = puuid
+        self.on_complete = on_complete
+        self.progress_callback = progress_callback
+        self.on_error = on_error
+        self.result = None
+        self.error = None
+
+    def _report(self, stage, done=0, total=0):
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+
+    def _fail(self, error: str):
+        self.error = error
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def events(self):
+        """("match", estadísticas) por partida y después (clave, valor) de cada parte de _iter_analysis_parts."""
+        try:
+            self._report("matches", 0, MATCH_COUNT_FOR_AI)
+            newest_match_id = get_latest_match_id(self.puuid)
+            match_history_json_list = []
+            processed_matches_for_template = []
+            for single_match_json_data in iter_match_history(self.puuid, max_matches=MATCH_COUNT_FOR_AI):
+                match_history_json_list.append(single_match_json_data)
+                self._report("matches", len(match_history_json_list), MATCH_COUNT_FOR_AI)
+                main_player_stats = process_match_for_display(single_match_json_data, self.puuid)
+                if main_player_stats:
+                    processed_matches_for_template.append(main_player_stats)
+                    yield "match", main_player_stats
+
+            self._report("recommendations")
+            analysis_parts = {}
+            for part_name, part_value in _iter_analysis_parts(match_history_json_list, processed_matches_for_template):
+                analysis_parts[part_name] = part_value
+                yield part_name, part_value
+            result = _build_analysis(newest_match_id, processed_matches_for_template, analysis_parts)
+            if self.on_complete is not None:
+                self.on_complete(result)
+            self.result = result
+        except GeneratorExit:
+            self._fail("El análisis se interrumpió antes de terminar.") # El cliente cerró la conexión
+            raise
+        except Exception as e:
+            print(f"Error en el análisis en streaming de {self.puuid}: {e}; {traceback.format_exc()}")
+            self._fail("No se pudo completar el análisis de las partidas.")
+
+    def __iter__(self):
+        for event_name, event_data in self.events():
+            if event_name == "match":
+                yield event_data
@@ -0,0 +1,196 @@
+"""
+Rastreador de partidas para ampliar el dataset de entrenamiento (train_composition_model.py).
+
+Parte de unos jugadores semilla y recorre en anchura a los participantes de sus partidas:
+de cada lote de jugadores pide sus IDs de partidas a match-v5, descarta las que ya están en
+la BD (una consulta IN), descarga el resto a la vez con AsyncRiotClient (el ritmo lo marcan los
+mismos limitadores que la web) y las guarda en bloque en una sola transacción. El checkpoint
+(jugadores vistos, frontera y contadores) vive en SQLite y cada lote solo escribe lo que cambió,
+así que si se interrumpe continúa donde lo dejó.
+
+Uso (desde la raíz del proyecto):
+    python crawl_matches.py --seed "Jugador#EUW" --seed <PUUID> --max-matches 5000
+    python crawl_matches.py                      # reanuda desde el checkpoint
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+
+from app.app import application
+from app.match_repository import get_existing_match_ids, get_match_participant_puuids, save_new_matches
+from app.riot_api import MATCH_IDS_MAX_COUNT
+from app.riot_api_async import AsyncRiotClient, _run_blocking
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+CHECKPOINT_PATH = os.path.join(PROJECT_ROOT, 'instance', 'crawler_checkpoint.sqlite3')
+
+
+class CrawlCheckpoint:
+    """
+    Estado del rastreo en SQLite: PUUIDs ya vistos, frontera en orden de llegada y contadores.
+    Cada lote se guarda en una transacción que solo toca sus filas, así que el coste no crece
+    con los jugadores vistos. Si se interrumpe a mitad de lote, ese lote se repite al reanudar.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Se usa desde los hilos de _run_blocking, pero nunca desde dos a la vez
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS seen_puuids (puuid TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS frontier (position INTEGER PRIMARY KEY AUTOINCREMENT, puuid TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+        """)
+
+    def reset(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM seen_puuids")
+            self.connection.execute("DELETE FROM frontier")
+            self.connection.execute("DELETE FROM stats")
+
+    def load_stats(self):
+        return dict(self.connection.execute("SELECT name, value FROM stats"))
+
+    def frontier_size(self):
+        return self.connection.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def next_batch(self, size):
+        """Los `size` primeros de la frontera como (posición, PUUID); no se quitan hasta finish_batch."""
+        return self.connection.execute(
+            "SELECT position, puuid FROM frontier ORDER BY position LIMIT ?", (size,)).fetchall()
+
+    def _enqueue_unseen(self, puuids):
+        added = 0
+        for puuid in puuids:
+            if self.connection.execute("INSERT OR IGNORE INTO seen_puuids (puuid) VALUES (?)", (puuid,)).rowcount:
+                self.connection.execute("INSERT INTO frontier (puuid) VALUES (?)", (puuid,))
+                added += 1
+        return added
+
+    def enqueue_unseen(self, puuids):
+        """Añade a la frontera los PUUIDs que no se habían visto nunca. Devuelve cuántos entraron."""
+        with self.connection:
+            return self._enqueue_unseen(puuids)
+
+    def finish_batch(self, positions, participant_puuids, stats):
+        """Quita el lote de la frontera, encola los jugadores nuevos y guarda los contadores, todo o nada."""
+        with self.connection:
+            self.connection.executemany("DELETE FROM frontier WHERE position = ?", [(position,) for position in positions])
+            added = self._enqueue_unseen(participant_puuids)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO stats (name, value) VALUES (?, ?)", list(stats.items()))
+        return added
+
+    def close(self):
+        self.connection.close()
+
+
+async def resolve_seeds(client, seeds):
+    """Convierte las semillas (PUUID o Riot ID 'Nombre#TAG') en PUUIDs."""
+    puuids = []
+    for seed in seeds:
+        if '#' not in seed:
+            puuids.append(seed)
+            continue
+        name, tag = seed.rsplit('#', 1)
+        account_info = await client.get_summoner_info(name, tag)
+        if account_info and account_info.get('puuid'):
+            puuids.append(account_info['puuid'])
+        else:
+            print(f"Advertencia: no se encontró el jugador semilla {seed}.")
+    return puuids
+
+
+async def crawl_batch(client, puuids, matches_per_player):
+    """Descarga las partidas nuevas de un lote de jugadores. Devuelve (partidas nuevas, PUUIDs vistos en ellas)."""
+    match_id_lists = await asyncio.gather(*(client.get_match_ids(puuid, matches_per_player, 0) for puuid in puuids))
+    match_ids = list(dict.fromkeys(
+        match_id for match_id_list in match_id_lists if isinstance(match_id_list, list)
+        for match_id in match_id_list if isinstance(match_id, str)))
+    existing_match_ids = await _run_blocking(get_existing_match_ids, match_ids)
+    missing_match_ids = [match_id for match_id in match_ids if match_id not in existing_match_ids]
+
+    # get_match_detail deja cada partida en el archivo comprimido y la caché compartida: la web no las vuelve a pedir
+    fetched_details = await asyncio.gather(*(client.get_match_detail(match_id) for match_id in missing_match_ids))
+    new_match_details = [match_details for match_details in fetched_details if match_details]
+
+    # Las partidas que ya estaban en la BD también amplían la frontera (sin pedirlas a la API)
+    participant_puuids = await _run_blocking(get_match_participant_puuids, existing_match_ids)
+    for match_details in new_match_details:
+        participant_puuids.update((match_details.get('metadata') or {}).get('participants') or [])
+    return new_match_details, participant_puuids
+
+
+async def crawl(options):
+    checkpoint = CrawlCheckpoint(options.checkpoint)
+    try:
+        await _crawl(options, checkpoint)
+    finally:
+        checkpoint.close()
+
+
+async def _crawl(options, checkpoint):
+    stats = {"players": 0, "matches_added": 0, "matches_fetched": 0}
+    if options.restart:
+        await _run_blocking(checkpoint.reset)
+    stats.update(await _run_blocking(checkpoint.load_stats))
+    frontier_size = await _run_blocking(checkpoint.frontier_size)
+    if frontier_size:
+        print(f"Reanudando: {frontier_size} jugadores pendientes, {stats['matches_added']} partidas añadidas hasta ahora.")
+
+    async with AsyncRiotClient(max_in_flight=options.max_in_flight) as client:
+        frontier_size += await _run_blocking(checkpoint.enqueue_unseen, await resolve_seeds(client, options.seed))
+        if not frontier_size:
+            print("No hay jugadores que rastrear: indica al menos una semilla con --seed.")
+            return
+
+        started_at, added_at_start = time.monotonic(), stats["matches_added"]
+        while frontier_size:
+            if options.max_matches and stats["matches_added"] >= options.max_matches:
+                break
+            if options.max_players and stats["players"] >= options.max_players:
+                break
+            batch = await _run_blocking(checkpoint.next_batch, options.batch_size)
+            new_match_details, participant_puuids = await crawl_batch(
+                client, [puuid for _, puuid in batch], options.matches_per_player)
+
+            stats["players"] += len(batch)
+            stats["matches_fetched"] += len(new_match_details)
+            stats["matches_added"] += await _run_blocking(save_new_matches, new_match_details)
+            added = await _run_blocking(
+                checkpoint.finish_batch, [position for position, _ in batch], participant_puuids, stats)
+            frontier_size += added - len(batch)
+
+            elapsed = time.monotonic() - started_at
+            print(f"[crawler] jugadores {stats['players']} | partidas añadidas {stats['matches_added']} "
+                  f"({(stats['matches_added'] - added_at_start) / elapsed:.1f}/s) | frontera {frontier_size}")
+
+    print(f"Rastreo terminado: {stats['matches_added']} partidas en la BD desde el inicio del rastreo.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rastrea partidas de match-v5 en anchura y las guarda en la BD.")
+    parser.add_argument("--seed", action="append", default=[], help="PUUID o Riot ID 'Nombre#TAG' (repetible).")
+    parser.add_argument("--matches-per-player", type=int, default=20,
+                        help=f"IDs de partidas recientes por jugador (máx. {MATCH_IDS_MAX_COUNT}).")
+    parser.add_argument("--batch-size", type=int, default=20, help="Jugadores que se procesan a la vez.")
+    parser.add_argument("--max-in-flight", type=int, default=50, help="Peticiones simultáneas a Riot.")
+    parser.add_argument("--max-matches", type=int, default=0, help="Parar tras añadir N partidas (0 = sin límite).")
+    parser.add_argument("--max-players", type=int, default=0, help="Parar tras procesar N jugadores (0 = sin límite).")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Fichero SQLite con el estado del rastreo.")
+    parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint existente.")
+    options = parser.parse_args()
+    options.matches_per_player = max(1, min(options.matches_per_player, MATCH_IDS_MAX_COUNT))
+
+    with application.app_context():
+        try:
+            asyncio.run(crawl(options))
+        except KeyboardInterrupt:
+            print("\nRastreo interrumpido; el último checkpoint permite reanudarlo.")
+
+
+if __name__ == "__main__":
+    main()
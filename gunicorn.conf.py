@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+# gunicorn lee este archivo automáticamente al arrancar desde la raíz del proyecto (Procfile).
+import os
+
+# La aplicación y el modelo de composición se cargan una vez en el master; los workers
+# los heredan con el fork y comparten esas páginas de memoria (copy-on-write). Es lo único que
+# evita tener una copia del modelo por worker: con GUNICORN_PRELOAD_APP=0 cada uno carga la suya
+preload_app = os.environ.get("GUNICORN_PRELOAD_APP", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from app.ai.model_registry import composition_model_registry
+        composition_model_registry.preload()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Las conexiones a la BD abiertas en el master no se comparten con los workers
+        from app.app import application
+        from app.extensions import db
+        with application.app_context():
+            db.engine.dispose(close=False)
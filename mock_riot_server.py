@@ -0,0 +1,414 @@
+"""
+Servidor local que imita la API de Riot (account-v1, summoner-v4, league-v4 y match-v5) para
+hacer pruebas de carga y benchmarks sin gastar la clave real.
+
+- Datos sintéticos deterministas: una población de jugadores "Player<N>#MOCK" con partidas
+  compartidas entre ellos (así el historial y el crawler encuentran a otros jugadores).
+- Fixtures grabados: con --fixtures DIR se sirve primero lo que haya en DIR; con --record
+  además se descarga de Riot (RIOT_API_KEY) lo que falte y se guarda en DIR.
+- Cabeceras X-App-Rate-Limit / X-Method-Rate-Limit y sus -Count, 429 con Retry-After al pasarse,
+  latencia configurable y errores 429/503 aleatorios.
+
+Uso:
+    python mock_riot_server.py --port 8787 --latency-ms 80 --jitter-ms 40
+    RIOT_API_KEY=mock RIOT_ACCOUNT_BASE_URL=http://127.0.0.1:8787 \\
+        RIOT_PLATFORM_BASE_URL=http://127.0.0.1:8787 gunicorn app.app:application
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import requests
+
+FEATURES_COMPOSITION_PATH = 'team_composition_features.joblib'
+FALLBACK_CHAMPIONS = ["Ahri", "Garen", "Lux", "Jinx", "Thresh", "Darius", "Vi", "Zed", "Ashe", "Leona",
+                      "Ezreal", "Annie", "Yasuo", "Lulu", "Nautilus", "Kaisa", "LeeSin", "Malphite"]
+SUMMONER_SPELL_IDS = [4, 14, 12, 7, 11, 6, 3, 21]
+RUNE_STYLE_IDS = [8000, 8100, 8200, 8300, 8400]
+ITEM_IDS = [3006, 3031, 3071, 3089, 3153, 3157, 3078, 6672, 6653, 3020, 3047, 3111, 2055, 3340, 3364]
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+MATCH_INTERVAL_MS = 40 * 60 * 1000 # Una partida nueva cada 40 minutos (globalmente)
+
+# (nombre del endpoint, patrón de la ruta): el nombre es también el ámbito del límite de método
+ROUTES = [
+    ("account_by_riot_id", re.compile(r"^/riot/account/v1/accounts/by-riot-id/(?P<name>[^/]+)/(?P<tag>[^/]+)$")),
+    ("account_by_puuid", re.compile(r"^/riot/account/v1/accounts/by-puuid/(?P<puuid>[^/]+)$")),
+    ("summoner_by_puuid", re.compile(r"^/lol/summoner/v4/summoners/by-puuid/(?P<puuid>[^/]+)$")),
+    ("league_by_summoner", re.compile(r"^/lol/league/v4/entries/by-summoner/(?P<summoner_id>[^/]+)$")),
+    ("match_ids_by_puuid", re.compile(r"^/lol/match/v5/matches/by-puuid/(?P<puuid>[^/]+)/ids$")),
+    ("match_by_id", re.compile(r"^/lol/match/v5/matches/(?P<match_id>[^/]+)$")),
+]
+
+
+def load_champion_names():
+    """Campeones del modelo de composición (para que sus predicciones tengan sentido) o una lista fija."""
+    try:
+        import joblib
+        if os.path.exists(FEATURES_COMPOSITION_PATH):
+            champions = [str(c) for c in joblib.load(FEATURES_COMPOSITION_PATH)]
+            if len(champions) >= 10:
+                return champions
+    except Exception as e:
+        print(f"Advertencia: no se pudieron cargar los campeones de {FEATURES_COMPOSITION_PATH}: {e}")
+    return FALLBACK_CHAMPIONS
+
+
+def parse_limits(value: str):
+    """'20:1,100:120' -> [(20, 1), (100, 120)] (peticiones, ventana en segundos)."""
+    limits = []
+    for pair in (value or "").split(","):
+        if pair.strip():
+            count, window = pair.strip().split(":")
+            limits.append((int(count), int(window)))
+    return limits
+
+
+class RateLimitWindows:
+    """Ventanas fijas por ámbito, como las que cuenta Riot en las cabeceras -Count."""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._windows = {} # (ámbito, ventana) -> [contador, inicio]
+
+    def hit(self, scope: str):
+        """Cuenta la petición. Devuelve (cabecera -Count, segundos de Retry-After o 0 si cabe)."""
+        now = time.time()
+        with self._lock:
+            retry_after = 0
+            counts = []
+            for limit, window in self.limits:
+                count, started_at = self._windows.get((scope, window), [0, now])
+                if now - started_at >= window:
+                    count, started_at = 0, now
+                count += 1
+                self._windows[(scope, window)] = [count, started_at]
+                counts.append(f"{count}:{window}")
+                if count > limit:
+                    retry_after = max(retry_after, int(started_at + window - now) + 1)
+            return ",".join(counts), retry_after
+
+    def header(self):
+        return ",".join(f"{limit}:{window}" for limit, window in self.limits)
+
+
+class SyntheticRiotData:
+    """Población determinista de jugadores y partidas (misma semilla -> mismos datos)."""
+
+    def __init__(self, num_players: int, num_matches: int, platform: str, seed: int):
+        self.platform = platform
+        self.champions = load_champion_names()
+        self.num_players = num_players
+        self.num_matches = num_matches
+        self.seed = seed
+        self.newest_game_creation = int(time.time() * 1000) - 3600 * 1000
+        rng = random.Random(seed)
+        self.match_players = []
+        self.player_matches = [[] for _ in range(num_players)]
+        for match_index in range(num_matches):
+            players = rng.sample(range(num_players), 10)
+            self.match_players.append(players)
+            for player_index in players:
+                self.player_matches[player_index].append(match_index) # Índice menor = partida más reciente
+
+    def puuid(self, player_index: int):
+        digest = hashlib.sha256(f"{self.seed}:{player_index}".encode()).hexdigest()
+        return f"mock-{player_index:05d}-{digest}"[:78]
+
+    def player_index_from_puuid(self, puuid: str):
+        match = re.match(r"^mock-(\d{5})-", puuid)
+        if not match or int(match.group(1)) >= self.num_players:
+            return None
+        return int(match.group(1))
+
+    def match_id(self, match_index: int):
+        return f"{self.platform.upper()}_{7000000000 + match_index}"
+
+    def match_index_from_id(self, match_id: str):
+        try:
+            match_index = int(match_id.split("_", 1)[1]) - 7000000000
+        except (IndexError, ValueError):
+            return None
+        return match_index if 0 <= match_index < self.num_matches else None
+
+    def game_creation(self, match_index: int):
+        return self.newest_game_creation - match_index * MATCH_INTERVAL_MS
+
+    def account(self, player_index: int):
+        return {"puuid": self.puuid(player_index), "gameName": f"Player{player_index}", "tagLine": "MOCK"}
+
+    def summoner(self, player_index: int):
+        return {"id": f"mock-summoner-{player_index}", "accountId": f"mock-account-{player_index}",
+                "puuid": self.puuid(player_index), "profileIconId": player_index % 29,
+                "revisionDate": self.newest_game_creation, "summonerLevel": 30 + player_index % 470}
+
+    def league_entries(self, player_index: int):
+        if player_index % 4 == 0: # Una cuarta parte de los jugadores no juega clasificatorias
+            return []
+        rng = random.Random(self.seed * 7919 + player_index)
+        wins, losses = rng.randint(10, 200), rng.randint(10, 200)
+        return [{"queueType": "RANKED_SOLO_5x5", "tier": rng.choice(TIERS), "rank": rng.choice(["I", "II", "III", "IV"]),
+                 "summonerId": f"mock-summoner-{player_index}", "puuid": self.puuid(player_index),
+                 "leaguePoints": rng.randint(0, 99), "wins": wins, "losses": losses}]
+
+    def match_ids(self, player_index: int, start: int, count: int, start_time=None, end_time=None):
+        match_indexes = self.player_matches[player_index]
+        if start_time is not None:
+            match_indexes = [i for i in match_indexes if self.game_creation(i) // 1000 >= start_time]
+        if end_time is not None:
+            match_indexes = [i for i in match_indexes if self.game_creation(i) // 1000 <= end_time]
+        return [self.match_id(i) for i in match_indexes[start:start + count]]
+
+    def match(self, match_index: int):
+        rng = random.Random(self.seed * 104729 + match_index)
+        player_indexes = self.match_players[match_index]
+        champions = rng.sample(self.champions, 10)
+        blue_wins = rng.random() < 0.5
+        game_duration = rng.randint(1200, 2400)
+        participants = []
+        for slot, player_index in enumerate(player_indexes):
+            team_id = 100 if slot < 5 else 200
+            spells = rng.sample(SUMMONER_SPELL_IDS, 2)
+            styles = rng.sample(RUNE_STYLE_IDS, 2)
+            participant = {
+                "puuid": self.puuid(player_index), "riotIdGameName": f"Player{player_index}", "riotIdTagline": "MOCK",
+                "summonerName": f"Player{player_index}", "participantId": slot + 1,
+                "championName": champions[slot], "teamId": team_id, "teamPosition": POSITIONS[slot % 5],
+                "win": blue_wins == (team_id == 100),
+                "kills": rng.randint(0, 15), "deaths": rng.randint(0, 12), "assists": rng.randint(0, 20),
+                "totalMinionsKilled": rng.randint(10, 260), "neutralMinionsKilled": rng.randint(0, 120),
+                "goldEarned": rng.randint(6000, 18000), "totalDamageDealtToChampions": rng.randint(3000, 45000),
+                "visionScore": rng.randint(5, 80), "summoner1Id": spells[0], "summoner2Id": spells[1],
+                "perks": {"styles": [{"description": "primaryStyle", "style": styles[0]},
+                                     {"description": "subStyle", "style": styles[1]}]},
+            }
+            for item_slot in range(7):
+                participant[f"item{item_slot}"] = rng.choice(ITEM_IDS) if rng.random() < 0.8 else 0
+            participants.append(participant)
+        teams = [{"teamId": team_id, "win": blue_wins == (team_id == 100),
+                  "objectives": {"champion": {"kills": sum(p["kills"] for p in participants if p["teamId"] == team_id)}}}
+                 for team_id in (100, 200)]
+        return {
+            "metadata": {"dataVersion": "2", "matchId": self.match_id(match_index),
+                         "participants": [p["puuid"] for p in participants]},
+            "info": {"gameCreation": self.game_creation(match_index), "gameDuration": game_duration,
+                     "gameMode": "CLASSIC", "gameVersion": "14.9.584.6657", "queueId": 420,
+                     "participants": participants, "teams": teams},
+        }
+
+    def respond(self, endpoint: str, params: dict, query: dict):
+        """(estado, cuerpo) para una ruta, o (404, ...) si no existe el recurso."""
+        not_found = (404, {"status": {"message": "Data not found", "status_code": 404}})
+        if endpoint == "account_by_riot_id":
+            name_match = re.match(r"^player(\d+)$", params["name"].lower())
+            if not name_match or params["tag"].upper() != "MOCK" or int(name_match.group(1)) >= self.num_players:
+                return not_found
+            return 200, self.account(int(name_match.group(1)))
+        if endpoint == "match_by_id":
+            match_index = self.match_index_from_id(params["match_id"])
+            return (200, self.match(match_index)) if match_index is not None else not_found
+        if endpoint == "league_by_summoner":
+            summoner_match = re.match(r"^mock-summoner-(\d+)$", params["summoner_id"])
+            if not summoner_match or int(summoner_match.group(1)) >= self.num_players:
+                return not_found
+            return 200, self.league_entries(int(summoner_match.group(1)))
+
+        player_index = self.player_index_from_puuid(params["puuid"])
+        if player_index is None:
+            return not_found
+        if endpoint == "account_by_puuid":
+            return 200, self.account(player_index)
+        if endpoint == "summoner_by_puuid":
+            return 200, self.summoner(player_index)
+        # match_ids_by_puuid
+        def query_int(name, default=None):
+            try:
+                return int(query[name][0]) if name in query else default
+            except ValueError:
+                return default
+        count = min(max(query_int("count", 20), 0), 100)
+        return 200, self.match_ids(player_index, query_int("start", 0), count,
+                                   query_int("startTime"), query_int("endTime"))
+
+
+class FixtureStore:
+    """Respuestas grabadas en disco, una por ruta (y query), en JSON."""
+
+    def __init__(self, directory: str, record_from: dict = None, api_key: str = None):
+        self.directory = directory
+        self.record_from = record_from # endpoint -> host real de Riot (solo con --record)
+        self.api_key = api_key
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, path: str, query_string: str):
+        name = unquote(path).strip("/").replace("/", "__")
+        if query_string:
+            name += "__" + hashlib.sha1(query_string.encode()).hexdigest()[:12]
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.#-]", "_", name) + ".json")
+
+    def load(self, path: str, query_string: str):
+        try:
+            with open(self._path(path, query_string), "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+            return fixture["status"], fixture["body"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def record(self, endpoint: str, path: str, query_string: str):
+        if not self.record_from or not self.api_key:
+            return None
+        url = f"{self.record_from[endpoint]}{path}" + (f"?{query_string}" if query_string else "")
+        response = requests.get(url, headers={"X-Riot-Token": self.api_key}, timeout=10)
+        if response.status_code not in (200, 404):
+            print(f"Aviso: no se graba {url}: HTTP {response.status_code}")
+            return response.status_code, {"status": {"message": response.text[:200], "status_code": response.status_code}}
+        fixture = {"status": response.status_code, "body": response.json()}
+        with open(self._path(path, query_string), "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        print(f"Grabado {path} ({response.status_code})")
+        return fixture["status"], fixture["body"]
+
+
+class MockRiotHandler(BaseHTTPRequestHandler):
+    server_version = "MockRiot/1.0"
+    protocol_version = "HTTP/1.1" # keep-alive, como la API real
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body, extra_headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for header, value in (extra_headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        options = server.options
+        url = urlsplit(self.path)
+        if url.path == "/__mock__/stats":
+            with server.stats_lock:
+                return self._send_json(200, {"requests": dict(server.request_counts), "status": dict(server.status_counts)})
+
+        endpoint, params = None, None
+        for route_name, pattern in ROUTES:
+            route_match = pattern.match(url.path)
+            if route_match:
+                endpoint, params = route_name, {k: unquote(v) for k, v in route_match.groupdict().items()}
+                break
+        if endpoint is None:
+            return self._send_json(404, {"status": {"message": "Not found", "status_code": 404}})
+
+        if options.latency_ms or options.jitter_ms:
+            time.sleep(max(0.0, options.latency_ms + random.uniform(-options.jitter_ms, options.jitter_ms)) / 1000)
+
+        status, body, headers = self._handle(endpoint, params, url)
+        with server.stats_lock:
+            server.request_counts[endpoint] += 1
+            server.status_counts[str(status)] += 1
+        self._send_json(status, body, headers)
+
+    def _handle(self, endpoint: str, params: dict, url):
+        server = self.server
+        options = server.options
+        if not self.headers.get("X-Riot-Token"):
+            return 401, {"status": {"message": "Unauthorized", "status_code": 401}}, {}
+
+        app_count, app_retry_after = server.app_windows.hit("app")
+        method_count, method_retry_after = server.method_windows.hit(endpoint)
+        headers = {"X-App-Rate-Limit": server.app_windows.header(), "X-App-Rate-Limit-Count": app_count,
+                   "X-Method-Rate-Limit": server.method_windows.header(), "X-Method-Rate-Limit-Count": method_count}
+        if app_retry_after or method_retry_after:
+            limit_type = "application" if app_retry_after >= method_retry_after else "method"
+            headers.update({"Retry-After": str(max(app_retry_after, method_retry_after)), "X-Rate-Limit-Type": limit_type})
+            return 429, {"status": {"message": "Rate limit exceeded", "status_code": 429}}, headers
+
+        roll = random.random()
+        if roll < options.error_503_rate:
+            return 503, {"status": {"message": "Service unavailable", "status_code": 503}}, headers
+        if roll < options.error_503_rate + options.service_429_rate:
+            # 429 del servicio (sin X-Rate-Limit-Type): no cuenta contra nuestra clave
+            headers["Retry-After"] = "1"
+            return 429, {"status": {"message": "Rate limit exceeded", "status_code": 429}}, headers
+
+        if server.fixtures is not None:
+            fixture = server.fixtures.load(url.path, url.query) or server.fixtures.record(endpoint, url.path, url.query)
+            if fixture is not None:
+                return fixture[0], fixture[1], headers
+        if options.fixtures_only:
+            return 404, {"status": {"message": "Data not found (no fixture)", "status_code": 404}}, headers
+        status, body = server.data.respond(endpoint, params, parse_qs(url.query))
+        return status, body, headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Riot.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--players", type=int, default=500, help="Jugadores sintéticos (Player0#MOCK ...).")
+    parser.add_argument("--matches", type=int, default=5000, help="Partidas sintéticas en total.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--platform", default=os.environ.get("RIOT_PLATFORM_REGION", "euw1"))
+    parser.add_argument("--app-limit", default="20:1,100:120", help="Límite de aplicación (X-App-Rate-Limit).")
+    parser.add_argument("--method-limit", default="2000:10", help="Límite por endpoint (X-Method-Rate-Limit).")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--service-429-rate", type=float, default=0, help="Fracción de 429 aleatorios del servicio.")
+    parser.add_argument("--error-503-rate", type=float, default=0, help="Fracción de 503 aleatorios.")
+    parser.add_argument("--fixtures", help="Directorio de respuestas grabadas (se sirven antes que las sintéticas).")
+    parser.add_argument("--fixtures-only", action="store_true", help="Sin datos sintéticos: 404 si no hay fixture.")
+    parser.add_argument("--record", action="store_true",
+                        help="Graba en --fixtures lo que falte, pidiéndolo a Riot con RIOT_API_KEY.")
+    parser.add_argument("--verbose", action="store_true")
+    options = parser.parse_args()
+
+    fixtures = None
+    if options.fixtures:
+        record_from = None
+        if options.record:
+            account_host = f"https://{os.environ.get('RIOT_ACCOUNT_REGION', 'europe')}.api.riotgames.com"
+            platform_host = f"https://{options.platform}.api.riotgames.com"
+            record_from = {name: account_host if name.startswith("account") or name.startswith("match") else platform_host
+                           for name, _ in ROUTES}
+        fixtures = FixtureStore(options.fixtures, record_from, os.environ.get("RIOT_API_KEY"))
+    elif options.record or options.fixtures_only:
+        parser.error("--record y --fixtures-only necesitan --fixtures DIR.")
+
+    server = ThreadingHTTPServer((options.host, options.port), MockRiotHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.fixtures = fixtures
+    server.data = SyntheticRiotData(options.players, options.matches, options.platform, options.seed)
+    server.app_windows = RateLimitWindows(parse_limits(options.app_limit))
+    server.method_windows = RateLimitWindows(parse_limits(options.method_limit))
+    server.stats_lock = threading.Lock()
+    server.request_counts = Counter()
+    server.status_counts = Counter()
+
+    print(f"Mock de la API de Riot en http://{options.host}:{options.port} "
+          f"({options.players} jugadores, {options.matches} partidas, límites app {options.app_limit}).")
+    print(f"Prueba con Player0#MOCK. Estadísticas en http://{options.host}:{options.port}/__mock__/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
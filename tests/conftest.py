@@ -0,0 +1,66 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Antes de importar la aplicación: clave falsa y estado compartido fuera de instance/
+_STATE_DIR = tempfile.mkdtemp(prefix="lolst-tests-")
+os.environ.setdefault("RIOT_API_KEY", "test")
+os.environ.setdefault("RIOT_RATE_LIMIT_STATE_FILE", os.path.join(_STATE_DIR, "riot_rate_limits.json"))
+os.environ.setdefault("SINGLE_FLIGHT_LOCK_DIR", os.path.join(_STATE_DIR, "locks"))
+os.environ.setdefault("MATCH_ARCHIVE_PATH", os.path.join(_STATE_DIR, "match_archive.sqlite3"))
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class FakeClock:
+    """Sustituye al módulo `time` de un módulo de la app: el tiempo solo avanza con sleep() o advance()."""
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class StubResponse:
+    """Lo que el governor y _riot_get leen de una respuesta de requests."""
+
+    def __init__(self, status_code: int = 200, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def db_app(tmp_path):
+    """Aplicación mínima con la BD de los modelos en un SQLite temporal, con su contexto activo."""
+    from flask import Flask
+
+    from app import models # Registra las tablas en db.metadata
+    from app.extensions import db
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
@@ -0,0 +1,128 @@
+# tests/test_cache_backends.py
+import os
+
+from cachelib import file as cachelib_file
+
+from app import cache_backends
+from app.cache_backends import TieredFileSystemCache
+
+
+def make_cache(tmp_path, **options):
+    options.setdefault("threshold", 0)
+    return TieredFileSystemCache(str(tmp_path / "cache"), stats_path=str(tmp_path / "stats.json"), **options)
+
+
+def set_mtime(cache, key, mtime):
+    os.utime(cache._get_filename(key), (mtime, mtime))
+
+
+def test_memory_tier_evicts_least_recently_used_entries(tmp_path):
+    cache = make_cache(tmp_path, memory_max_entries=2)
+    cache.set("sinfo__a", 1)
+    cache.set("sinfo__b", 2)
+    assert cache.get("sinfo__a") == 1 # "a" pasa a ser la más reciente
+    cache.set("sinfo__c", 3)
+    assert list(cache._memory) == ["sinfo__a", "sinfo__c"]
+    assert cache.get("sinfo__b") == 2 # Sigue en disco
+    assert cache.stats()["tiers"]["disk"]["hits"] == 1
+
+
+def test_memory_tier_respects_byte_budget(tmp_path):
+    cache = make_cache(tmp_path, memory_max_bytes=1500)
+    cache.set("sinfo__a", "x" * 600)
+    cache.set("sinfo__b", "x" * 600)
+    cache.set("sinfo__c", "x" * 600)
+    assert cache._memory_bytes <= 1500
+    assert "sinfo__a" not in cache._memory
+    cache.set("sinfo__big", "x" * 5000) # Más grande que todo el nivel: solo a disco
+    assert "sinfo__big" not in cache._memory
+
+
+def test_memory_hits_return_independent_copies(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("sinfo__a", {"puuid": "abc", "matches": []})
+    cache.get("sinfo__a")["matches"].append("EUW1_1") # Acierto en memoria
+    cache.get("sinfo__a")["puuid"] = "otro"
+    assert cache.get("sinfo__a") == {"puuid": "abc", "matches": []}
+    assert cache.stats()["tiers"]["memory"]["hits"] == 3
+
+
+def test_excluded_prefixes_always_read_from_disk(tmp_path):
+    cache = make_cache(tmp_path, memory_excluded_prefixes=("job",))
+    cache.set("job__1", {"state": "running"})
+    assert "job__1" not in cache._memory
+    assert cache.get("job__1") == {"state": "running"}
+
+
+def test_memory_entries_expire_after_memory_ttl(tmp_path, monkeypatch, clock):
+    clock.now = cache_backends.time.time()
+    monkeypatch.setattr(cache_backends, "time", clock)
+    cache = make_cache(tmp_path, memory_ttl=60)
+    cache.set("sinfo__a", 1)
+    clock.advance(61)
+    assert cache.get("sinfo__a") == 1
+    assert cache.stats()["tiers"]["memory"]["misses"] == 1 # Se ha vuelto a leer del disco
+
+
+def test_sweep_evicts_least_recently_used_files_down_to_watermark(tmp_path):
+    cache = make_cache(tmp_path, memory_max_entries=0)
+    for i in range(10):
+        cache.set(f"matchdetail__{i}", "x" * 1000)
+        set_mtime(cache, f"matchdetail__{i}", 1_000_000 + i)
+    file_size = os.path.getsize(cache._get_filename("matchdetail__0"))
+    cache.disk_max_bytes = file_size * 5
+    cache.get("matchdetail__0") # Leerla la marca como usada
+    result = cache.sweep()
+    assert result["bytes"] <= cache.disk_max_bytes * cache_backends.CACHE_DISK_LOW_WATERMARK
+    assert result["evicted"] == 6
+    remaining = {key for key in (f"matchdetail__{i}" for i in range(10)) if cache.has(key)}
+    assert remaining == {"matchdetail__0", "matchdetail__7", "matchdetail__8", "matchdetail__9"}
+
+
+def test_sweep_removes_expired_files(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, memory_max_entries=0)
+    cache.set("sinfo__old", 1, timeout=1)
+    cache.set("sinfo__live", 2, timeout=0)
+    real_time = cache_backends.time.time
+    monkeypatch.setattr(cache_backends.time, "time", lambda: real_time() + 10)
+    result = cache.sweep()
+    assert result["expired_removed"] == 1
+    assert not os.path.exists(cache._get_filename("sinfo__old"))
+    assert cache.get("sinfo__live") == 2
+
+
+def test_memory_hits_refresh_the_disk_mtime_at_most_once_per_interval(tmp_path, monkeypatch, clock):
+    clock.now = cache_backends.time.time()
+    monkeypatch.setattr(cache_backends, "time", clock)
+    cache = make_cache(tmp_path, memory_ttl=3600)
+    cache.set("sinfo__hot", 1)
+    set_mtime(cache, "sinfo__hot", 1_000_000)
+    cache.get("sinfo__hot")
+    assert os.path.getmtime(cache._get_filename("sinfo__hot")) == 1_000_000
+    clock.advance(cache_backends.CACHE_MEMORY_TOUCH_INTERVAL)
+    cache.get("sinfo__hot")
+    assert os.path.getmtime(cache._get_filename("sinfo__hot")) > 1_000_000
+
+
+def test_stats_are_flushed_every_n_lookups(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_backends, "CACHE_STATS_FLUSH_EVERY", 3)
+    cache = make_cache(tmp_path)
+    cache.set("sinfo__a", 1)
+    cache.get("sinfo__a")
+    cache.get("sinfo__missing")
+    assert cache.shared_stats() == {}
+    cache.get("sinfo__a")
+    shared = cache.shared_stats()
+    assert shared["tiers"]["memory"] == {"hits": 2, "misses": 1}
+    assert shared["prefixes"]["sinfo"] == {"memory_hits": 2, "disk_hits": 0, "misses": 1}
+
+
+def test_add_only_writes_missing_or_expired_keys(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    assert cache.add("job__latest__a", "primero", timeout=1)
+    assert not cache.add("job__latest__a", "segundo", timeout=1)
+    assert cache.get("job__latest__a") == "primero"
+    real_time = cache_backends.time.time
+    monkeypatch.setattr(cachelib_file, "time", lambda: real_time() + 10)
+    assert cache.add("job__latest__a", "tras caducar", timeout=1)
+    assert cache.get("job__latest__a") == "tras caducar"
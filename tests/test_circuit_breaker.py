@@ -0,0 +1,167 @@
+# tests/test_circuit_breaker.py
+import pytest
+import requests
+
+from app import circuit_breaker, riot_api
+from app.circuit_breaker import CircuitBreaker, RiotCircuitOpenError
+from app.rate_limiter import RiotRateLimitError
+from conftest import StubResponse
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(fake_time):
+    return CircuitBreaker("match", failure_threshold=2, cooldown_seconds=30)
+
+
+def open_circuit(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(RiotCircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial(breaker, fake_time):
+    assert breaker.before_call() is False
+    open_circuit(breaker)
+    fake_time.advance(30)
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+    with pytest.raises(RiotCircuitOpenError):
+        breaker.before_call() # Solo una llamada de prueba a la vez
+
+
+def test_successful_trial_closes(breaker, fake_time):
+    open_circuit(breaker)
+    fake_time.advance(30)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_another_cooldown(breaker, fake_time):
+    open_circuit(breaker)
+    fake_time.advance(30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    fake_time.advance(29)
+    with pytest.raises(RiotCircuitOpenError):
+        breaker.before_call()
+
+
+class StubGetResponses(list):
+    """Respuestas pendientes del GET, y los cupos de los limitadores que se han pedido."""
+
+    def __init__(self):
+        super().__init__()
+        self.slots_taken = []
+
+
+@pytest.fixture
+def stub_riot_get(monkeypatch, breaker):
+    """_riot_get sin limitadores ni red: `responses` es la lista de respuestas o excepciones del GET."""
+    responses = StubGetResponses()
+
+    def fake_get(url, **kwargs):
+        outcome = responses.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(riot_api.riot_http_client, "get", fake_get)
+    monkeypatch.setattr(riot_api.riot_rate_limiter, "acquire", lambda: responses.slots_taken.append("bucket"))
+    monkeypatch.setattr(riot_api.riot_rate_governor, "acquire", lambda endpoint, url: responses.slots_taken.append("governor"))
+    monkeypatch.setattr(riot_api.riot_rate_governor, "update_from_response", lambda endpoint, url, response: None)
+    monkeypatch.setattr(riot_api.riot_circuit_breakers, "get", lambda endpoint: breaker)
+    monkeypatch.setattr(riot_api.time, "sleep", lambda seconds: None)
+    return responses
+
+
+def test_trial_raising_non_request_error_frees_the_trial(breaker, fake_time, stub_riot_get):
+    open_circuit(breaker)
+    fake_time.advance(30)
+    stub_riot_get.append(KeyError("error de programación, no de Riot"))
+    with pytest.raises(KeyError):
+        riot_api._riot_get("match", "https://riot/match")
+    # La prueba abandonada no deja el circuito semiabierto bloqueado para siempre
+    stub_riot_get.append(StubResponse(200))
+    assert riot_api._riot_get("match", "https://riot/match").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_trial_timeout_reopens(breaker, fake_time, stub_riot_get):
+    open_circuit(breaker)
+    fake_time.advance(30)
+    stub_riot_get.append(requests.exceptions.ReadTimeout("timeout"))
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        riot_api._riot_get("match", "https://riot/match")
+    assert breaker.state == "open"
+
+
+def test_server_errors_are_retried_until_the_circuit_opens(breaker, stub_riot_get):
+    stub_riot_get.extend([StubResponse(503), StubResponse(503), StubResponse(200)])
+    assert riot_api._riot_get("match", "https://riot/match").status_code == 503
+    assert breaker.state == "open"
+    assert len(stub_riot_get) == 1 # El tercer intento no llega a hacerse
+
+
+def test_open_circuit_fails_before_taking_rate_limit_slots(breaker, stub_riot_get):
+    open_circuit(breaker)
+    with pytest.raises(RiotCircuitOpenError):
+        riot_api._riot_get("match", "https://riot/match")
+    assert stub_riot_get.slots_taken == []
+
+
+def test_trial_rejected_by_the_governor_frees_the_trial(breaker, fake_time, stub_riot_get, monkeypatch):
+    open_circuit(breaker)
+    fake_time.advance(30)
+
+    def governor_full(endpoint, url):
+        raise RiotRateLimitError("habría que esperar demasiado")
+
+    monkeypatch.setattr(riot_api.riot_rate_governor, "acquire", governor_full)
+    with pytest.raises(RiotRateLimitError):
+        riot_api._riot_get("match", "https://riot/match")
+    assert breaker.before_call() is True # La prueba sigue disponible
+
+
+def test_only_the_trial_call_releases_the_trial(breaker, fake_time, stub_riot_get, monkeypatch):
+    class InterruptedAfterOpening(BaseException):
+        pass
+
+    def slow_call_outlives_the_circuit(url, **kwargs):
+        # Mientras esta llamada (del circuito cerrado) esperaba, el circuito se abrió y otra empezó la prueba
+        open_circuit(breaker)
+        fake_time.advance(30)
+        breaker.before_call()
+        raise InterruptedAfterOpening()
+
+    monkeypatch.setattr(riot_api.riot_http_client, "get", slow_call_outlives_the_circuit)
+    with pytest.raises(InterruptedAfterOpening):
+        riot_api._riot_get("match", "https://riot/match")
+    with pytest.raises(RiotCircuitOpenError):
+        breaker.before_call() # La prueba de la otra llamada sigue en curso
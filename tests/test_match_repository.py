@@ -0,0 +1,39 @@
+# tests/test_match_repository.py
+from sqlalchemy import insert
+
+from app import match_repository
+from app.extensions import db
+from app.match_repository import get_existing_match_ids, match_to_rows, save_new_matches
+from app.models import Partida, ParticipantePartida
+
+
+def match(match_id, puuids=("puuid-a", "puuid-b")):
+    participants = [{"puuid": puuid, "championName": "Ahri", "teamId": 100 + 100 * (i % 2), "win": i % 2 == 0}
+                    for i, puuid in enumerate(puuids)]
+    return {"metadata": {"matchId": match_id, "participants": list(puuids)},
+            "info": {"gameCreation": 1_700_000_000_000, "gameDuration": 1800, "gameVersion": "14.1.1",
+                     "queueId": 420, "participants": participants, "teams": []}}
+
+
+def participant_match_ids():
+    return sorted(row.match_id for row in db.session.query(ParticipantePartida.match_id))
+
+
+def test_saving_again_skips_stored_matches(db_app):
+    assert save_new_matches([match("EUW1_1"), match("EUW1_2")]) == 2
+    assert save_new_matches([match("EUW1_2"), match("EUW1_3"), {"metadata": {}}]) == 1
+    assert get_existing_match_ids(["EUW1_1", "EUW1_2", "EUW1_3", "EUW1_4"]) == {"EUW1_1", "EUW1_2", "EUW1_3"}
+    assert participant_match_ids() == ["EUW1_1"] * 2 + ["EUW1_2"] * 2 + ["EUW1_3"] * 2
+
+
+def test_participants_of_a_match_lost_to_another_worker_are_dropped(db_app, monkeypatch):
+    """Otro worker guarda EUW1_2 entre la consulta IN y la inserción: se omite con sus participantes."""
+    def existing_match_ids_then_race(match_ids):
+        partida_row, _ = match_to_rows("EUW1_2", match("EUW1_2"))
+        db.session.execute(insert(Partida), [partida_row])
+        db.session.commit()
+        return set()
+
+    monkeypatch.setattr(match_repository, "get_existing_match_ids", existing_match_ids_then_race)
+    assert save_new_matches([match("EUW1_1"), match("EUW1_2")]) == 1
+    assert participant_match_ids() == ["EUW1_1", "EUW1_1"]
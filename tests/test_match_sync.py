@@ -0,0 +1,85 @@
+# tests/test_match_sync.py
+import pytest
+
+from app import riot_api
+from app.match_repository import advance_sync_cursor, get_sync_state, save_sync_state
+from app.riot_api import MATCH_IDS_MAX_COUNT, _sync_match_ids
+
+
+class MatchIdsApi:
+    """Sustituye a las dos consultas de IDs de match-v5 y anota cuáles se hicieron."""
+
+    def __init__(self, recent_match_ids, new_match_ids=()):
+        self.recent_match_ids = list(recent_match_ids)
+        self.new_match_ids = list(new_match_ids)
+        self.calls = []
+
+    def full(self, puuid, count, start=0):
+        self.calls.append(("full", count))
+        return self.recent_match_ids[:count]
+
+    def since(self, puuid, start_time):
+        self.calls.append(("since", start_time))
+        return self.new_match_ids
+
+
+@pytest.fixture
+def match_ids_api(db_app, monkeypatch):
+    api = MatchIdsApi([f"EUW1_{n}" for n in range(20, 0, -1)])
+    monkeypatch.setattr(riot_api, "_get_match_ids_from_api", api.full)
+    monkeypatch.setattr(riot_api, "_get_match_ids_since_from_api", api.since)
+    return api
+
+
+def match(match_id, game_creation):
+    return {"metadata": {"matchId": match_id}, "info": {"gameCreation": game_creation}}
+
+
+def test_first_sync_fetches_the_full_list(match_ids_api):
+    assert _sync_match_ids("puuid-a", 10) == match_ids_api.recent_match_ids[:10]
+    assert match_ids_api.calls == [("full", 10)]
+    assert get_sync_state("puuid-a") == (match_ids_api.recent_match_ids[:10], 10, None)
+
+
+def test_advance_sync_cursor_only_moves_forward(db_app):
+    save_sync_state("puuid-a", ["EUW1_2", "EUW1_1"], synced_count=2)
+    advance_sync_cursor("puuid-a", [match("EUW1_1", 1_000), match("EUW1_2", 2_000)])
+    assert get_sync_state("puuid-a")[2] == 2_000
+    advance_sync_cursor("puuid-a", [match("EUW1_0", 500)])
+    assert get_sync_state("puuid-a")[2] == 2_000
+
+
+def test_save_sync_state_keeps_synced_count_when_omitted(db_app):
+    save_sync_state("puuid-a", ["EUW1_1"], synced_count=20)
+    save_sync_state("puuid-a", ["EUW1_2", "EUW1_1"])
+    assert get_sync_state("puuid-a") == (["EUW1_2", "EUW1_1"], 20, None)
+
+
+def test_incremental_sync_merges_new_ids_with_the_stored_ones(match_ids_api):
+    _sync_match_ids("puuid-a", 10)
+    advance_sync_cursor("puuid-a", [match("EUW1_20", 2_000_000)])
+    match_ids_api.new_match_ids = ["EUW1_22", "EUW1_21", "EUW1_20"] # startTime incluye la última conocida
+
+    assert _sync_match_ids("puuid-a", 5) == ["EUW1_22", "EUW1_21", "EUW1_20", "EUW1_19", "EUW1_18"]
+    assert match_ids_api.calls == [("full", 10), ("since", 2_000)]
+    known_match_ids, synced_count, _ = get_sync_state("puuid-a")
+    assert synced_count == 10
+    assert known_match_ids == ["EUW1_22", "EUW1_21"] + match_ids_api.recent_match_ids[:8]
+
+
+def test_incremental_sync_falls_back_to_a_full_sync_after_a_gap(match_ids_api):
+    _sync_match_ids("puuid-a", 10)
+    advance_sync_cursor("puuid-a", [match("EUW1_20", 2_000_000)])
+    match_ids_api.new_match_ids = [f"EUW1_{n}" for n in range(200, 200 + MATCH_IDS_MAX_COUNT)]
+
+    _sync_match_ids("puuid-a", 10)
+    assert match_ids_api.calls == [("full", 10), ("since", 2_000), ("full", 10)]
+
+
+def test_asking_for_more_ids_than_synced_does_a_full_sync(match_ids_api):
+    _sync_match_ids("puuid-a", 5)
+    advance_sync_cursor("puuid-a", [match("EUW1_20", 2_000_000)])
+
+    assert _sync_match_ids("puuid-a", 15) == match_ids_api.recent_match_ids[:15]
+    assert match_ids_api.calls == [("full", 5), ("full", 15)]
+    assert get_sync_state("puuid-a")[:2] == (match_ids_api.recent_match_ids[:15], 15)
@@ -0,0 +1,111 @@
+# tests/test_rate_limiter.py
+import pytest
+
+from app import rate_limiter
+from app.rate_limiter import TokenBucket, RiotRateLimitGovernor, RiotRateLimitError, parse_rate_limit_header
+from conftest import StubResponse
+
+URL = "https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1"
+OTHER_URL = "https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id/a/b"
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def governor(tmp_path, fake_time):
+    return RiotRateLimitGovernor(str(tmp_path / "limits.json"), {1: 3, 120: 100}, max_wait_seconds=5)
+
+
+def test_parse_rate_limit_header():
+    assert parse_rate_limit_header("20:1,100:120") == {1: 20, 120: 100}
+    assert parse_rate_limit_header("basura,5:10") == {10: 5}
+    assert parse_rate_limit_header(None) == {}
+
+
+def test_token_bucket_allows_burst_then_reports_wait(fake_time):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_refills_up_to_capacity(fake_time):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.try_acquire()
+    fake_time.advance(0.5)
+    assert bucket.try_acquire() == 0
+    fake_time.advance(60)
+    assert [bucket.try_acquire() for _ in range(4)] == [0, 0, 0, pytest.approx(0.5)]
+
+
+def test_token_bucket_acquire_sleeps_for_missing_tokens(fake_time):
+    bucket = TokenBucket(rate=4, capacity=1)
+    bucket.acquire()
+    bucket.acquire()
+    assert fake_time.sleeps == [pytest.approx(0.25)]
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+
+def test_governor_waits_when_app_window_is_full(governor, fake_time):
+    assert [governor.try_acquire("match", URL) for _ in range(3)] == [0, 0, 0]
+    assert governor.try_acquire("match", URL) == pytest.approx(1)
+    fake_time.advance(1)
+    assert governor.try_acquire("match", URL) == 0
+
+
+def test_governor_adopts_limits_and_counts_from_headers(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(200, {
+        "X-App-Rate-Limit": "3:1,100:120", "X-App-Rate-Limit-Count": "3:1,3:120",
+        "X-Method-Rate-Limit": "50:10", "X-Method-Rate-Limit-Count": "1:10"}))
+    # Riot dice que la ventana de 1s ya está llena (otra instancia con la misma clave)
+    assert governor.try_acquire("match", URL) == pytest.approx(1)
+
+
+def test_governor_method_limit_only_blocks_its_endpoint(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(200, {
+        "X-Method-Rate-Limit": "1:10", "X-Method-Rate-Limit-Count": "1:10"}))
+    assert governor.try_acquire("match", URL) == pytest.approx(10)
+    assert governor.try_acquire("account", OTHER_URL) == 0
+
+
+def test_governor_429_application_blocks_whole_host(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(429, {
+        "Retry-After": "7", "X-Rate-Limit-Type": "application"}))
+    assert governor.try_acquire("match", URL) == pytest.approx(7)
+    assert governor.try_acquire("account", OTHER_URL) == pytest.approx(7)
+
+
+def test_governor_429_service_blocks_only_the_endpoint(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(429, {"Retry-After": "4"}))
+    assert governor.try_acquire("match", URL) == pytest.approx(4)
+    assert governor.try_acquire("account", OTHER_URL) == 0
+    fake_time.advance(4)
+    assert governor.try_acquire("match", URL) == 0
+
+
+def test_governor_429_without_retry_after_uses_default(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(429, {"X-Rate-Limit-Type": "method"}))
+    assert governor.try_acquire("match", URL) == pytest.approx(rate_limiter.RIOT_API_DEFAULT_RETRY_AFTER_SECONDS)
+
+
+def test_governor_acquire_gives_up_beyond_max_wait(governor, fake_time):
+    governor.update_from_response("match", URL, StubResponse(429, {
+        "Retry-After": "60", "X-Rate-Limit-Type": "application"}))
+    with pytest.raises(RiotRateLimitError):
+        governor.acquire("match", URL)
+    assert fake_time.sleeps == []
+
+
+def test_governor_acquire_sleeps_until_window_resets(governor, fake_time):
+    for _ in range(3):
+        governor.acquire("match", URL)
+    governor.acquire("match", URL)
+    assert fake_time.sleeps == [pytest.approx(1)]
@@ -0,0 +1,74 @@
+# tests/test_riot_api_async.py
+import asyncio
+import threading
+
+import pytest
+from flask import Flask, current_app
+
+from app import riot_api_async
+from app.riot_api import _make_cache_key_summoner_info
+from app.riot_api_async import AsyncRiotClient, run_sync
+from app.single_flight import riot_single_flight
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+def test_run_sync_runs_on_the_bridge_loop_with_the_app_context(app):
+    async def call(client):
+        return threading.current_thread().name, current_app._get_current_object(), client, asyncio.get_running_loop()
+
+    first = run_sync(call)
+    second = run_sync(call)
+    assert first[0] == "riot-async-bridge"
+    assert first[1] is app
+    assert isinstance(first[2], AsyncRiotClient)
+    assert first[2:] == second[2:] # Mismo cliente y mismo loop en todo el proceso
+
+
+def test_run_sync_propagates_errors(app):
+    async def call(client):
+        raise ValueError("fallo dentro del loop")
+
+    with pytest.raises(ValueError):
+        run_sync(call)
+
+
+def test_async_miss_waits_for_the_sync_call_in_flight(app, monkeypatch):
+    """Una llamada síncrona descargando la misma clave: el cliente asíncrono espera su resultado."""
+    cache_key = _make_cache_key_summoner_info("Jugador", "EUW")
+    api_calls = []
+    monkeypatch.setattr(riot_api_async, "read_cached", lambda key: (False, None, False))
+    monkeypatch.setattr(riot_api_async, "write_cached", lambda *args: None)
+
+    async def fetch_json(self, endpoint, url, description, default):
+        api_calls.append(url)
+        return {"puuid": "async"}
+
+    monkeypatch.setattr(AsyncRiotClient, "_fetch_json", fetch_json)
+
+    sync_started, release_sync = threading.Event(), threading.Event()
+
+    def sync_fetch():
+        sync_started.set()
+        release_sync.wait(5)
+        return {"puuid": "sync"}
+
+    sync_caller = threading.Thread(target=riot_single_flight.do, args=(cache_key, sync_fetch))
+    sync_caller.start()
+    assert sync_started.wait(5)
+
+    async def lookup():
+        async with AsyncRiotClient() as client:
+            pending = asyncio.ensure_future(client.get_summoner_info("Jugador", "EUW"))
+            await asyncio.sleep(0.1)
+            release_sync.set()
+            return await pending
+
+    assert asyncio.run(lookup()) == {"puuid": "sync"}
+    sync_caller.join(5)
+    assert api_calls == []
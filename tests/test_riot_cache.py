@@ -0,0 +1,116 @@
+# tests/test_riot_cache.py
+import pytest
+from flask import Flask
+
+from app import riot_cache
+from app.riot_cache import RiotNotFound, swr_cached
+
+
+class FakeCache:
+    """Caché en un dict que respeta el timeout (el hard TTL) con el reloj falso."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.entries = {}
+
+    def get(self, key):
+        expires_at, value = self.entries.get(key, (None, None))
+        if expires_at is not None and self.clock.time() >= expires_at:
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.entries[key] = (self.clock.time() + timeout if timeout else None, value)
+        return True
+
+
+class InlineRefresher:
+    """Apunta las revalidaciones en lugar de lanzarlas en un hilo; run() las ejecuta."""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, cache_key, refresh):
+        self.pending.append(refresh)
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for refresh in pending:
+            refresh()
+
+
+@pytest.fixture
+def fake_cache(monkeypatch, clock):
+    fake_cache = FakeCache(clock)
+    monkeypatch.setattr(riot_cache, "time", clock)
+    monkeypatch.setattr(riot_cache, "cache", fake_cache)
+    with Flask(__name__).app_context():
+        yield fake_cache
+
+
+@pytest.fixture
+def refresher(monkeypatch):
+    refresher = InlineRefresher()
+    monkeypatch.setattr(riot_cache, "riot_cache_refresher", refresher)
+    return refresher
+
+
+@pytest.fixture
+def riot_lookup(fake_cache, refresher):
+    """Función cacheada con soft TTL 10 y hard TTL 100; `responses` decide lo que "devuelve Riot"."""
+    responses = []
+    calls = []
+
+    @swr_cached(lambda name: f"sinfo__{name}", 10, 100)
+    def get_account(name):
+        calls.append(name)
+        return responses.pop(0)
+
+    get_account.responses = responses
+    get_account.calls = calls
+    return get_account
+
+
+def test_fresh_entry_is_served_without_calling_riot(riot_lookup, clock):
+    riot_lookup.responses.append({"puuid": "v1"})
+    assert riot_lookup("a") == {"puuid": "v1"}
+    clock.advance(9)
+    assert riot_lookup("a") == {"puuid": "v1"}
+    assert riot_lookup.calls == ["a"]
+
+
+def test_stale_entry_is_served_while_revalidating(riot_lookup, refresher, clock):
+    riot_lookup.responses.extend([{"puuid": "v1"}, {"puuid": "v2"}])
+    riot_lookup("a")
+    clock.advance(11)
+    assert riot_lookup("a") == {"puuid": "v1"} # Obsoleto, pero al momento
+    assert len(refresher.pending) == 1
+    refresher.run()
+    assert riot_lookup("a") == {"puuid": "v2"}
+    assert riot_lookup.calls == ["a", "a"]
+
+
+def test_entry_past_hard_ttl_is_fetched_again(riot_lookup, refresher, clock):
+    riot_lookup.responses.extend([{"puuid": "v1"}, {"puuid": "v2"}])
+    riot_lookup("a")
+    clock.advance(100)
+    assert riot_lookup("a") == {"puuid": "v2"}
+    assert refresher.pending == []
+
+
+def test_not_found_is_cached_briefly(riot_lookup, monkeypatch, clock):
+    monkeypatch.setattr(riot_cache, "NEGATIVE_CACHE_TTL_SECONDS", 5)
+    riot_lookup.responses.extend([RiotNotFound({}), {"puuid": "nuevo"}])
+    assert riot_lookup("nadie") == {}
+    clock.advance(4)
+    assert riot_lookup("nadie") == {}
+    assert riot_lookup.calls == ["nadie"]
+    clock.advance(1) # Pasado el TTL negativo (que es también su hard TTL) se vuelve a preguntar
+    assert riot_lookup("nadie") == {"puuid": "nuevo"}
+
+
+def test_errors_are_not_cached(riot_lookup):
+    riot_lookup.responses.extend([None, {"puuid": "v1"}])
+    assert riot_lookup("a") is None
+    assert riot_lookup("a") == {"puuid": "v1"}
+    assert riot_lookup.calls == ["a", "a"]
@@ -0,0 +1,141 @@
+# tests/test_single_flight.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+class CountingLock:
+    """El lock interno de SingleFlight, contando cuántas veces se ha tomado (una por llamada al entrar)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+@pytest.fixture
+def flights(tmp_path):
+    single_flight = SingleFlight(str(tmp_path / "locks"), wait_seconds=5)
+    single_flight._lock = CountingLock()
+    return single_flight
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def run_concurrently(flights, key, fn, callers: int):
+    """Lanza `callers` hilos con la misma clave; fn debe bloquearse hasta que todos hayan entrado en do()."""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution(flights):
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"puuid": "abc"}
+
+    threads, results, errors = run_concurrently(flights, "sinfo__a", fetch, callers=5)
+    wait_until(lambda: flights._lock.acquired >= len(threads)) # Todos han visto el vuelo en curso
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{"puuid": "abc"}] * 5
+    assert errors == []
+
+
+def test_followers_get_the_leader_error(flights):
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("Riot caído")
+
+    threads, results, errors = run_concurrently(flights, "sinfo__b", fetch, callers=3)
+    wait_until(lambda: flights._lock.acquired >= len(threads)) # Todos han visto el vuelo en curso
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == []
+    assert len(errors) == 3 and all(isinstance(error, ValueError) for error in errors)
+
+
+def test_recheck_value_skips_the_call(flights):
+    def fetch():
+        raise AssertionError("no debería llamarse")
+
+    assert flights.do("sinfo__c", fetch, recheck=lambda: "guardado por otro worker") == "guardado por otro worker"
+
+
+def test_finished_flight_is_not_reused(flights):
+    counter = iter(range(10))
+    assert flights.do("sinfo__d", lambda: next(counter)) == 0
+    assert flights.do("sinfo__d", lambda: next(counter)) == 1
+
+
+def test_sync_call_waits_for_an_async_leader(flights):
+    release = threading.Event()
+    calls = []
+
+    async def fetch():
+        calls.append("async")
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return "desde la corrutina"
+
+    async def leader():
+        return await flights.do_async("sinfo__e", fetch)
+
+    leader_result = []
+    leader_thread = threading.Thread(target=lambda: leader_result.append(asyncio.run(leader())))
+    leader_thread.start()
+    wait_until(lambda: calls)
+    threads, results, errors = run_concurrently(flights, "sinfo__e", lambda: calls.append("sync"), callers=1)
+    wait_until(lambda: flights._lock.acquired >= 2) # El líder y el llamador síncrono
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join(5)
+    assert calls == ["async"]
+    assert results == leader_result == ["desde la corrutina"]
+
+
+def test_async_recheck_value_skips_the_call(flights):
+    async def fetch():
+        raise AssertionError("no debería llamarse")
+
+    async def recheck():
+        return "guardado por otro worker"
+
+    assert asyncio.run(flights.do_async("sinfo__f", fetch, recheck)) == "guardado por otro worker"
@@ -0,0 +1,61 @@
+# tests/test_summoner_jobs.py
+import threading
+import time
+
+import pytest
+
+from app import summoner_jobs as summoner_jobs_module
+from app.cache_backends import TieredFileSystemCache
+from app.summoner_jobs import JOB_DONE, JOB_RUNNING, SummonerAnalysisJobs
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    cache = TieredFileSystemCache(str(tmp_path / "cache"), threshold=0, memory_excluded_prefixes=("job",))
+    monkeypatch.setattr(summoner_jobs_module, "cache", cache)
+    monkeypatch.setattr(summoner_jobs_module, "write_cached", lambda *args: None)
+    return SummonerAnalysisJobs(max_workers=1)
+
+
+def test_concurrent_visits_start_a_single_analysis(jobs, monkeypatch):
+    cache = summoner_jobs_module.cache
+    disk_set = cache.set
+
+    def set_after_a_pause(*args, **kwargs):
+        time.sleep(0.01) # Ensancha la ventana entre comprobar el trabajo activo y escribir el nuevo
+        return disk_set(*args, **kwargs)
+
+    monkeypatch.setattr(cache, "set", set_after_a_pause)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def visit():
+        barrier.wait()
+        results.append(jobs.stream("puuid-a"))
+
+    threads = [threading.Thread(target=visit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    streams = [analysis_stream for _, analysis_stream in results if analysis_stream is not None]
+    assert len(streams) == 1
+    assert len({job["id"] for job, _ in results}) == 1
+
+
+def test_finished_job_releases_the_claim(jobs):
+    job, analysis_stream = jobs.stream("puuid-b")
+    assert jobs.stream("puuid-b") == (jobs.get(job["id"]), None) # Mientras dura, las visitas lo siguen
+    analysis_stream.on_complete({"matches": []})
+    assert jobs.get(job["id"])["state"] == JOB_DONE
+
+    next_job, next_stream = jobs.stream("puuid-b")
+    assert next_stream is not None
+    assert next_job["id"] != job["id"] and next_job["state"] == JOB_RUNNING
+
+
+def test_losing_claim_leaves_no_orphan_job(jobs):
+    job, _ = jobs.stream("puuid-c")
+    follower_job, _ = jobs.stream("puuid-c")
+    assert follower_job["id"] == job["id"]
+    assert len(list(summoner_jobs_module.cache._list_dir())) == 2 # El trabajo y su reclamación
@@ -122,6 +122,15 @@ def fetch_and_prepare_data():
         if conn:
             conn.close()
 
+def replace_atomically(path, write):
+    """
+    Escribe `path` en un temporal y lo sustituye con os.replace. La web recarga el modelo en
+    caliente (app/ai/model_registry.py): nunca debe ver un archivo a medias.
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
 def train_model(X, y):
     if X is None or y is None or X.empty or y.empty:
         print("No hay datos válidos para entrenar el modelo.")
@@ -187,9 +196,9 @@ if __name__ == '__main__':
     if X_features is not None and y_target is not None and champion_list_for_features is not None:
         trained_model = train_model(X_features, y_target)
         if trained_model:
-            joblib.dump(trained_model, MODEL_FILENAME)
+            replace_atomically(MODEL_FILENAME, lambda tmp_path: joblib.dump(trained_model, tmp_path))
             print(f"\n✅ Modelo guardado como: {MODEL_FILENAME}")
-            joblib.dump(champion_list_for_features, FEATURES_FILENAME)
+            replace_atomically(FEATURES_FILENAME, lambda tmp_path: joblib.dump(champion_list_for_features, tmp_path))
             print(f"✅ Lista de campeones (para orden de características) guardada como: {FEATURES_FILENAME}")
 
             if hasattr(trained_model, 'feature_importances_'):
@@ -204,8 +213,10 @@ if __name__ == '__main__':
                 top_features_data = feature_importance_df.head(top_n).to_dict(orient='records')
                 
                 try:
-                    with open(TOP_FEATURES_FILENAME, 'w') as f:
-                        json.dump(top_features_data, f, indent=4)
+                    def write_top_features(tmp_path):
+                        with open(tmp_path, 'w') as f:
+                            json.dump(top_features_data, f, indent=4)
+                    replace_atomically(TOP_FEATURES_FILENAME, write_top_features)
                     print(f"✅ Top {top_n} características más importantes guardadas en: {TOP_FEATURES_FILENAME}")
                     print("\nImportancia de Características del Modelo de Composición (Top 10):")
                     print(feature_importance_df.head(top_n))